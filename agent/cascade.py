@@ -0,0 +1,130 @@
+import json
+import time
+from collections import Counter
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+CASCADE_LOG_FILE = "cascade_log.jsonl"
+
+TRIGGER_TOOL_CALL_PARSE = "tool_call_parse"
+TRIGGER_STEP_BUDGET = "step_budget"
+TRIGGER_LOW_CONFIDENCE = "low_confidence"
+ALL_TRIGGERS = [TRIGGER_TOOL_CALL_PARSE, TRIGGER_STEP_BUDGET, TRIGGER_LOW_CONFIDENCE]
+
+DEFAULT_CONFIDENCE_MARKER = "[ESCALATE]"
+CONFIDENCE_INSTRUCTION = (
+    "\n\nIf you are not confident you can answer correctly, reply with only "
+    "{marker} and nothing else."
+)
+# ToolNode reports malformed tool calls as error ToolMessages with these texts
+TOOL_CALL_ERROR_MARKERS = ("is not a valid tool", "validation error")
+
+
+def detectEscalation(result, new_messages, triggers, marker=DEFAULT_CONFIDENCE_MARKER):
+    """
+    Decide whether the small model's attempt should be handed to the large
+    model. Returns the trigger name or None.
+    """
+    error_type = result.get("error_type")
+    if TRIGGER_STEP_BUDGET in triggers and error_type == TRIGGER_STEP_BUDGET:
+        return TRIGGER_STEP_BUDGET
+    if TRIGGER_TOOL_CALL_PARSE in triggers:
+        if error_type == TRIGGER_TOOL_CALL_PARSE:
+            return TRIGGER_TOOL_CALL_PARSE
+        for message in new_messages:
+            if isinstance(message, AIMessage) and message.invalid_tool_calls:
+                return TRIGGER_TOOL_CALL_PARSE
+            if (
+                isinstance(message, ToolMessage)
+                and getattr(message, "status", "") == "error"
+                and any(m in str(message.content) for m in TOOL_CALL_ERROR_MARKERS)
+            ):
+                return TRIGGER_TOOL_CALL_PARSE
+    if TRIGGER_LOW_CONFIDENCE in triggers and marker in result.get("output", ""):
+        return TRIGGER_LOW_CONFIDENCE
+    return None
+
+
+class HeldBackQueue:
+    """
+    Out-queue for the small model's attempt. Answer tokens are held back
+    while they could still be the confidence marker, so a bare marker reply
+    never reaches the UI. finish() releases them, or, when the query
+    escalates, drops them and turns the answer text already shown into a
+    collapsed step row so the large model's answer starts a row of its own.
+    """
+
+    def __init__(self, out_queue, marker=DEFAULT_CONFIDENCE_MARKER):
+        self.out_queue = out_queue
+        self.marker = marker
+        self.held = []
+        self.shown = ""
+
+    def put(self, item, *args, **kwargs):
+        event_type = item.get("type")
+        if event_type == "chat_token":
+            if self.shown:
+                self.shown += item["data"]
+                self.out_queue.put(item, *args, **kwargs)
+                return
+            self.held.append(item)
+            text = "".join(event["data"] for event in self.held).lstrip()
+            if not (self.marker.startswith(text) or text.startswith(self.marker)):
+                self.release()
+            return
+        if event_type == "chat_step_text":
+            # the step's text is shown as a step row like any other
+            self.release()
+            self.shown = ""
+        self.out_queue.put(item, *args, **kwargs)
+
+    def release(self):
+        for item in self.held:
+            self.shown += item["data"]
+            self.out_queue.put(item)
+        self.held = []
+
+    def finish(self, escalated: bool):
+        if not escalated:
+            self.release()
+            return
+        self.held = []
+        if self.shown:
+            self.out_queue.put({"type": "chat_step_text", "data": self.shown})
+            self.shown = ""
+
+
+class CascadeStats:
+    """Per-query cascade outcomes, appended to CASCADE_LOG_FILE as JSON lines."""
+
+    def __init__(self, log_file=CASCADE_LOG_FILE):
+        self.log_file = log_file
+        self.queries = 0
+        self.escalations = 0
+        self.reasons = Counter()
+
+    def record(self, small_model, large_model, reason, small_duration, large_duration):
+        self.queries += 1
+        if reason:
+            self.escalations += 1
+            self.reasons[reason] += 1
+        entry = {
+            "ts": round(time.time(), 3),
+            "small_model": small_model,
+            "large_model": large_model,
+            "escalated": reason is not None,
+            "reason": reason,
+            "small_duration": round(small_duration, 3),
+            "large_duration": (
+                round(large_duration, 3) if large_duration is not None else None
+            ),
+        }
+        try:
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[Cascade] Could not write log: {e}")
+        return entry
+
+    def escalationRate(self):
+        return self.escalations / self.queries if self.queries else 0.0
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.tools import StructuredTool
+from mcp import types
+from pydantic import ConfigDict, Field
+
+from agent.context_sizer import SizedChatOllama
+from mcp_server.tool_catalog import toolResult, toolSpec
+
+CASSETTE_VERSION = 1
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+KIND_META = "meta"
+KIND_TOOLS = "tools"
+KIND_QUERY = "query"
+KIND_OLLAMA = "ollama"
+KIND_MCP = "mcp"
+
+
+class CassetteMissError(RuntimeError):
+    pass
+
+
+def makeKey(payload):
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def withoutIds(value):
+    """Drop generated ids (tool call ids are random uuids) from a request."""
+    if isinstance(value, dict):
+        return {
+            k: withoutIds(v)
+            for k, v in value.items()
+            if k not in ("id", "tool_call_id")
+        }
+    if isinstance(value, (list, tuple)):
+        return [withoutIds(v) for v in value]
+    return value
+
+
+def toPlain(part):
+    """Ollama client responses are pydantic models; store them as dicts."""
+    if hasattr(part, "model_dump"):
+        return part.model_dump(mode="json")
+    return dict(part) if not isinstance(part, str) else part
+
+
+class Cassette:
+    """
+    Ollama requests with their streamed responses, MCP tool calls with their
+    results, the tool schemas and the user queries of a session, stored as
+    JSON lines with timings.
+
+    In MODE_RECORD the file is started afresh, so it holds one session, and
+    every interaction is appended as it happens. In MODE_REPLAY the file is
+    loaded and each request is answered with the recorded response for the
+    same request, or, if the request differs, the next unused one of its
+    kind. speed scales the recorded delays; 0 replays as fast as possible.
+    """
+
+    def __init__(self, path, mode, speed=0.0):
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.entries = {KIND_OLLAMA: [], KIND_MCP: []}
+        self.by_key = {KIND_OLLAMA: defaultdict(list), KIND_MCP: defaultdict(list)}
+        self.next_index = {KIND_OLLAMA: 0, KIND_MCP: 0}
+        self.used = set()
+        self.tools = {}
+        self.queries = []
+        self.misses = 0
+        if mode == MODE_REPLAY:
+            self.load()
+        else:
+            # replay cannot tell sessions apart, so a recording replaces the file
+            self.write({"kind": KIND_META, "version": CASSETTE_VERSION}, file_mode="w")
+
+    @property
+    def recording(self):
+        return self.mode == MODE_RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == MODE_REPLAY
+
+    def write(self, entry, file_mode="a"):
+        entry["ts"] = round(time.time(), 3)
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self.lock:
+            with open(self.path, file_mode, encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                kind = entry.get("kind")
+                if kind == KIND_TOOLS:
+                    self.tools[entry["server"]] = entry["tools"]
+                elif kind == KIND_QUERY:
+                    self.queries.append(entry)
+                elif kind in self.entries:
+                    self.by_key[kind][entry["key"]].append(len(self.entries[kind]))
+                    self.entries[kind].append(entry)
+
+    def take(self, kind, key):
+        """The recorded entry for this request, falling back to recorded order."""
+        with self.lock:
+            for index in self.by_key[kind].get(key, []):
+                if (kind, index) not in self.used:
+                    self.used.add((kind, index))
+                    return self.entries[kind][index]
+            entries = self.entries[kind]
+            while self.next_index[kind] < len(entries):
+                index = self.next_index[kind]
+                self.next_index[kind] += 1
+                if (kind, index) not in self.used:
+                    self.used.add((kind, index))
+                    self.misses += 1
+                    print(f"[Cassette] No exact {kind} match; using recorded order.")
+                    return entries[index]
+        raise CassetteMissError(f"Cassette {self.path} has no more {kind} entries.")
+
+    def delays(self, offsets):
+        previous = 0.0
+        for offset in offsets:
+            yield max(offset - previous, 0.0) * self.speed
+            previous = offset
+
+    # --- Ollama ---
+
+    def recordOllama(self, key, model, parts, offsets, duration):
+        self.write(
+            {
+                "kind": KIND_OLLAMA,
+                "key": key,
+                "model": model,
+                "parts": parts,
+                "offsets": offsets,
+                "duration": round(duration, 4),
+            }
+        )
+
+    # --- MCP ---
+
+    @staticmethod
+    def toolKey(server, tool, arguments):
+        return makeKey([server, tool, arguments])
+
+    def recordTools(self, server, tools):
+        self.write(
+            {
+                "kind": KIND_TOOLS,
+                "server": server,
+                "tools": [toolSpec(tool) for tool in tools],
+            }
+        )
+
+    def recordToolCall(self, server, tool, arguments, result, duration, error=None):
+        self.write(
+            {
+                "kind": KIND_MCP,
+                "key": self.toolKey(server, tool, arguments),
+                "server": server,
+                "tool": tool,
+                "arguments": arguments,
+                "result": result.model_dump(mode="json") if result else None,
+                "error": error,
+                "duration": round(duration, 4),
+            }
+        )
+
+    async def replayToolCall(self, server, tool, arguments):
+        entry = self.take(KIND_MCP, self.toolKey(server, tool, arguments))
+        if self.speed:
+            await asyncio.sleep(entry["duration"] * self.speed)
+        if entry.get("error"):
+            raise RuntimeError(entry["error"])
+        return types.CallToolResult.model_validate(entry["result"])
+
+    def makeReplayTools(self) -> List[StructuredTool]:
+        """LangChain tools with the recorded schemas that answer from the cassette."""
+        tools = []
+        for server, server_tools in self.tools.items():
+            for spec in server_tools:
+
+                async def call_tool(_server=server, _name=spec["name"], **arguments):
+                    result = await self.replayToolCall(_server, _name, arguments)
+                    return toolResult(result)
+
+                tools.append(
+                    StructuredTool(
+                        name=spec["name"],
+                        description=spec["description"] or "",
+                        args_schema=spec["schema"],
+                        coroutine=call_tool,
+                        response_format="content_and_artifact",
+                    )
+                )
+        return tools
+
+    # --- queries ---
+
+    def recordQuery(self, query, system_prompt):
+        self.write({"kind": KIND_QUERY, "query": query, "system_prompt": system_prompt})
+
+
+class CassetteChatOllama(SizedChatOllama):
+    """
+    ChatOllama that records every request to Ollama and its streamed
+    response into a Cassette, or in replay mode answers from the cassette
+    without contacting Ollama.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Any = Field(default=None, exclude=True)
+
+    def requestKey(self, messages, stop, kwargs):
+        params = self._chat_params(messages, stop, **dict(kwargs))
+        return makeKey(
+            {
+                "model": params["model"],
+                "messages": withoutIds(params["messages"]),
+                "tools": params.get("tools"),
+                "format": params.get("format"),
+                "options": params["options"],
+            }
+        )
+
+    def _create_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Any]:
+        key = self.requestKey(messages, stop, kwargs)
+        if self.cassette.replaying:
+            entry = self.cassette.take(KIND_OLLAMA, key)
+            for delay, part in zip(self.cassette.delays(entry["offsets"]), entry["parts"]):
+                if delay:
+                    time.sleep(delay)
+                yield part
+            return
+        start = time.perf_counter()
+        parts, offsets = [], []
+        for part in super()._create_chat_stream(messages, stop, **kwargs):
+            parts.append(toPlain(part))
+            offsets.append(round(time.perf_counter() - start, 4))
+            yield part
+        self.cassette.recordOllama(
+            key, self.model, parts, offsets, time.perf_counter() - start
+        )
+
+    async def _acreate_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        key = self.requestKey(messages, stop, kwargs)
+        if self.cassette.replaying:
+            entry = self.cassette.take(KIND_OLLAMA, key)
+            for delay, part in zip(self.cassette.delays(entry["offsets"]), entry["parts"]):
+                if delay:
+                    await asyncio.sleep(delay)
+                yield part
+            return
+        start = time.perf_counter()
+        parts, offsets = [], []
+        async for part in super()._acreate_chat_stream(messages, stop, **kwargs):
+            parts.append(toPlain(part))
+            offsets.append(round(time.perf_counter() - start, 4))
+            yield part
+        self.cassette.recordOllama(
+            key, self.model, parts, offsets, time.perf_counter() - start
+        )
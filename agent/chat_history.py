@@ -1,42 +1,109 @@
 import json
 import os
+import shutil
+
+from agent.chat_record import encodeRecord, formatRecord, recordFromText
+from agent.chat_search import ChatSearchIndex
+
+HISTORY_VERSION = 2
 
 
 class ChatHistory:
+    """
+    Chat list persisted as compact JSON. Each message is a typed record
+    (role, ts, model, tool, tokens, duration, content); large payloads are
+    zstd-compressed when the zstandard package is available.
+    """
+
     def __init__(self, history_file="chat_history.json"):
         self.history_file = history_file
         self.chat_list = []
+        self.search_index = ChatSearchIndex(
+            ChatSearchIndex.defaultPathFor(history_file)
+        )
         self.loadHistory()
 
     def loadHistory(self):
         if os.path.exists(self.history_file):
             with open(self.history_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                self.chat_list = data.get("chat_list", [])
+            self.chat_list = data.get("chat_list", [])
+            if data.get("version", 1) < HISTORY_VERSION:
+                self.migrateHistory()
         else:
             self.chat_list = []
+        self.search_index.sync(self.chat_list, formatter=formatRecord)
+
+    def migrateHistory(self):
+        """
+        One-time migration from the v1 format, where every message was a
+        display string, to typed records. The original file is kept as a .bak.
+        """
+        backup_file = f"{self.history_file}.v1.bak"
+        if not os.path.exists(backup_file):
+            shutil.copyfile(self.history_file, backup_file)
+        for chat in self.chat_list:
+            model = None
+            records = []
+            for message in chat.get("messages", []):
+                record = (
+                    message
+                    if isinstance(message, dict)
+                    else recordFromText(message, model=model, ts=0)
+                )
+                model = record.get("model", model)
+                records.append(encodeRecord(record))
+            chat["messages"] = records
+        self.saveHistory()
+        print(f"Migrated chat history to v{HISTORY_VERSION} (backup: {backup_file})")
 
     def saveHistory(self):
         with open(self.history_file, "w", encoding="utf-8") as f:
-            json.dump({"chat_list": self.chat_list}, f, ensure_ascii=False, indent=2)
+            json.dump(
+                {"version": HISTORY_VERSION, "chat_list": self.chat_list},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+
+    @staticmethod
+    def toRecord(message):
+        if isinstance(message, dict):
+            return encodeRecord(message)
+        return encodeRecord(recordFromText(message))
 
     def createChat(self, title, messages=[]):
-        chat = {"title": title, "messages": messages}
+        records = [self.toRecord(msg) for msg in messages]
+        chat = {"title": title, "messages": records}
         self.chat_list.append(chat)
         self.saveHistory()
-        return len(self.chat_list) - 1  # Return the index of the newly created chat
+        chat_index = len(self.chat_list) - 1
+        self.search_index.addMessages(
+            chat_index, title, [formatRecord(r) for r in records]
+        )
+        return chat_index  # Return the index of the newly created chat
 
     def updateChatTitle(self, chat_index, new_title):
         if 0 <= chat_index < len(self.chat_list):
             self.chat_list[chat_index]["title"] = new_title
             self.saveHistory()
+            self.search_index.updateTitle(chat_index, new_title)
         else:
             raise IndexError("Invalid chat index. Please check the index.")
 
     def addMessage(self, chat_index, message):
+        """message is either a record from chat_record.makeRecord or a display string."""
         if 0 <= chat_index < len(self.chat_list):
-            self.chat_list[chat_index]["messages"].append(message)
+            record = self.toRecord(message)
+            messages = self.chat_list[chat_index]["messages"]
+            messages.append(record)
             self.saveHistory()
+            self.search_index.addMessage(
+                chat_index,
+                self.chat_list[chat_index]["title"],
+                formatRecord(record),
+                message_index=len(messages) - 1,
+            )
         else:
             raise IndexError("Invalid chat index. Please check the index.")
 
@@ -48,3 +115,9 @@ class ChatHistory:
             return self.chat_list[chat_index]["messages"]
         else:
             raise IndexError("Invalid chat index. Please check the index.")
+
+    def getDisplayMessages(self, chat_index):
+        return [formatRecord(record) for record in self.getMessages(chat_index)]
+
+    def searchMessages(self, query, limit=50):
+        return self.search_index.search(query, limit=limit)
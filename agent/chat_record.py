@@ -0,0 +1,125 @@
+import base64
+import re
+import time
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+ROLE_TOOL = "tool"
+ROLE_SETTINGS = "settings"
+ROLE_ERROR = "error"
+ROLE_SYSTEM = "system"
+
+# payloads at least this large are stored zstd-compressed when zstandard is installed
+ZSTD_MIN_SIZE = 4 * 1024
+ZSTD_LEVEL = 10
+
+TOOL_SEPARATOR = "---------------------"
+TOOL_PATTERN = re.compile(
+    r"^\s*Tool Used: (?P<tool>[^\n]*)\nResult: (?P<content>.*?)\n?"
+    + re.escape(TOOL_SEPARATOR)
+    + r"?\s*$",
+    re.DOTALL,
+)
+SETTINGS_MODEL_PATTERN = re.compile(r"Model: (?P<model>[^,]+)")
+
+
+def makeRecord(role, content, model=None, tool=None, tokens=None, duration=None):
+    """
+    Build a typed chat message record. Empty optional fields are omitted to
+    keep the encoding compact.
+    """
+    record = {"role": role, "ts": round(time.time(), 3), "content": content}
+    if model:
+        record["model"] = model
+    if tool:
+        record["tool"] = tool
+    if tokens:
+        record["tokens"] = tokens
+    if duration is not None:
+        record["duration"] = round(duration, 3)
+    return record
+
+
+def recordFromText(text, model=None, ts=None):
+    """
+    Recover a typed record from a legacy display string such as
+    "You: ...", "Tool Used: ...\\nResult: ..." or "[Settings] ...".
+    """
+    text = str(text)
+    tool_match = TOOL_PATTERN.match(text)
+    if tool_match:
+        record = makeRecord(
+            ROLE_TOOL,
+            tool_match.group("content"),
+            model=model,
+            tool=tool_match.group("tool").strip(),
+        )
+    elif text.startswith("You: "):
+        record = makeRecord(ROLE_USER, text[len("You: ") :], model=model)
+    elif text.startswith("[Settings"):
+        model_match = SETTINGS_MODEL_PATTERN.search(text)
+        record = makeRecord(
+            ROLE_SETTINGS,
+            text,
+            model=model_match.group("model").strip() if model_match else model,
+        )
+    elif text.startswith("Error: "):
+        record = makeRecord(ROLE_ERROR, text[len("Error: ") :], model=model)
+    else:
+        record = makeRecord(ROLE_ASSISTANT, text, model=model)
+    if ts is not None:
+        record["ts"] = ts
+    return record
+
+
+def getContent(record):
+    if "content_zstd" in record:
+        if zstandard is None:
+            return "[compressed content: install zstandard to read it]"
+        return (
+            zstandard.ZstdDecompressor()
+            .decompress(base64.b64decode(record["content_zstd"]))
+            .decode("utf-8")
+        )
+    return record.get("content", "")
+
+
+def formatRecord(record):
+    """Render a record as the display string shown in the chat view."""
+    if isinstance(record, str):
+        return record
+    role = record.get("role")
+    content = getContent(record)
+    if role == ROLE_USER:
+        return f"You: {content}"
+    if role == ROLE_TOOL:
+        return f"Tool Used: {record.get('tool', '')}\nResult: {content}\n{TOOL_SEPARATOR}"
+    if role == ROLE_ERROR:
+        return f"Error: {content}"
+    return content
+
+
+def encodeRecord(record):
+    """Compress a large record payload in place of its plain content."""
+    content = record.get("content")
+    if (
+        zstandard is None
+        or not isinstance(content, str)
+        or len(content) < ZSTD_MIN_SIZE
+    ):
+        return record
+    compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(
+        content.encode("utf-8")
+    )
+    payload = base64.b64encode(compressed).decode("ascii")
+    if len(payload) >= len(content):
+        return record
+    encoded = dict(record)
+    del encoded["content"]
+    encoded["content_zstd"] = payload
+    return encoded
@@ -0,0 +1,207 @@
+import html
+import os
+import re
+import sqlite3
+
+CHAT_SEARCH_DB = "chat_search.db"
+# private-use characters, so a match marker cannot collide with message text
+SNIPPET_OPEN = "\ue000"
+SNIPPET_CLOSE = "\ue001"
+SNIPPET_TOKENS = 12
+
+
+class ChatSearchIndex:
+    """
+    Incrementally maintained full-text index over chat history messages.
+
+    Uses SQLite FTS5 when available and falls back to a plain table with
+    LIKE matching otherwise. Each chat remembers how many of its messages
+    are already indexed, so syncing only inserts what is new.
+    """
+
+    def __init__(self, db_file=CHAT_SEARCH_DB):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.use_fts = True
+        self.createTables()
+
+    def createTables(self):
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                "content, chat_index UNINDEXED, message_index UNINDEXED, "
+                "tokenize='unicode61')"
+            )
+        except sqlite3.OperationalError:
+            print("SQLite FTS5 is not available. Falling back to LIKE search.")
+            self.use_fts = False
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages_plain ("
+                "content TEXT, chat_index INTEGER, message_index INTEGER)"
+            )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_chats ("
+            "chat_index INTEGER PRIMARY KEY, title TEXT, message_count INTEGER)"
+        )
+        self.conn.commit()
+
+    @property
+    def table(self):
+        return "messages" if self.use_fts else "messages_plain"
+
+    def getIndexedCount(self, chat_index):
+        row = self.conn.execute(
+            "SELECT message_count FROM indexed_chats WHERE chat_index = ?",
+            (chat_index,),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def addMessages(self, chat_index, title, messages, start=0):
+        self.conn.executemany(
+            f"INSERT INTO {self.table} (content, chat_index, message_index) "
+            "VALUES (?, ?, ?)",
+            [
+                (str(msg), chat_index, start + offset)
+                for offset, msg in enumerate(messages)
+            ],
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO indexed_chats (chat_index, title, message_count) "
+            "VALUES (?, ?, ?)",
+            (chat_index, title, start + len(messages)),
+        )
+        self.conn.commit()
+
+    def addMessage(self, chat_index, title, message, message_index=None):
+        if message_index is None:
+            message_index = self.getIndexedCount(chat_index)
+        self.addMessages(chat_index, title, [message], start=message_index)
+
+    def updateTitle(self, chat_index, title):
+        self.conn.execute(
+            "UPDATE indexed_chats SET title = ? WHERE chat_index = ?",
+            (title, chat_index),
+        )
+        self.conn.commit()
+
+    def removeChat(self, chat_index):
+        self.conn.execute(
+            f"DELETE FROM {self.table} WHERE chat_index = ?", (chat_index,)
+        )
+        self.conn.execute(
+            "DELETE FROM indexed_chats WHERE chat_index = ?", (chat_index,)
+        )
+        self.conn.commit()
+
+    def sync(self, chat_list, formatter=str):
+        """
+        Bring the index up to date with chat_list, indexing only messages
+        that were added since the last sync. formatter turns a stored message
+        into the text to index.
+        """
+        for chat_index, chat in enumerate(chat_list):
+            messages = chat.get("messages", [])
+            indexed = self.getIndexedCount(chat_index)
+            if indexed > len(messages):
+                # history file was replaced or truncated; rebuild this chat
+                self.removeChat(chat_index)
+                indexed = 0
+            if indexed < len(messages):
+                self.addMessages(
+                    chat_index,
+                    chat.get("title", ""),
+                    [formatter(msg) for msg in messages[indexed:]],
+                    indexed,
+                )
+        stale = self.conn.execute(
+            "SELECT chat_index FROM indexed_chats WHERE chat_index >= ?",
+            (len(chat_list),),
+        ).fetchall()
+        for (chat_index,) in stale:
+            self.removeChat(chat_index)
+
+    @staticmethod
+    def buildMatchQuery(query):
+        # quote every term so user input can't break FTS5 syntax, and use
+        # prefix matching so inflected words (e.g. Korean particles) still hit
+        terms = [t.replace('"', '""') for t in re.findall(r"\S+", query)]
+        return " ".join(f'"{t}"*' for t in terms)
+
+    def search(self, query, limit=50):
+        """
+        Returns a list of dicts with chat_index, message_index, title and a
+        snippet where matched terms are wrapped in SNIPPET_OPEN/SNIPPET_CLOSE.
+        """
+        if not query or not query.strip():
+            return []
+        if self.use_fts:
+            rows = self.conn.execute(
+                "SELECT m.chat_index, m.message_index, c.title, "
+                "snippet(messages, 0, ?, ?, '...', ?) "
+                "FROM messages m JOIN indexed_chats c ON c.chat_index = m.chat_index "
+                "WHERE messages MATCH ? ORDER BY rank LIMIT ?",
+                (
+                    SNIPPET_OPEN,
+                    SNIPPET_CLOSE,
+                    SNIPPET_TOKENS,
+                    self.buildMatchQuery(query),
+                    limit,
+                ),
+            ).fetchall()
+        else:
+            rows = [
+                (chat_index, message_index, title, self.makeSnippet(content, query))
+                for chat_index, message_index, title, content in self.conn.execute(
+                    "SELECT m.chat_index, m.message_index, c.title, m.content "
+                    "FROM messages_plain m JOIN indexed_chats c "
+                    "ON c.chat_index = m.chat_index "
+                    "WHERE m.content LIKE ? LIMIT ?",
+                    (f"%{query.strip()}%", limit),
+                ).fetchall()
+            ]
+        return [
+            {
+                "chat_index": chat_index,
+                "message_index": message_index,
+                "title": title,
+                "snippet": snippet,
+            }
+            for chat_index, message_index, title, snippet in rows
+        ]
+
+    @staticmethod
+    def makeSnippet(content, query, width=60):
+        query = query.strip()
+        pos = content.lower().find(query.lower())
+        if pos < 0:
+            return content[:width]
+        start = max(0, pos - width // 2)
+        end = pos + len(query)
+        return (
+            ("..." if start > 0 else "")
+            + content[start:pos]
+            + SNIPPET_OPEN
+            + content[pos:end]
+            + SNIPPET_CLOSE
+            + content[end : end + width // 2]
+            + ("..." if end + width // 2 < len(content) else "")
+        )
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def snippetToHtml(snippet):
+        """Escape a snippet for rich text and bold its matched terms."""
+        return (
+            html.escape(snippet)
+            .replace(SNIPPET_OPEN, "<b>")
+            .replace(SNIPPET_CLOSE, "</b>")
+        )
+
+    @staticmethod
+    def defaultPathFor(history_file):
+        base, _ext = os.path.splitext(history_file)
+        if os.path.basename(base) == "chat_history":
+            return os.path.join(os.path.dirname(history_file), CHAT_SEARCH_DB)
+        return f"{base}.search.db"
@@ -0,0 +1,268 @@
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_ollama import ChatOllama
+from pydantic import ConfigDict, Field
+
+from agent.think_parser import CHARS_PER_TOKEN
+from metrics import REGISTRY
+
+CONTEXT_SIZING_LOG_FILE = "context_sizing_log.jsonl"
+STEP_TOOL = "tool_step"
+STEP_ANSWER = "final_answer"
+# per-message chat template tokens (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# output room reserved in num_ctx when num_predict is not capped
+UNCAPPED_OUTPUT_RESERVE = 2048
+CONTEXT_MARGIN_TOKENS = 128
+# measured tokens per estimated token, kept from the last few calls
+CALIBRATION_SAMPLES = 20
+CALIBRATION_MIN = 1.0
+CALIBRATION_MAX = 4.0
+
+CONTEXT_RELOADS = REGISTRY.counter(
+    "ollama_context_reloads_total",
+    "num_ctx changes for a loaded model, each of which makes Ollama reload it.",
+    labels=("model",),
+)
+NUM_CTX = REGISTRY.gauge(
+    "ollama_num_ctx", "num_ctx of the last request to each model.", labels=("model",)
+)
+OUTPUT_TRUNCATED = REGISTRY.counter(
+    "ollama_output_truncated_total",
+    "Responses cut off by the num_predict cap, by step type.",
+    labels=("model", "step"),
+)
+
+
+def partValue(part, key):
+    """A field of a streamed Ollama response part (a dict when replayed)."""
+    if isinstance(part, dict):
+        return part.get(key)
+    return getattr(part, key, None)
+
+
+def estimateChars(params):
+    chars = 0
+    for message in params["messages"]:
+        content = message.get("content") or ""
+        chars += len(content) if isinstance(content, str) else len(str(content))
+        if message.get("tool_calls"):
+            chars += len(json.dumps(message["tool_calls"], default=str))
+    if params.get("tools"):
+        chars += len(json.dumps(params["tools"], default=str))
+    return chars
+
+
+class ContextSizer:
+    """
+    Picks num_ctx and num_predict for each Ollama request. The prompt size is
+    estimated from the request (messages and tool schemas) and calibrated
+    against the prompt_eval_count Ollama reports for earlier requests to the
+    model. num_ctx is the smallest bucket that holds the prompt plus the
+    step's num_predict cap. A model stays on its current bucket while the
+    request fits and the bucket is at most one size too large, because every
+    num_ctx change makes Ollama reload the model.
+
+    predict_caps maps a step type to its num_predict; 0 leaves it uncapped.
+    Tools are bound on every ReAct step, answers included, so the step type
+    is predicted from the conversation (see predictStep) and the cap goes out
+    with the request; Ollama only streams tool calls once generation ends.
+    Every request is appended to CONTEXT_SIZING_LOG_FILE with the predicted
+    step and whether the response made tool calls.
+    """
+
+    def __init__(
+        self,
+        buckets=(2048, 4096, 8192, 16384, 32768),
+        max_ctx=32768,
+        predict_caps=None,
+        log_file=CONTEXT_SIZING_LOG_FILE,
+    ):
+        buckets = sorted(int(b) for b in buckets)
+        self.buckets = [b for b in buckets if b <= max_ctx] or [max_ctx]
+        self.max_ctx = max_ctx
+        self.predict_caps = dict(predict_caps or {})
+        self.log_file = log_file
+        self.lock = threading.Lock()
+        # (base_url, model) -> num_ctx the model was last loaded with
+        self.loaded = {}
+        # model -> recent measured/estimated prompt token ratios
+        self.ratios = {}
+
+    def calibration(self, model):
+        samples = self.ratios.get(model)
+        if not samples:
+            return CALIBRATION_MIN
+        # the largest recent ratio: a cached prompt prefix lowers the count
+        # Ollama reports, so smaller ratios may be under-measured
+        return min(max(max(samples), CALIBRATION_MIN), CALIBRATION_MAX)
+
+    def estimateTokens(self, params):
+        """(uncalibrated, calibrated) prompt token estimates for a request."""
+        raw = (
+            estimateChars(params) // CHARS_PER_TOKEN
+            + MESSAGE_OVERHEAD_TOKENS * len(params["messages"])
+        )
+        return raw, int(raw * self.calibration(params["model"]))
+
+    def bucketFor(self, tokens):
+        for bucket in self.buckets:
+            if bucket >= tokens:
+                return bucket
+        return self.buckets[-1]
+
+    @staticmethod
+    def predictStep(params):
+        """
+        STEP_TOOL when tools are bound and the user has the last word: a
+        turn that needs tools opens with a call. Once a tool result is the
+        last message the model usually answers, and without tools it must.
+        """
+        if not params.get("tools"):
+            return STEP_ANSWER
+        # an appended system instruction (a cascade attempt) is not a turn
+        turns = [m for m in params["messages"] if m.get("role") != "system"]
+        if turns and turns[-1].get("role") == "user":
+            return STEP_TOOL
+        return STEP_ANSWER
+
+    def choose(self, base_url, params):
+        """
+        Decide the sizes for a request; returns the decision to log. A
+        num_ctx or num_predict already in the request's options is kept.
+        """
+        model = params["model"]
+        step = self.predictStep(params)
+        fixed_ctx = params["options"].num_ctx
+        num_predict = params["options"].num_predict or self.predict_caps.get(step) or -1
+        raw, prompt_tokens = self.estimateTokens(params)
+        reserve = num_predict if num_predict > 0 else UNCAPPED_OUTPUT_RESERVE
+        needed = prompt_tokens + reserve + CONTEXT_MARGIN_TOKENS
+        ideal = self.bucketFor(needed)
+        with self.lock:
+            current = self.loaded.get((base_url, model))
+            if fixed_ctx:
+                num_ctx = fixed_ctx
+            elif (
+                current in self.buckets
+                and current >= needed
+                and self.buckets.index(current) - self.buckets.index(ideal) <= 1
+            ):
+                num_ctx = current
+            else:
+                num_ctx = ideal
+            self.loaded[(base_url, model)] = num_ctx
+        reload = current is not None and current != num_ctx
+        if reload:
+            CONTEXT_RELOADS.inc(model=model)
+            print(
+                f"[Context] {model}: num_ctx {current} -> {num_ctx} "
+                f"(prompt ~{prompt_tokens} tokens); Ollama reloads the model"
+            )
+        if prompt_tokens + CONTEXT_MARGIN_TOKENS > num_ctx:
+            print(
+                f"[Context] {model}: prompt ~{prompt_tokens} tokens does not fit "
+                f"num_ctx {num_ctx}; Ollama will truncate it"
+            )
+        NUM_CTX.set(num_ctx, model=model)
+        return {
+            "model": model,
+            "endpoint": base_url,
+            "step": step,
+            "estimated_tokens": raw,
+            "prompt_tokens": prompt_tokens,
+            "num_ctx": num_ctx,
+            "num_predict": num_predict,
+            "made_tool_calls": False,
+            "reload": reload,
+        }
+
+    def track(self, decision, part):
+        """Note whether a streamed part of the response carries tool calls."""
+        message = partValue(part, "message")
+        if message is not None and partValue(message, "tool_calls"):
+            decision["made_tool_calls"] = True
+
+    def observe(self, decision, part):
+        """Record the final part of a response and log the request."""
+        prompt_eval_count = partValue(part, "prompt_eval_count")
+        done_reason = partValue(part, "done_reason")
+        if prompt_eval_count and decision["estimated_tokens"]:
+            with self.lock:
+                samples = self.ratios.setdefault(decision["model"], [])
+                samples.append(prompt_eval_count / decision["estimated_tokens"])
+                del samples[:-CALIBRATION_SAMPLES]
+        if done_reason == "length" and decision["num_predict"] > 0:
+            OUTPUT_TRUNCATED.inc(model=decision["model"], step=decision["step"])
+            print(
+                f"[Context] {decision['model']}: {decision['step']} output hit "
+                f"num_predict {decision['num_predict']}"
+            )
+        entry = {
+            "ts": round(time.time(), 3),
+            **decision,
+            "prompt_eval_count": prompt_eval_count,
+            "eval_count": partValue(part, "eval_count"),
+            "done_reason": done_reason,
+        }
+        try:
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[Context] Could not write log: {e}")
+
+
+class SizedChatOllama(ChatOllama):
+    """
+    ChatOllama whose requests get num_ctx and num_predict from a
+    ContextSizer. Options set explicitly on the model or the call win.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    context_sizer: Any = Field(default=None, exclude=True)
+
+    def sizeRequest(self, messages, stop, kwargs):
+        """Add sized options to kwargs; returns the sizer's decision or None."""
+        if self.context_sizer is None:
+            return None
+        params = self._chat_params(messages, stop, **dict(kwargs))
+        decision = self.context_sizer.choose(self.base_url, params)
+        options = params["options"].model_dump()
+        options["num_ctx"] = decision["num_ctx"]
+        if decision["num_predict"] > 0:
+            options["num_predict"] = decision["num_predict"]
+        kwargs["options"] = options
+        return decision
+
+    def _create_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Any]:
+        decision = self.sizeRequest(messages, stop, kwargs)
+        for part in super()._create_chat_stream(messages, stop, **kwargs):
+            if decision:
+                self.context_sizer.track(decision, part)
+                if partValue(part, "done"):
+                    self.context_sizer.observe(decision, part)
+            yield part
+
+    async def _acreate_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        decision = self.sizeRequest(messages, stop, kwargs)
+        async for part in super()._acreate_chat_stream(messages, stop, **kwargs):
+            if decision:
+                self.context_sizer.track(decision, part)
+                if partValue(part, "done"):
+                    self.context_sizer.observe(decision, part)
+            yield part
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import re
+import time
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.prebuilt import create_react_agent
+
+from agent.think_parser import stripThinking
+from agent.tool_diff import ACTIVE_TOOL_RESULTS
+from constants import DEFAULT_QUERY_TIMEOUT, RECURSION_LIMIT
+from metrics import REGISTRY
+
+# only questions with one of these words are planned; others skip the extra call
+FAN_OUT_HINT = re.compile(
+    r"\b(all|each|every|both|compare|across|per|respectively)\b", re.IGNORECASE
+)
+# the planner may list a directory or two to find the entities, using only
+# the manager's read-only tools
+PLANNER_RECURSION_LIMIT = 8
+# sub-task answers are cut to this length in the reduce prompt
+SUBTASK_ANSWER_MAX_CHARS = 4000
+
+PLANNER_PROMPT = """
+You split questions into independent sub-tasks that can be answered in parallel.
+If the question asks for the same kind of work on several separate items (files,
+people, dates, sources), use tools only to find out which items there are, then
+reply with JSON only: {"subtasks": ["<self-contained task for item 1>", ...]}.
+Each sub-task must name its item and be answerable without the others.
+If the question is about a single item, or its steps depend on each other,
+reply with {"subtasks": []}.
+"""
+SUBTASK_PROMPT = """
+You are answering one part of a larger question. Other parts are handled
+separately, so work only on your part. Use tools as needed and reply with a
+short, factual answer that includes the figures and names the final answer
+will need.
+"""
+SUBTASK_TEMPLATE = "Question: {query}\n\nYour part: {task}"
+REDUCE_TEMPLATE = (
+    "{prompt}\n\n"
+    "This question was split into independent parts that have already been "
+    "answered:\n\n{results}\n\n"
+    "Combine these results into one answer to the question. Use tools only to "
+    "redo a part that failed."
+)
+
+FAN_OUT_QUERIES = REGISTRY.counter(
+    "fan_out_queries_total",
+    "Planned queries, by whether they were fanned out or answered normally.",
+    labels=("outcome",),
+)
+SUBTASK_SECONDS = REGISTRY.histogram(
+    "fan_out_subtask_seconds",
+    "Duration of fan-out sub-agents, by outcome (ok, error).",
+    labels=("outcome",),
+)
+
+
+def parsePlan(text: str) -> List[str]:
+    """The sub-tasks in a planner reply; empty when it is not a plan."""
+    match = re.search(r"\{.*\}", stripThinking(text), re.DOTALL)
+    if not match:
+        return []
+    try:
+        plan = json.loads(match.group(0))
+    except ValueError:
+        return []
+    subtasks = plan.get("subtasks") if isinstance(plan, dict) else None
+    if not isinstance(subtasks, list):
+        return []
+    unique = []
+    for task in subtasks:
+        if isinstance(task, str) and task.strip() and task.strip() not in unique:
+            unique.append(task.strip())
+    return unique
+
+
+class SubtaskRun:
+    """One sub-agent's answer and timing."""
+
+    def __init__(self, index, task):
+        self.index = index
+        self.task = task
+        self.answer = ""
+        self.error = None
+        self.usage = {}
+        self.queued_seconds = 0.0
+        self.seconds = 0.0
+
+    def addUsage(self, message: AIMessage):
+        for key, value in (message.usage_metadata or {}).items():
+            if isinstance(value, int):
+                self.usage[key] = self.usage.get(key, 0) + value
+
+    def format(self):
+        if self.error:
+            return f"### Part {self.index + 1}: {self.task}\nFailed: {self.error}"
+        answer = self.answer[:SUBTASK_ANSWER_MAX_CHARS]
+        return f"### Part {self.index + 1}: {self.task}\n{answer}"
+
+
+class FanOutPlanner:
+    """
+    Answers questions about several independent items (every file in a
+    folder, each person in a list) by fanning out. A planner call splits the
+    question into sub-tasks; each runs in its own sub-agent with a short,
+    fresh context, at most max_parallel at a time, so the wall-clock time
+    follows the slowest sub-task instead of their sum. The results are then
+    merged by the chat agent in a reduce step, which is what the user sees
+    streamed and what the conversation keeps.
+
+    Questions without a FAN_OUT_HINT word, and plans with fewer than two or
+    more than max_subtasks sub-tasks, are answered normally. Planning, the
+    sub-tasks and the reduce step share the query's one timeout.
+    """
+
+    def __init__(self, manager, max_parallel: int = 4, max_subtasks: int = 8):
+        self.manager = manager
+        self.max_parallel = max(1, max_parallel)
+        self.max_subtasks = max_subtasks
+
+    def put(self, message):
+        if self.manager.out_queue:
+            self.manager.out_queue.put({"type": "system_message", "data": message})
+
+    def selectTools(self, query):
+        router = self.manager.tool_router
+        if router is None:
+            return []
+        tools, _report = router.selectTools(query)
+        return tools
+
+    async def plan(self, prompt: str, tools, timeout: float) -> List[str]:
+        # planning only looks around; nothing may be written before the plan
+        tools = [tool for tool in tools if tool.name in self.manager.read_only_tools]
+        messages = [
+            SystemMessage(content=PLANNER_PROMPT),
+            HumanMessage(content=prompt),
+        ]
+        # the planner does not see the conversation either
+        tool_results_token = ACTIVE_TOOL_RESULTS.set(None)
+        try:
+            if tools:
+                planner = create_react_agent(model=self.manager.chat_model, tools=tools)
+                state = await asyncio.wait_for(
+                    planner.ainvoke(
+                        {"messages": messages},
+                        config={"recursion_limit": PLANNER_RECURSION_LIMIT},
+                    ),
+                    timeout,
+                )
+                reply = state["messages"][-1].content
+            else:
+                reply = (
+                    await asyncio.wait_for(
+                        self.manager.chat_model.ainvoke(messages), timeout
+                    )
+                ).content
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"[Fan-out] Planning failed, answering normally: {error}")
+            return []
+        finally:
+            ACTIVE_TOOL_RESULTS.reset(tool_results_token)
+        return parsePlan(reply if isinstance(reply, str) else str(reply))
+
+    async def runSubtask(self, run, query, semaphore, deadline):
+        queued_at = time.perf_counter()
+        async with semaphore:
+            # sub-agents do not share the conversation, so their tool
+            # results must not be diffed against it
+            ACTIVE_TOOL_RESULTS.set(None)
+            start_time = time.perf_counter()
+            run.queued_seconds = start_time - queued_at
+            timeout = deadline - start_time
+            messages = [
+                SystemMessage(content=SUBTASK_PROMPT),
+                HumanMessage(
+                    content=SUBTASK_TEMPLATE.format(query=query, task=run.task)
+                ),
+            ]
+            tools = self.selectTools(run.task)
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+                if tools:
+                    agent = create_react_agent(
+                        model=self.manager.chat_model, tools=tools
+                    )
+                    state = await asyncio.wait_for(
+                        agent.ainvoke(
+                            {"messages": messages},
+                            config={"recursion_limit": RECURSION_LIMIT},
+                        ),
+                        timeout,
+                    )
+                    answers = [m for m in state["messages"] if isinstance(m, AIMessage)]
+                else:
+                    answers = [
+                        await asyncio.wait_for(
+                            self.manager.chat_model.ainvoke(messages), timeout
+                        )
+                    ]
+                for message in answers:
+                    run.addUsage(message)
+                content = answers[-1].content if answers else ""
+                run.answer = stripThinking(
+                    content if isinstance(content, str) else str(content)
+                ).strip()
+            except asyncio.TimeoutError:
+                run.error = "ran out of time"
+            except Exception as e:
+                run.error = str(e) or type(e).__name__
+            run.seconds = time.perf_counter() - start_time
+        outcome = "error" if run.error else "ok"
+        SUBTASK_SECONDS.observe(run.seconds, outcome=outcome)
+        status = f"failed ({run.error})" if run.error else f"done in {run.seconds:.1f}s"
+        print(f"[Fan-out] Part {run.index + 1} {status}: {run.task}")
+        self.put(f"Part {run.index + 1} {status}: {run.task}")
+
+    async def run(
+        self,
+        agent,
+        system_prompt: str,
+        query: str,
+        prompt: str,
+        tools,
+        timeout: int = DEFAULT_QUERY_TIMEOUT,
+    ) -> Optional[dict]:
+        """
+        The chat result of a fanned-out query, or None when the query should
+        be answered normally.
+        """
+        if not FAN_OUT_HINT.search(query):
+            return None
+        start_time = time.perf_counter()
+        deadline = start_time + timeout
+        subtasks = await self.plan(prompt, tools, timeout)
+        plan_seconds = time.perf_counter() - start_time
+        if len(subtasks) < 2 or len(subtasks) > self.max_subtasks:
+            if len(subtasks) > self.max_subtasks:
+                print(
+                    f"[Fan-out] Plan has {len(subtasks)} sub-tasks, more than "
+                    f"{self.max_subtasks}; answering normally"
+                )
+            FAN_OUT_QUERIES.inc(outcome="skipped")
+            return None
+        FAN_OUT_QUERIES.inc(outcome="fanned_out")
+        parallel = min(len(subtasks), self.max_parallel)
+        message = (
+            f"Split into {len(subtasks)} parts, running {parallel} at a time "
+            f"(planned in {plan_seconds:.1f}s)"
+        )
+        print(f"[Fan-out] {message}")
+        self.put(message + ".")
+
+        runs = [SubtaskRun(index, task) for index, task in enumerate(subtasks)]
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        map_start = time.perf_counter()
+        await asyncio.gather(
+            *(self.runSubtask(run, query, semaphore, deadline) for run in runs)
+        )
+        map_seconds = time.perf_counter() - map_start
+
+        reduce_start = time.perf_counter()
+        reduce_prompt = REDUCE_TEMPLATE.format(
+            prompt=prompt, results="\n\n".join(run.format() for run in runs)
+        )
+        remaining = deadline - reduce_start
+        if remaining > 0:
+            result = await self.manager.processQuery(
+                agent, system_prompt, reduce_prompt, timeout=remaining
+            )
+        else:
+            result = {
+                "error": f"⏱️ Request exceeded timeout of {timeout} seconds. "
+                "Please try again."
+            }
+        reduce_seconds = time.perf_counter() - reduce_start
+
+        usage = dict(result.get("usage") or {})
+        for run in runs:
+            for key, value in run.usage.items():
+                usage[key] = usage.get(key, 0) + value
+        if "error" not in result:
+            result["usage"] = usage
+        report = {
+            "subtasks": len(runs),
+            "failed": sum(1 for run in runs if run.error),
+            "max_parallel": self.max_parallel,
+            "plan_ms": round(plan_seconds * 1000, 1),
+            "map_ms": round(map_seconds * 1000, 1),
+            "slowest_ms": round(max(run.seconds for run in runs) * 1000, 1),
+            "sequential_ms": round(sum(run.seconds for run in runs) * 1000, 1),
+            "reduce_ms": round(reduce_seconds * 1000, 1),
+            "parts": [
+                {
+                    "task": run.task,
+                    "ms": round(run.seconds * 1000, 1),
+                    "queued_ms": round(run.queued_seconds * 1000, 1),
+                    "error": run.error,
+                }
+                for run in runs
+            ],
+        }
+        result["fan_out"] = report
+        print(
+            f"\n[Fan-out] {report['subtasks']} parts in {map_seconds:.1f}s "
+            f"(slowest {report['slowest_ms'] / 1000:.1f}s, "
+            f"{report['sequential_ms'] / 1000:.1f}s one by one), "
+            f"merged in {reduce_seconds:.1f}s"
+        )
+        return result
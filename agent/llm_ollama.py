@@ -1,29 +1,109 @@
 import asyncio
+import time
 import uuid
+from contextlib import aclosing
 from queue import Queue
 from typing import Any, List, Optional
 
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
 from langchain_core.messages.tool import ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_ollama import ChatOllama
+from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.errors import GraphRecursionError
 from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import create_react_agent
 
+from agent.cassette import CassetteChatOllama
+from agent.cascade import (
+    ALL_TRIGGERS,
+    CONFIDENCE_INSTRUCTION,
+    DEFAULT_CONFIDENCE_MARKER,
+    TRIGGER_LOW_CONFIDENCE,
+    TRIGGER_STEP_BUDGET,
+    TRIGGER_TOOL_CALL_PARSE,
+    CascadeStats,
+    HeldBackQueue,
+    detectEscalation,
+)
+from agent.context_sizer import STEP_ANSWER, STEP_TOOL, ContextSizer, SizedChatOllama
+from agent.fan_out import FanOutPlanner
+from agent.loop_guard import (
+    ABORT_TIME_BUDGET,
+    FORCE_ANSWER_INSTRUCTION,
+    FORCE_ANSWER_TIMEOUT,
+    LoopAbortLog,
+    LoopGuard,
+    nodeUpdatesFromLog,
+)
+from agent.model_compare import ModelComparison
+from agent.ollama_pool import OllamaEndpointPool, PooledChatOllama
+from agent.prompt_context import PromptPrefetcher
+from agent.response_cache import (
+    RecordingQueue,
+    ResponseCache,
+    findPathArguments,
+)
+from agent.semantic_memory import ChatMemory
+from agent.think_parser import (
+    KIND_REASONING,
+    ThinkStreamParser,
+    estimateTokens,
+    stripThinking,
+)
+from agent.tool_diff import ACTIVE_TOOL_RESULTS, ToolResultMemory
+from agent.tool_router import ToolRouter
 from constants import (
+    DEFAULT_AGENT_STEP_BUDGET,
+    DEFAULT_CASCADE_STEP_BUDGET,
+    DEFAULT_LOOP_REPEAT_LIMIT,
     DEFAULT_LLM_MODEL,
     DEFAULT_QUERY_TIMEOUT,
+    DEFAULT_READ_ONLY_TOOLS,
+    DEFAULT_STREAM_MODE,
     DEFAULT_SYSTEM_PROMPT,
     DEFAULT_TEMPERATURE,
+    DEFAULT_TOOL_ROUTER_TOP_K,
     RECURSION_LIMIT,
+    STREAM_MODE_INVOKE,
+    STREAM_MODE_LOG,
+    STREAM_MODE_MESSAGES,
+)
+from metrics import REGISTRY
+
+QUERIES = REGISTRY.counter(
+    "agent_queries_total",
+    "Chat queries by outcome (ok, error, cached).",
+    labels=("outcome",),
+)
+QUERY_SECONDS = REGISTRY.histogram(
+    "agent_query_seconds", "End-to-end duration of chat queries.", labels=("outcome",)
+)
+MODEL_TOKENS = REGISTRY.counter(
+    "agent_model_tokens_total",
+    "Prompt (input) and generated (output) tokens reported by the model.",
+    labels=("kind",),
+)
+CHECKPOINT_MESSAGES = REGISTRY.gauge(
+    "agent_checkpoint_messages",
+    "Messages in the agent's checkpointed conversation after the last query.",
 )
 
 
 class OllamaAgentManager:
     QUERY_THREAD_ID = str(uuid.uuid4())
-    USE_ASTREAM_LOG = True
+    # STREAM_MODE_MESSAGES: per-token deltas from astream(stream_mode=["messages", "updates"])
+    # STREAM_MODE_LOG: whole node outputs from astream_log
+    # STREAM_MODE_INVOKE: no streaming, wait for ainvoke
+    STREAM_MODE = DEFAULT_STREAM_MODE
     QWEN3 = DEFAULT_LLM_MODEL
 
     def __init__(
@@ -41,19 +121,70 @@ class OllamaAgentManager:
         self.mcp_tools = mcp_tools
         self.is_first_chat = True
         self.out_queue = out_queue
+        self.checkpointer = MemorySaver()
+        self.chat_model = None
+        self.tool_router = None
+        self.tool_router_top_k = DEFAULT_TOOL_ROUTER_TOP_K
+        self.pinned_tools = []
+        self.routed_agents = {}
+        self.response_cache = None
+        self.read_only_tools = set(DEFAULT_READ_ONLY_TOOLS)
+        self.conversation = []
+        self.endpoint_pool = None
+        self.endpoints_setting = None
+        self.endpoint_probe_pending = False
+        self.model_name = OllamaAgentManager.QWEN3
+        self.cascade_model = None
+        self.cascade_step_budget = DEFAULT_CASCADE_STEP_BUDGET
+        self.cascade_triggers = list(ALL_TRIGGERS)
+        self.cascade_marker = DEFAULT_CONFIDENCE_MARKER
+        self.cascade_agents = {}
+        self.cascade_stats = CascadeStats()
+        self.strip_reasoning = True
+        self.cascade_chat_model = None
+        self.agent_step_budget = DEFAULT_AGENT_STEP_BUDGET
+        self.loop_repeat_limit = DEFAULT_LOOP_REPEAT_LIMIT
+        self.loop_abort_log = LoopAbortLog()
+        self.cassette = None
+        self.prefetcher = None
+        self.memory = None
+        self.memory_setting = None
+        self.tool_results = ToolResultMemory()
+        self.tool_result_diff = True
+        self.context_sizer = None
+        self.context_sizing_setting = None
+        self.fan_out = None
+
+    def getRunConfig(self, recursion_limit: int = RECURSION_LIMIT) -> RunnableConfig:
+        return RunnableConfig(
+            recursion_limit=recursion_limit,
+            configurable={"thread_id": self.QUERY_THREAD_ID},
+        )
 
     def createChatModel(
         self,
         temperature: float = DEFAULT_TEMPERATURE,
         mcp_tools: Optional[List] = None,
+        checkpointed: bool = False,
     ) -> ChatOllama | CompiledGraph:
-        self.agent = ChatOllama(
-            model=OllamaAgentManager.QWEN3,
-            temperature=temperature,
+        """
+        A ReAct agent when there are tools (or checkpointed is set, so the
+        conversation kept in the checkpointer stays available), otherwise the
+        plain chat model.
+        """
+        self.temperature = temperature
+        self.agent = self.createOllamaModel(temperature)
+        self.chat_model = self.agent
+        self.routed_agents = {}
+        self.cascade_agents = {}
+        # every agent gets tools that can send repeated results as diffs
+        mcp_tools = self.tool_results.wrapTools(mcp_tools)
+        self.tool_router = ToolRouter(
+            mcp_tools, top_k=self.tool_router_top_k, pinned=self.pinned_tools
         )
-        if mcp_tools:
+        if mcp_tools or checkpointed:
             self.agent = create_react_agent(
-                model=self.agent, tools=mcp_tools, checkpointer=MemorySaver()
+                model=self.agent, tools=mcp_tools, checkpointer=self.checkpointer
             )
             print("ReAct agent created.")
             return self.agent
@@ -61,12 +192,194 @@ class OllamaAgentManager:
             print("No MCP tools provided. Using plain Gemini model.")
             return self.agent
 
-    def getStreamingCallback(self):
+    def createOllamaModel(
+        self, temperature: float, model_name: Optional[str] = None
+    ) -> ChatOllama:
+        model_name = model_name or self.model_name
+        if self.cassette:
+            # recorded sessions talk to one endpoint so traffic stays in order
+            options = {"model": model_name, "temperature": temperature}
+            if self.endpoint_pool:
+                options["base_url"] = self.endpoint_pool.endpoints[0].url
+            return CassetteChatOllama(
+                **options, cassette=self.cassette, context_sizer=self.context_sizer
+            )
+        if self.endpoint_pool and len(self.endpoint_pool.endpoints) > 1:
+            return PooledChatOllama(
+                model=model_name,
+                temperature=temperature,
+                pool=self.endpoint_pool,
+                context_sizer=self.context_sizer,
+            )
+        if self.endpoint_pool:
+            return SizedChatOllama(
+                model=model_name,
+                temperature=temperature,
+                base_url=self.endpoint_pool.endpoints[0].url,
+                context_sizer=self.context_sizer,
+            )
+        return SizedChatOllama(
+            model=model_name,
+            temperature=temperature,
+            context_sizer=self.context_sizer,
+        )
+
+    def configureModel(self, model_name: Optional[str]):
+        model_name = model_name or OllamaAgentManager.QWEN3
+        if model_name == self.model_name:
+            return
+        self.model_name = model_name
+        if self.agent is not None:
+            self.rebindTools(self.mcp_tools)
+
+    def configureCascade(
+        self,
+        large_model: Optional[str],
+        step_budget: int = DEFAULT_CASCADE_STEP_BUDGET,
+        triggers: Optional[List[str]] = None,
+        marker: str = DEFAULT_CONFIDENCE_MARKER,
+    ):
+        """
+        Enable the small-to-large cascade: the configured model answers first
+        and the query is re-run on large_model when one of the triggers fires.
+        large_model None (or equal to the small model) disables the cascade.
+        """
+        if large_model == self.model_name:
+            large_model = None
+        if large_model != self.cascade_model:
+            self.cascade_agents = {}
+        self.cascade_model = large_model or None
+        self.cascade_step_budget = step_budget
+        self.cascade_triggers = list(ALL_TRIGGERS if triggers is None else triggers)
+        self.cascade_marker = marker or DEFAULT_CONFIDENCE_MARKER
+
+    def configureEndpoints(self, endpoints: Optional[List[dict]]):
+        """
+        endpoints is the ollama_endpoints setting: a list of
+        {"url": ..., "weight": ..., "models": [...]} entries.
+        """
+        if endpoints == self.endpoints_setting:
+            return
+        self.endpoints_setting = endpoints
+        self.endpoint_pool = OllamaEndpointPool.fromSettings(endpoints)
+        # probed at the start of the next query, off the settings path
+        self.endpoint_probe_pending = True
+        if self.agent is not None:
+            self.rebindTools(self.mcp_tools)
+
+    def configureContextSizing(
+        self,
+        enabled: bool,
+        buckets: List[int],
+        max_ctx: int,
+        tool_step_predict: int,
+        answer_predict: int,
+    ):
+        """
+        Size num_ctx and num_predict per request (see ContextSizer); when
+        disabled, Ollama's defaults or the model file apply.
+        """
+        predict_caps = {STEP_TOOL: tool_step_predict, STEP_ANSWER: answer_predict}
+        setting = (enabled, tuple(buckets), max_ctx, tuple(predict_caps.items()))
+        if setting == self.context_sizing_setting:
+            return
+        self.context_sizing_setting = setting
+        self.context_sizer = (
+            ContextSizer(buckets=buckets, max_ctx=max_ctx, predict_caps=predict_caps)
+            if enabled
+            else None
+        )
+        if self.agent is not None:
+            self.rebindTools(self.mcp_tools)
+
+    async def probeEndpoints(self):
+        if self.endpoint_probe_pending and self.endpoint_pool is not None:
+            self.endpoint_probe_pending = False
+            await self.endpoint_pool.probe()
+
+    def getEndpointStats(self) -> dict:
+        return self.endpoint_pool.getStats() if self.endpoint_pool else {}
+
+    def getStreamingCallback(self, stream_mode: str = STREAM_MODE_LOG):
         accumulated_text = []
         accumulated_tool_info = []
+        accumulated_usage = {}
+        # one think parser per streamed AI message, keyed by message id
+        think_parsers = {}
+        # answer text streamed for each AI message; a message that turns out
+        # to call tools was an intermediate step, not part of the answer
+        message_texts = {}
+
+        def add_usage(message: AIMessage):
+            for key, value in (message.usage_metadata or {}).items():
+                if isinstance(value, int):
+                    accumulated_usage[key] = accumulated_usage.get(key, 0) + value
+
+        def emit_tool_message(message: ToolMessage):
+            tool_info = f"Tool Used: {message.name}\nResult: {message.content}\n---------------------"
+            print(f"\n[Tool Execution Result: {message.name}]")
+            accumulated_tool_info.append(tool_info)
+            if self.out_queue:
+                self.out_queue.put({"type": "chat_message", "data": tool_info})
+
+        def emit_segments(
+            segments, event_type: str = "chat_token", message_id: Optional[str] = None
+        ):
+            for kind, text in segments:
+                if kind == KIND_REASONING:
+                    if self.out_queue:
+                        self.out_queue.put({"type": "chat_reasoning", "data": text})
+                    continue
+                accumulated_text.append(text)
+                if message_id is not None:
+                    message_texts.setdefault(message_id, []).append(text)
+                print(text, end="", flush=True)
+                if self.out_queue:
+                    self.out_queue.put({"type": event_type, "data": text})
+
+        def flush_parsers():
+            for message_id, parser in think_parsers.items():
+                emit_segments(parser.flush(), message_id=message_id)
+            think_parsers.clear()
+
+        def retract_step_text(message: AIMessage):
+            """Take a tool-calling step's streamed text back out of the answer."""
+            segments = message_texts.pop(message.id, [])
+            if not segments:
+                return
+            # the step's segments are the latest ones: its update follows them
+            del accumulated_text[-len(segments) :]
+            if self.out_queue:
+                self.out_queue.put({"type": "chat_step_text", "data": "".join(segments)})
+
+        def token_callback_func(mode: str, data: Any):
+            # mode "messages": data is (message chunk, metadata) for each LLM token
+            # mode "updates": data is {node_name: state update} after each node
+            if mode == "messages":
+                message, _metadata = data
+                if not isinstance(message, AIMessageChunk):
+                    return None
+                add_usage(message)
+                parser = think_parsers.setdefault(message.id, ThinkStreamParser())
+                if message.content and isinstance(message.content, str):
+                    emit_segments(parser.feed(message.content), message_id=message.id)
+                if message.usage_metadata:
+                    # the final chunk of a response carries the usage
+                    emit_segments(parser.flush(), message_id=message.id)
+            elif mode == "updates" and isinstance(data, dict):
+                flush_parsers()
+                for update in data.values():
+                    if not isinstance(update, dict):
+                        continue
+                    for message in update.get("messages", []):
+                        if isinstance(message, AIMessage) and message.tool_calls:
+                            retract_step_text(message)
+                        elif isinstance(message, ToolMessage):
+                            emit_tool_message(message)
+            return None
 
         def callback_func(data: Any):
-            nonlocal accumulated_text, accumulated_tool_info
+            nonlocal accumulated_text, accumulated_tool_info, accumulated_usage
 
             if isinstance(data, dict):
                 agent_step_key = next(
@@ -82,34 +395,31 @@ class OllamaAgentManager:
                     messages = data[agent_step_key].get("messages", [])
                     for message in messages:
                         if isinstance(message, AIMessage):
+                            add_usage(message)
                             if message.tool_calls:
                                 pass
                             elif message.content and isinstance(message.content, str):
                                 content_chunk = message.content.encode(
                                     "utf-8", "replace"
                                 ).decode("utf-8")
-                                if content_chunk:
-                                    accumulated_text.append(content_chunk)
-                                    print(content_chunk, end="", flush=True)
-                                    if self.out_queue:
-                                        self.out_queue.put(
-                                            {
-                                                "type": "chat_message",
-                                                "data": content_chunk,
-                                            }
-                                        )
+                                parser = ThinkStreamParser()
+                                emit_segments(
+                                    parser.feed(content_chunk) + parser.flush(),
+                                    event_type="chat_message",
+                                )
 
                         elif isinstance(message, ToolMessage):
-                            tool_info = f"Tool Used: {message.name}\nResult: {message.content}\n---------------------"
-                            print(f"\n[Tool Execution Result: {message.name}]")
-                            accumulated_tool_info.append(tool_info)
-                            if self.out_queue:
-                                self.out_queue.put(
-                                    {"type": "chat_message", "data": tool_info}
-                                )
+                            emit_tool_message(message)
             return None
 
-        return callback_func, accumulated_text, accumulated_tool_info
+        if stream_mode == STREAM_MODE_MESSAGES:
+            return (
+                token_callback_func,
+                accumulated_text,
+                accumulated_tool_info,
+                accumulated_usage,
+            )
+        return callback_func, accumulated_text, accumulated_tool_info, accumulated_usage
 
     async def processQuery(
         self,
@@ -117,11 +427,28 @@ class OllamaAgentManager:
         system_prompt,
         query: str,
         timeout: int = DEFAULT_QUERY_TIMEOUT,
+        recursion_limit: int = RECURSION_LIMIT,
+        step_budget: Optional[int] = None,
+        answer_model: Optional[ChatOllama] = None,
+        force_answer: bool = True,
+        instruction: Optional[str] = None,
     ):
+        """
+        Run one query. The ReAct loop is watched by a LoopGuard (step and
+        wall-clock budgets, repeated tool calls); when it trips, the model is
+        asked for a final answer without tools, or, with force_answer=False,
+        the query fails with a step_budget error so the cascade can escalate.
+        instruction is sent as a system message after the query; the caller
+        removes it from the conversation.
+        """
         try:
-            streaming_callback, accumulated_text, accumulated_tool_info = (
-                self.getStreamingCallback()
-            )
+            start_time = time.perf_counter()
+            (
+                streaming_callback,
+                accumulated_text,
+                accumulated_tool_info,
+                accumulated_usage,
+            ) = self.getStreamingCallback(self.STREAM_MODE)
             if system_prompt:
                 initial_messages = [
                     SystemMessage(content=system_prompt),
@@ -129,24 +456,69 @@ class OllamaAgentManager:
                 ]
             else:
                 initial_messages = [HumanMessage(content=query)]
+            if instruction:
+                initial_messages.append(SystemMessage(content=instruction))
             inputs = {"messages": initial_messages}
-            config = RunnableConfig(
-                recursion_limit=RECURSION_LIMIT,
-                configurable={"thread_id": self.QUERY_THREAD_ID},
+            config = self.getRunConfig(recursion_limit)
+
+            guard = LoopGuard(
+                step_budget or self.agent_step_budget, timeout, self.loop_repeat_limit
             )
 
-            if self.USE_ASTREAM_LOG:
-                async for chunk in agent.astream_log(
-                    inputs, config=config, include_types=["llm", "tool"]
-                ):
-                    streaming_callback(chunk.ops[0]["value"])
-            else:
+            async def consume_stream():
+                if self.STREAM_MODE == STREAM_MODE_MESSAGES:
+                    async with aclosing(
+                        agent.astream(
+                            inputs, config=config, stream_mode=["messages", "updates"]
+                        )
+                    ) as stream:
+                        async for mode, data in stream:
+                            streaming_callback(mode, data)
+                            if mode == "updates":
+                                guard.observeUpdate(data)
+                                if guard.check():
+                                    return
+                else:
+                    async with aclosing(
+                        agent.astream_log(
+                            inputs, config=config, include_types=["llm", "tool"]
+                        )
+                    ) as stream:
+                        async for chunk in stream:
+                            for update in nodeUpdatesFromLog(chunk.ops):
+                                streaming_callback(update)
+                                guard.observeUpdate(update)
+                            if guard.check():
+                                return
+
+            if self.STREAM_MODE == STREAM_MODE_MESSAGES and isinstance(
+                agent, ChatOllama
+            ):
+                # plain chat model without tools: stream its chunks directly
+                async for chunk in agent.astream(initial_messages, config=config):
+                    streaming_callback("messages", (chunk, {}))
+            elif self.STREAM_MODE in (STREAM_MODE_MESSAGES, STREAM_MODE_LOG):
+                try:
+                    await asyncio.wait_for(consume_stream(), timeout)
+                except asyncio.TimeoutError:
+                    guard.reason = ABORT_TIME_BUDGET
+                if guard.reason:
+                    abort = await self.handleLoopAbort(
+                        agent, guard, streaming_callback, answer_model, force_answer
+                    )
+                    if abort is not None:
+                        return abort
+            elif self.STREAM_MODE == STREAM_MODE_INVOKE:
                 try:
-                    response = await agent.ainvoke(inputs, config=config)
+                    response = await asyncio.wait_for(
+                        agent.ainvoke(inputs, config=config), timeout
+                    )
                     if isinstance(response, dict) and "messages" in response:
                         final_message = response["messages"][-1]
                         if isinstance(final_message, (AIMessage, ToolMessage)):
                             content = final_message.content
+                            if isinstance(content, str):
+                                content = stripThinking(content)
                             print(content, end="", flush=True)
                             accumulated_text.append(content)
 
@@ -162,7 +534,7 @@ class OllamaAgentManager:
 
                 except Exception as e:
                     print(f"\nError during response generation: {str(e)}")
-                    return {"error": str(e)}
+                    return {"error": str(e), "error_type": self.classifyError(e)}
 
             full_response = (
                 "".join(accumulated_text).strip()
@@ -172,7 +544,16 @@ class OllamaAgentManager:
             tool_info = (
                 "\n".join(accumulated_tool_info) if accumulated_tool_info else ""
             )
-            return {"output": full_response, "tool_calls": tool_info}
+            result = {
+                "output": full_response,
+                "streamed": self.STREAM_MODE == STREAM_MODE_MESSAGES,
+                "tool_calls": tool_info,
+                "usage": accumulated_usage,
+                "duration": time.perf_counter() - start_time,
+            }
+            if guard.reason:
+                result["loop_abort"] = guard.getReport()
+            return result
 
         except asyncio.TimeoutError:
             return {
@@ -182,7 +563,77 @@ class OllamaAgentManager:
             import traceback
 
             print(f"\nDebug info: {traceback.format_exc()}")
-            return {"error": f"❌ An error occurred: {str(e)}"}
+            return {
+                "error": f"❌ An error occurred: {str(e)}",
+                "error_type": self.classifyError(e),
+            }
+
+    async def handleLoopAbort(
+        self, agent, guard, streaming_callback, answer_model, force_answer
+    ):
+        """Returns an error result, or None once a final answer was forced."""
+        report = guard.getReport()
+        self.loop_abort_log.record(self.model_name, guard, force_answer)
+        message = (
+            f"[Loop guard] Stopped after {report['steps']} steps, "
+            f"{report['elapsed']:.0f}s ({guard.reason})"
+        )
+        print(f"\n{message}")
+        await self.answerPendingToolCalls(
+            agent, "Skipped: the agent loop was stopped."
+        )
+        if not force_answer:
+            return {
+                "error": message,
+                "error_type": TRIGGER_STEP_BUDGET,
+                "loop_abort": report,
+            }
+        if self.out_queue:
+            self.out_queue.put(
+                {"type": "system_message", "data": f"{message}. Answering now."}
+            )
+        try:
+            await asyncio.wait_for(
+                self.forceFinalAnswer(
+                    agent, answer_model or self.chat_model, streaming_callback
+                ),
+                FORCE_ANSWER_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            return {
+                "error": f"{message}; no final answer within "
+                f"{FORCE_ANSWER_TIMEOUT} seconds.",
+                "loop_abort": report,
+            }
+        return None
+
+    async def forceFinalAnswer(self, agent, answer_model, streaming_callback):
+        """Ask the model, without tools, to answer from what it gathered."""
+        messages = await self.getThreadMessages(agent)
+        prompt = messages + [SystemMessage(content=FORCE_ANSWER_INSTRUCTION)]
+        answer = None
+        async for chunk in answer_model.astream(prompt):
+            answer = chunk if answer is None else answer + chunk
+            if self.STREAM_MODE == STREAM_MODE_MESSAGES:
+                streaming_callback("messages", (chunk, {}))
+        if self.STREAM_MODE == STREAM_MODE_MESSAGES:
+            streaming_callback("updates", {})  # flush held-back text
+        content = answer.content if answer is not None else ""
+        if self.STREAM_MODE != STREAM_MODE_MESSAGES:
+            streaming_callback({"agent": {"messages": [AIMessage(content=content)]}})
+        await agent.aupdate_state(
+            self.getRunConfig(),
+            {"messages": [AIMessage(content=content)]},
+            as_node="agent",
+        )
+
+    @staticmethod
+    def classifyError(error: Exception) -> Optional[str]:
+        if isinstance(error, GraphRecursionError):
+            return TRIGGER_STEP_BUDGET
+        if isinstance(error, OutputParserException):
+            return TRIGGER_TOOL_CALL_PARSE
+        return None
 
     async def chat(
         self,
@@ -193,17 +644,558 @@ class OllamaAgentManager:
     ):
         if self.agent is None:
             raise RuntimeError("Agent is not initialized. Call initialize() first.")
+        await self.probeEndpoints()
         if self.is_first_chat:
             system_prompt = system_prompt or self.system_prompt
             self.is_first_chat = False
         else:
             system_prompt = ""
-        return await self.processQuery(
-            self.agent,
-            system_prompt,
-            query,
-            timeout=timeout or DEFAULT_QUERY_TIMEOUT,
+        start_time = time.perf_counter()
+        if self.cassette and self.cassette.recording:
+            self.cassette.recordQuery(query, system_prompt)
+        agent, tools, routing_report = self.routeTools(query)
+        prompt, prefetch_report = query, None
+        if self.prefetcher:
+            prompt, prefetch_report = await self.prefetcher.prefetch(query)
+            if prefetch_report:
+                self.reportPrefetch(prefetch_report)
+        memory_report = None
+        if self.memory:
+            memory_context, memory_report = await self.memory.recall(
+                query, exclude=self.conversation
+            )
+            if memory_context:
+                prompt = f"{prompt}\n\n{memory_context}"
+                print(
+                    f"[Memory] Added {memory_report['snippets']} snippets "
+                    f"(~{memory_report['tokens']} tokens) in {memory_report['recall_ms']:.0f} ms"
+                )
+        cache_key = None
+        if self.response_cache:
+            cache_key = ResponseCache.makeKey(
+                self.model_name,
+                self.temperature,
+                system_prompt,
+                self.conversation,
+                prompt,
+                tool_names=[tool.name for tool in tools],
+            )
+            entry = self.response_cache.get(cache_key)
+            if entry is not None:
+                result = await self.replayCachedResponse(
+                    agent, system_prompt, query, entry
+                )
+                self.recordTurn(query, result)
+                await self.recordQueryMetrics(agent, result, start_time)
+                return result
+
+        recorder = RecordingQueue(self.out_queue)
+        original_out_queue, self.out_queue = self.out_queue, recorder
+        tool_results_token = ACTIVE_TOOL_RESULTS.set(
+            await self.prepareToolResults(agent)
         )
+        try:
+            timeout = timeout or DEFAULT_QUERY_TIMEOUT
+            result = None
+            if self.fan_out:
+                plan_start = time.perf_counter()
+                result = await self.fan_out.run(
+                    agent, system_prompt, query, prompt, tools, timeout=timeout
+                )
+                # a plan that was not used still came out of the query's time
+                timeout = max(timeout - (time.perf_counter() - plan_start), 1)
+            if result is None and self.cascade_model:
+                result = await self.runCascade(
+                    agent, tools, system_prompt, prompt, timeout=timeout
+                )
+            elif result is None:
+                result = await self.processQuery(
+                    agent, system_prompt, prompt, timeout=timeout
+                )
+        finally:
+            self.out_queue = original_out_queue
+            ACTIVE_TOOL_RESULTS.reset(tool_results_token)
+        if routing_report:
+            result["tool_routing"] = routing_report
+        if prefetch_report:
+            result["prefetch"] = prefetch_report
+        if memory_report:
+            result["memory"] = memory_report
+        tool_diff_report = self.tool_results.getReport()
+        if tool_diff_report:
+            result["tool_diff"] = tool_diff_report
+            print(
+                f"[Tool results] {tool_diff_report['compacted']} repeated results sent "
+                f"as diffs, ~{tool_diff_report['chars_saved']} characters saved"
+            )
+        await self.restoreQueryInContext(agent, query, prompt)
+        if self.memory:
+            self.memory.requestSync()
+        if self.prefetcher and "error" not in result:
+            await self.measureRoundTrip(agent, result)
+        if self.strip_reasoning and "error" not in result:
+            result["reasoning_tokens_saved"] = await self.stripReasoningFromContext(
+                agent
+            )
+        if cache_key and "error" not in result:
+            await self.cacheResponse(agent, cache_key, recorder.events, result)
+        self.recordTurn(query, result)
+        await self.recordQueryMetrics(agent, result, start_time)
+        return result
+
+    async def recordQueryMetrics(self, agent, result: dict, start_time: float):
+        if "error" in result:
+            outcome = "error"
+        elif result.get("cached"):
+            outcome = "cached"
+        else:
+            outcome = "ok"
+        QUERIES.inc(outcome=outcome)
+        QUERY_SECONDS.observe(time.perf_counter() - start_time, outcome=outcome)
+        # a cached answer replays the original run's usage; nothing was generated
+        usage = (result.get("usage") or {}) if outcome == "ok" else {}
+        for kind in ("input", "output"):
+            if usage.get(f"{kind}_tokens"):
+                MODEL_TOKENS.inc(usage[f"{kind}_tokens"], kind=kind)
+        try:
+            CHECKPOINT_MESSAGES.set(len(await self.getThreadMessages(agent)))
+        except Exception as e:
+            print(f"[Metrics] Could not count checkpointed messages: {e}")
+
+    async def compareModels(
+        self,
+        query: str,
+        models: List[str],
+        system_prompt: Optional[str] = None,
+        timeout: int = DEFAULT_QUERY_TIMEOUT,
+    ) -> dict:
+        """Run the query on each model side by side; see ModelComparison."""
+        await self.probeEndpoints()
+        comparison = ModelComparison(self, self.out_queue)
+        return await comparison.run(
+            query, models, system_prompt=system_prompt, timeout=timeout
+        )
+
+    def configureFanOut(self, enabled: bool, max_parallel: int, max_subtasks: int):
+        """Split multi-item questions into parallel sub-agents (FanOutPlanner)."""
+        self.fan_out = (
+            FanOutPlanner(self, max_parallel=max_parallel, max_subtasks=max_subtasks)
+            if enabled
+            else None
+        )
+
+    def configureToolResultDiff(self, enabled: bool):
+        self.tool_result_diff = enabled
+        if not enabled:
+            self.tool_results.clear()
+
+    async def prepareToolResults(self, agent) -> Optional[ToolResultMemory]:
+        """
+        The memory repeated tool results are diffed against during this
+        query, trimmed to the tool results still in the conversation; None
+        when diffing is off.
+        """
+        self.tool_results.beginQuery()
+        if not self.tool_result_diff:
+            return None
+        await self.syncToolResults(agent)
+        return self.tool_results
+
+    async def syncToolResults(self, agent):
+        messages = await self.getThreadMessages(agent)
+        self.tool_results.retain(
+            m.content
+            for m in messages
+            if isinstance(m, ToolMessage) and isinstance(m.content, str)
+        )
+
+    def configurePrefetch(
+        self,
+        enabled: bool,
+        allowed_dirs: List[str],
+        allowed_hosts: List[str],
+        max_bytes: int,
+    ):
+        """Attach small files and pages mentioned in a query before it runs."""
+        if not enabled:
+            self.prefetcher = None
+            return
+        latencies = self.prefetcher.round_trip_latencies if self.prefetcher else []
+        self.prefetcher = PromptPrefetcher(allowed_dirs, allowed_hosts, max_bytes)
+        self.prefetcher.round_trip_latencies = latencies
+
+    def configureMemory(
+        self, enabled: bool, embedding_model: str, top_k: int, token_budget: int
+    ):
+        """Recall snippets of past chats into new queries (see ChatMemory)."""
+        setting = (enabled, embedding_model, top_k, token_budget)
+        if setting == self.memory_setting:
+            return
+        self.memory_setting = setting
+        if self.memory:
+            self.memory.stop()
+            self.memory = None
+        if not enabled or not embedding_model:
+            return
+        options = {"model": embedding_model}
+        if self.endpoint_pool:
+            options["base_url"] = self.endpoint_pool.endpoints[0].url
+        self.memory = ChatMemory(
+            OllamaEmbeddings(**options),
+            embedding_model,
+            top_k=top_k,
+            token_budget=token_budget,
+        )
+        self.memory.start()
+
+    def reportPrefetch(self, report: dict):
+        saved = report["estimated_saved_ms"]
+        message = (
+            f"Attached {', '.join(report['sources'])} "
+            f"({report['bytes'] / 1024:.1f} KB) in {report['prefetch_ms']:.0f} ms"
+        )
+        if saved is not None:
+            message += f", saving about {saved / 1000:.1f} s of tool round trip"
+        print(f"[Prefetch] {message}")
+        if self.out_queue:
+            self.out_queue.put({"type": "system_message", "data": message + "."})
+
+    async def measureRoundTrip(self, agent, result: dict):
+        """Average model round trip of the last query, for prefetch estimates."""
+        if "duration" not in result or result.get("cached"):
+            return
+        model_calls = 1
+        if not isinstance(agent, ChatOllama):
+            state = await agent.aget_state(self.getRunConfig())
+            model_calls = 0
+            for message in reversed(state.values.get("messages", [])):
+                if isinstance(message, HumanMessage):
+                    break
+                model_calls += isinstance(message, AIMessage)
+        self.prefetcher.recordRoundTrip(result["duration"] / max(model_calls, 1))
+
+    def configureReadOnlyTools(self, tool_names: List[str]):
+        """
+        Tools that only read. Turns that call any other tool are never cached,
+        and the fan-out planner is given only these.
+        """
+        self.read_only_tools = set(tool_names)
+        if self.response_cache:
+            self.response_cache.read_only_tools = self.read_only_tools
+
+    def configureResponseCache(self, enabled: bool, max_bytes: int):
+        if not enabled:
+            if self.response_cache:
+                self.response_cache.close()
+            self.response_cache = None
+        elif self.response_cache is None:
+            self.response_cache = ResponseCache(
+                max_bytes=max_bytes, read_only_tools=self.read_only_tools
+            )
+        else:
+            self.response_cache.max_bytes = max_bytes
+
+    def recordTurn(self, query: str, result: dict):
+        # normalized conversation state, part of the response cache key
+        self.conversation.append(f"user: {query}")
+        self.conversation.append(
+            f"assistant: {result.get('output', result.get('error', ''))}"
+        )
+
+    async def getTurnToolCalls(self, agent) -> List[dict]:
+        """Tool calls the agent made during the last query."""
+        if isinstance(agent, ChatOllama):
+            return []
+        state = await agent.aget_state(self.getRunConfig())
+        tool_calls = []
+        for message in reversed(state.values.get("messages", [])):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                tool_calls.extend(message.tool_calls)
+        return tool_calls
+
+    async def cacheResponse(self, agent, cache_key: str, events: List, result: dict):
+        """
+        Store the answer unless a hit could not reproduce it: tools that may
+        change state, or sub-agents whose tool calls are not in the checkpoint.
+        """
+        if "fan_out" in result:
+            return
+        tool_calls = await self.getTurnToolCalls(agent)
+        uncacheable = self.response_cache.getUncacheableTools(tool_calls)
+        if uncacheable:
+            print(f"[Response cache] Not cached: called {', '.join(uncacheable)}")
+            return
+        touched = set()
+        for tool_call in tool_calls:
+            touched |= findPathArguments(tool_call.get("args"))
+        self.response_cache.put(cache_key, events, result, touched)
+
+    def configureCassette(self, cassette):
+        """Record or replay Ollama traffic through the given Cassette."""
+        self.cassette = cassette
+        if self.agent is not None:
+            self.rebindTools(self.mcp_tools)
+
+    def configureLoopGuard(self, step_budget: int, repeat_limit: int):
+        """0 disables the step budget or the repeated-call check."""
+        self.agent_step_budget = step_budget
+        self.loop_repeat_limit = repeat_limit
+
+    def configureReasoning(self, strip_from_context: bool):
+        self.strip_reasoning = strip_from_context
+
+    async def stripReasoningFromContext(self, agent) -> int:
+        """
+        Remove <think> blocks from the AI messages kept in the agent's memory
+        so later turns don't re-process them. Returns the estimated prompt
+        tokens saved per following turn.
+        """
+        if isinstance(agent, ChatOllama):
+            return 0
+        stripped = []
+        saved = 0
+        for message in await self.getThreadMessages(agent):
+            if not isinstance(message, AIMessage) or not isinstance(
+                message.content, str
+            ):
+                continue
+            content = stripThinking(message.content)
+            if content == message.content:
+                continue
+            saved += estimateTokens(message.content) - estimateTokens(content)
+            # same id, so the checkpointer replaces the message
+            stripped.append(message.model_copy(update={"content": content}))
+        if stripped:
+            await agent.aupdate_state(
+                self.getRunConfig(), {"messages": stripped}, as_node="agent"
+            )
+            print(f"\n[Reasoning] ~{saved} prompt tokens removed from context")
+        return saved
+
+    async def restoreQueryInContext(self, agent, query: str, prompt: str):
+        """
+        Store the turn's question as the user typed it. The prompt the model
+        got (the query with attached files and recalled memories, or the
+        fan-out reduce prompt that starts with it) is not re-sent with every
+        later turn.
+        """
+        if isinstance(agent, ChatOllama):
+            return
+        for message in reversed(await self.getThreadMessages(agent)):
+            if not isinstance(message, HumanMessage):
+                continue
+            content = message.content
+            if (
+                isinstance(content, str)
+                and content != query
+                and content.startswith(prompt)
+            ):
+                await agent.aupdate_state(
+                    self.getRunConfig(),
+                    {"messages": [message.model_copy(update={"content": query})]},
+                    as_node="agent",
+                )
+            return
+
+    async def closeCancelledTurn(self):
+        if self.agent is not None:
+            await self.answerPendingToolCalls(self.agent, "Cancelled by user.")
+
+    async def answerPendingToolCalls(self, agent, content: str):
+        """
+        A query stopped during a tool call leaves an AIMessage whose tool
+        calls have no results, which the agent rejects on the next query.
+        Answer those calls with the given notice.
+        """
+        if isinstance(agent, ChatOllama):
+            return
+        messages = await self.getThreadMessages(agent)
+        answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+        pending = [
+            ToolMessage(
+                content=content,
+                tool_call_id=tool_call["id"],
+                name=tool_call["name"],
+                status="error",
+            )
+            for message in messages
+            if isinstance(message, AIMessage)
+            for tool_call in message.tool_calls
+            if tool_call["id"] not in answered
+        ]
+        if pending:
+            await agent.aupdate_state(
+                self.getRunConfig(), {"messages": pending}, as_node="tools"
+            )
+
+    async def replayCachedResponse(self, agent, system_prompt, query, entry):
+        """
+        Feed a cached response through the normal streaming path and append
+        the turn to the agent's memory so follow-up questions keep context.
+        """
+        print("[Response cache] Hit. Replaying cached response.")
+        start_time = time.perf_counter()
+        for event in entry["events"]:
+            if self.out_queue:
+                self.out_queue.put(event)
+            await asyncio.sleep(0)
+        result = dict(entry["result"])
+        if not isinstance(agent, ChatOllama):
+            messages = [HumanMessage(content=query), AIMessage(content=result["output"])]
+            if system_prompt:
+                messages.insert(0, SystemMessage(content=system_prompt))
+            await agent.aupdate_state(
+                self.getRunConfig(), {"messages": messages}, as_node="agent"
+            )
+        result["cached"] = True
+        result["duration"] = time.perf_counter() - start_time
+        return result
+
+    def configureToolRouting(self, top_k: int, pinned_tools: Optional[List] = None):
+        """top_k <= 0 disables routing and every tool is sent to the model."""
+        self.tool_router_top_k = top_k
+        self.pinned_tools = list(pinned_tools or [])
+        if self.tool_router:
+            self.tool_router.top_k = top_k
+            self.tool_router.pinned = set(self.pinned_tools)
+
+    def routeTools(self, query: str):
+        """
+        Returns the agent to run for this query, bound only to the tools the
+        router picked, and a report of the prompt tokens saved (or None).
+        """
+        if not self.tool_router or not self.tool_router.isEnabled():
+            tools = self.tool_router.tools if self.tool_router else []
+            return self.agent, tools, None
+        tools, report = self.tool_router.selectTools(query)
+        if len(tools) == len(self.tool_router.tools):
+            return self.agent, tools, report
+        key = tuple(tool.name for tool in tools)
+        if key not in self.routed_agents:
+            self.routed_agents[key] = create_react_agent(
+                model=self.chat_model, tools=tools, checkpointer=self.checkpointer
+            )
+        print(
+            f"[Tool router] {report['tools_selected']}/{report['tools_total']} tools "
+            f"({', '.join(report['tool_names'])}), "
+            f"~{report['schema_tokens_saved']} prompt tokens saved"
+        )
+        return self.routed_agents[key], tools, report
+
+    def getCascadeAgent(self, tools: List):
+        key = tuple(tool.name for tool in tools)
+        if key not in self.cascade_agents:
+            large_model = self.createOllamaModel(self.temperature, self.cascade_model)
+            self.cascade_chat_model = large_model
+            self.cascade_agents[key] = (
+                create_react_agent(
+                    model=large_model, tools=tools, checkpointer=self.checkpointer
+                )
+                if tools
+                else large_model
+            )
+        return self.cascade_agents[key]
+
+    async def getThreadMessages(self, agent) -> List:
+        if isinstance(agent, ChatOllama):
+            return []
+        state = await agent.aget_state(self.getRunConfig())
+        return state.values.get("messages", [])
+
+    async def runCascade(self, agent, tools, system_prompt, query, timeout):
+        """
+        Answer with the small model under a step budget and re-run the query
+        on the large model if a trigger fires. The small model's attempt is
+        removed from the conversation before escalating, and its streamed
+        answer is held back or collapsed (see HeldBackQueue).
+        """
+        instruction = None
+        if TRIGGER_LOW_CONFIDENCE in self.cascade_triggers:
+            # sent on every turn; the system prompt only goes with the first
+            instruction = CONFIDENCE_INSTRUCTION.format(
+                marker=self.cascade_marker
+            ).strip()
+        before_ids = {m.id for m in await self.getThreadMessages(agent)}
+        original_out_queue = self.out_queue
+        held_back = None
+        if original_out_queue is not None:
+            held_back = HeldBackQueue(original_out_queue, self.cascade_marker)
+            self.out_queue = held_back
+        try:
+            result = await self.processQuery(
+                agent,
+                system_prompt,
+                query,
+                timeout=timeout,
+                recursion_limit=self.cascade_step_budget,
+                step_budget=self.cascade_step_budget,
+                force_answer=False,
+                instruction=instruction,
+            )
+        finally:
+            self.out_queue = original_out_queue
+        small_duration = result.get("duration", 0.0)
+        new_messages = [
+            m for m in await self.getThreadMessages(agent) if m.id not in before_ids
+        ]
+        reason = detectEscalation(
+            result, new_messages, self.cascade_triggers, self.cascade_marker
+        )
+        if held_back is not None:
+            held_back.finish(escalated=reason is not None)
+        instruction_messages = [
+            m
+            for m in new_messages
+            if isinstance(m, SystemMessage) and m.content == instruction
+        ]
+        if not reason and instruction_messages:
+            # the small model got the instruction; the conversation keeps no copy
+            await agent.aupdate_state(
+                self.getRunConfig(),
+                {"messages": [RemoveMessage(id=m.id) for m in instruction_messages]},
+            )
+        large_duration = None
+        if reason:
+            print(f"\n[Cascade] Escalating to {self.cascade_model} ({reason})")
+            if self.out_queue:
+                self.out_queue.put(
+                    {
+                        "type": "system_message",
+                        "data": f"[Cascade] Escalating to {self.cascade_model} ({reason})",
+                    }
+                )
+            if new_messages and not isinstance(agent, ChatOllama):
+                # an emptied thread has no last message for the agent's router
+                await agent.aupdate_state(
+                    self.getRunConfig(),
+                    {"messages": [RemoveMessage(id=m.id) for m in new_messages]},
+                    as_node=None if before_ids else "tools",
+                )
+                # the large model must not get diffs against the removed results
+                await self.syncToolResults(agent)
+            large_agent = self.getCascadeAgent(tools)
+            result = await self.processQuery(
+                large_agent,
+                system_prompt,
+                query,
+                timeout=timeout,
+                answer_model=self.cascade_chat_model,
+            )
+            large_duration = result.get("duration", 0.0)
+        result["cascade"] = self.cascade_stats.record(
+            self.model_name,
+            self.cascade_model,
+            reason,
+            small_duration,
+            large_duration,
+        )
+        print(
+            f"[Cascade] escalation rate: {self.cascade_stats.escalations}/"
+            f"{self.cascade_stats.queries} ({self.cascade_stats.escalationRate():.0%})"
+        )
+        return result
 
     def reset(
         self, temperature: float = DEFAULT_TEMPERATURE, mcp_tools: Optional[List] = None
@@ -213,5 +1205,25 @@ class OllamaAgentManager:
         temperature, mcp_tools를 지정하지 않으면 기존 값 사용.
         """
         tools = mcp_tools if mcp_tools is not None else self.mcp_tools
+        self.mcp_tools = tools
+        self.checkpointer = MemorySaver()
         self.createChatModel(temperature=temperature, mcp_tools=tools)
         self.is_first_chat = True
+        self.conversation = []
+        self.tool_results.clear()
+        CHECKPOINT_MESSAGES.set(0)
+
+    def rebindTools(self, mcp_tools: List):
+        """
+        Rebuild the agent with a different tool set while keeping the
+        conversation, since the checkpointer is shared across rebuilds. An
+        agent that already uses the checkpointer stays a ReAct agent when no
+        tools are left (every server down), so the conversation is not lost.
+        """
+        self.mcp_tools = mcp_tools
+        self.createChatModel(
+            temperature=self.temperature,
+            mcp_tools=mcp_tools,
+            checkpointed=self.agent is not None
+            and not isinstance(self.agent, ChatOllama),
+        )
@@ -0,0 +1,147 @@
+import json
+import time
+from collections import Counter
+
+from langchain_core.messages import AIMessage
+
+from metrics import REGISTRY
+
+LOOP_ABORT_LOG_FILE = "loop_abort_log.jsonl"
+
+ABORT_STEP_BUDGET = "step_budget"
+ABORT_TIME_BUDGET = "time_budget"
+ABORT_REPEATED_CALL = "repeated_call"
+ABORT_OSCILLATION = "oscillation"
+
+LOOP_ABORTS = REGISTRY.counter(
+    "agent_loop_aborts_total",
+    "Agent loops stopped by the loop guard.",
+    labels=("reason",),
+)
+
+# longest cycle of distinct tool calls recognized as oscillation (A B A B ...)
+MAX_OSCILLATION_PERIOD = 3
+# seconds the model gets for the tool-less final answer after an abort
+FORCE_ANSWER_TIMEOUT = 60
+# astream_log patch path that carries the graph's node updates
+LOG_NODE_UPDATE_PATH = "/streamed_output/-"
+FORCE_ANSWER_INSTRUCTION = (
+    "Stop calling tools. Using only the information gathered above, give your "
+    "best final answer to the user's last question now. If something could not "
+    "be found, say so briefly."
+)
+
+
+def toolCallSignature(tool_call):
+    return (
+        tool_call.get("name", ""),
+        json.dumps(tool_call.get("args", {}), sort_keys=True, default=str),
+    )
+
+
+def nodeUpdatesFromLog(ops):
+    """
+    The node updates ({node: {"messages": [...]}}) in an astream_log patch;
+    its other ops are run-log entries for the model and tool runs.
+    """
+    return [
+        op["value"]
+        for op in ops
+        if op.get("op") == "add" and op.get("path") == LOG_NODE_UPDATE_PATH
+    ]
+
+
+class LoopGuard:
+    """
+    Watches one query's ReAct loop and decides when to stop it: after
+    max_steps graph steps, after max_seconds, when the same tool call with the
+    same arguments is made repeat_limit times, or when the last calls cycle
+    through the same few calls twice in a row.
+    """
+
+    def __init__(self, max_steps, max_seconds, repeat_limit):
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.repeat_limit = repeat_limit
+        self.start_time = time.perf_counter()
+        self.steps = 0
+        self.calls = []
+        self.reason = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def observeUpdate(self, data):
+        """Count a step per node update and remember the tool calls made."""
+        if not isinstance(data, dict):
+            return
+        for update in data.values():
+            if not isinstance(update, dict) or "messages" not in update:
+                continue
+            self.steps += 1
+            for message in update["messages"]:
+                if isinstance(message, AIMessage):
+                    self.calls.extend(
+                        toolCallSignature(call) for call in message.tool_calls
+                    )
+
+    def check(self):
+        """Returns the abort reason, or None while the loop may continue."""
+        if self.reason is None:
+            self.reason = self.findReason()
+        return self.reason
+
+    def findReason(self):
+        if self.max_steps and self.steps >= self.max_steps:
+            return ABORT_STEP_BUDGET
+        if self.max_seconds and self.elapsed >= self.max_seconds:
+            return ABORT_TIME_BUDGET
+        if not self.calls:
+            return None
+        if (
+            self.repeat_limit
+            and Counter(self.calls).most_common(1)[0][1] >= self.repeat_limit
+        ):
+            return ABORT_REPEATED_CALL
+        for period in range(2, MAX_OSCILLATION_PERIOD + 1):
+            tail = self.calls[-2 * period :]
+            if (
+                len(tail) == 2 * period
+                and tail[:period] == tail[period:]
+                and len(set(tail[:period])) > 1
+            ):
+                return ABORT_OSCILLATION
+        return None
+
+    def getReport(self):
+        return {
+            "reason": self.reason,
+            "steps": self.steps,
+            "elapsed": round(self.elapsed, 3),
+            "last_calls": [name for name, _args in self.calls[-6:]],
+        }
+
+
+class LoopAbortLog:
+    """Loop-abort events appended to LOOP_ABORT_LOG_FILE as JSON lines."""
+
+    def __init__(self, log_file=LOOP_ABORT_LOG_FILE):
+        self.log_file = log_file
+
+    def record(self, model, guard, forced_answer):
+        entry = {
+            "ts": round(time.time(), 3),
+            "model": model,
+            "max_steps": guard.max_steps,
+            "max_seconds": guard.max_seconds,
+            "forced_answer": forced_answer,
+            **guard.getReport(),
+        }
+        LOOP_ABORTS.inc(reason=entry["reason"])
+        try:
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[Loop guard] Could not write log: {e}")
+        return entry
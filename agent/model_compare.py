@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    HumanMessage,
+    SystemMessage,
+)
+from langgraph.prebuilt import create_react_agent
+
+from agent.think_parser import KIND_REASONING, ThinkStreamParser
+from constants import DEFAULT_QUERY_TIMEOUT, RECURSION_LIMIT
+
+COMPARE_RESULTS_FILE = "model_comparisons.jsonl"
+
+
+class ModelRun:
+    """Metrics of one model's answer in a comparison."""
+
+    def __init__(self, index, model):
+        self.index = index
+        self.model = model
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+        self.answer = []
+        self.reasoning_chars = 0
+        self.tool_calls = 0
+        self.model_calls = 0
+        self.prompt_tokens = None
+        self.output_tokens = 0
+        self.eval_count = 0
+        self.eval_seconds = 0.0
+        self.error = None
+
+    def observeMessage(self, message: AIMessage):
+        """Count a finished model response (an agent step)."""
+        self.model_calls += 1
+        self.tool_calls += len(message.tool_calls)
+        usage = message.usage_metadata or {}
+        if self.prompt_tokens is None and usage.get("input_tokens"):
+            # the first call's prompt: system prompt, tool schemas and query
+            self.prompt_tokens = usage["input_tokens"]
+        self.output_tokens += usage.get("output_tokens", 0)
+        metadata = message.response_metadata or {}
+        if metadata.get("eval_count") and metadata.get("eval_duration"):
+            self.eval_count += metadata["eval_count"]
+            self.eval_seconds += metadata["eval_duration"] / 1e9
+
+    def getMetrics(self):
+        end_time = self.end_time or time.perf_counter()
+        total = end_time - self.start_time
+        if self.eval_seconds:
+            tokens_per_second = self.eval_count / self.eval_seconds
+        elif self.first_token_time and end_time > self.first_token_time:
+            tokens_per_second = self.output_tokens / (end_time - self.first_token_time)
+        else:
+            tokens_per_second = None
+        return {
+            "model": self.model,
+            "ttft_ms": round((self.first_token_time - self.start_time) * 1000, 1)
+            if self.first_token_time
+            else None,
+            "total_ms": round(total * 1000, 1),
+            "tokens_per_s": round(tokens_per_second, 1) if tokens_per_second else None,
+            "output_tokens": self.output_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "tool_calls": self.tool_calls,
+            "model_calls": self.model_calls,
+            "reasoning_chars": self.reasoning_chars,
+            "output": "".join(self.answer),
+            "error": self.error,
+        }
+
+
+class ModelComparison:
+    """
+    Sends one prompt, with the same tool set, to several models at once.
+    Each model runs in a fresh agent without the chat's memory so they all
+    see the same input. Answer tokens are streamed to out_queue as
+    compare_token events tagged with the model's pane index, each finished
+    model as compare_model_done, and every comparison is appended to
+    COMPARE_RESULTS_FILE.
+    """
+
+    def __init__(self, manager, out_queue=None, results_file=COMPARE_RESULTS_FILE):
+        self.manager = manager
+        self.out_queue = out_queue
+        self.results_file = results_file
+
+    def put(self, event_type, data):
+        if self.out_queue:
+            self.out_queue.put({"type": event_type, "data": data})
+
+    async def run(
+        self,
+        query: str,
+        models: List[str],
+        system_prompt: Optional[str] = None,
+        timeout: int = DEFAULT_QUERY_TIMEOUT,
+    ) -> dict:
+        _agent, tools, _report = self.manager.routeTools(query)
+        system_prompt = system_prompt or self.manager.system_prompt
+        runs = [ModelRun(index, model) for index, model in enumerate(models)]
+        await asyncio.gather(
+            *(self.runModel(run, tools, system_prompt, query, timeout) for run in runs)
+        )
+        record = {
+            "ts": round(time.time(), 3),
+            "query": query,
+            "temperature": self.manager.temperature,
+            "tools": [tool.name for tool in tools],
+            "runs": [run.getMetrics() for run in runs],
+        }
+        self.save(record)
+        return record
+
+    async def runModel(self, run, tools, system_prompt, query, timeout):
+        chat_model = self.manager.createOllamaModel(self.manager.temperature, run.model)
+        messages = [HumanMessage(content=query)]
+        if system_prompt:
+            messages.insert(0, SystemMessage(content=system_prompt))
+        try:
+            await asyncio.wait_for(
+                self.streamModel(run, chat_model, tools, messages), timeout
+            )
+        except asyncio.TimeoutError:
+            run.error = f"timed out after {timeout}s"
+        except Exception as e:
+            run.error = str(e) or type(e).__name__
+        run.end_time = time.perf_counter()
+        self.put("compare_model_done", {"index": run.index, **run.getMetrics()})
+
+    async def streamModel(self, run, chat_model, tools, messages):
+        parser = ThinkStreamParser()
+
+        def on_text(text):
+            if run.first_token_time is None:
+                run.first_token_time = time.perf_counter()
+            for kind, segment in parser.feed(text):
+                if kind == KIND_REASONING:
+                    run.reasoning_chars += len(segment)
+                    continue
+                run.answer.append(segment)
+                self.put("compare_token", {"index": run.index, "text": segment})
+
+        if not tools:
+            final = None
+            async for chunk in chat_model.astream(messages):
+                if isinstance(chunk.content, str) and chunk.content:
+                    on_text(chunk.content)
+                final = chunk if final is None else final + chunk
+            if final is not None:
+                run.observeMessage(final)
+        else:
+            agent = create_react_agent(model=chat_model, tools=tools)
+            async for mode, data in agent.astream(
+                {"messages": messages},
+                config={"recursion_limit": RECURSION_LIMIT},
+                stream_mode=["messages", "updates"],
+            ):
+                if mode == "messages":
+                    message, _metadata = data
+                    if (
+                        isinstance(message, AIMessageChunk)
+                        and isinstance(message.content, str)
+                        and message.content
+                    ):
+                        on_text(message.content)
+                elif isinstance(data, dict):
+                    for update in data.values():
+                        if not isinstance(update, dict):
+                            continue
+                        for message in update.get("messages", []):
+                            if isinstance(message, AIMessage):
+                                run.observeMessage(message)
+        for kind, segment in parser.flush():
+            if kind == KIND_REASONING:
+                run.reasoning_chars += len(segment)
+            else:
+                run.answer.append(segment)
+                self.put("compare_token", {"index": run.index, "text": segment})
+
+    def save(self, record):
+        try:
+            with open(self.results_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[Compare] Could not save results: {e}")
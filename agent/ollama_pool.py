@@ -0,0 +1,317 @@
+import asyncio
+import statistics
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import httpx
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_ollama import ChatOllama
+from pydantic import ConfigDict, Field
+
+from agent.context_sizer import SizedChatOllama
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+PROBE_TIMEOUT = 2
+ENDPOINT_RETRY_SECONDS = 30
+LATENCY_SAMPLES = 50
+CONNECTION_ERRORS = (httpx.TransportError, ConnectionError, OSError)
+# ChatOllama fields that are not copied to the per-endpoint models
+ENDPOINT_EXCLUDED_FIELDS = {
+    "pool",
+    "endpoint_models",
+    "base_url",
+    "cache",
+    "callbacks",
+    "callback_manager",
+    "custom_get_token_ids",
+    "metadata",
+    "rate_limiter",
+    "tags",
+}
+
+
+class NoHealthyEndpointError(RuntimeError):
+    pass
+
+
+class OllamaEndpoint:
+    def __init__(self, url, weight=1, models=None):
+        self.url = url.rstrip("/")
+        self.weight = max(float(weight), 0.01)
+        self.models = set(models or [])
+        self.loaded_models = set()
+        self.in_flight = 0
+        self.down_until = 0.0
+        self.failures = 0
+        self.requests = 0
+        self.first_token_latencies = []
+        self.total_latencies = []
+        self.last_error = ""
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def servesModel(self, model):
+        # an endpoint without a model list is assumed to serve any model
+        return not self.models or model in self.models or model in self.loaded_models
+
+    def recordLatency(self, samples, value):
+        samples.append(value)
+        del samples[:-LATENCY_SAMPLES]
+
+    def getStats(self):
+        def median_ms(samples):
+            return statistics.median(samples) * 1000 if samples else None
+
+        return {
+            "healthy": self.healthy,
+            "weight": self.weight,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "loaded_models": sorted(self.loaded_models),
+            "first_token_ms": median_ms(self.first_token_latencies),
+            "total_ms": median_ms(self.total_latencies),
+            "last_error": self.last_error,
+        }
+
+
+class OllamaEndpointPool:
+    """
+    Routes each request to the least-loaded healthy Ollama endpoint that
+    serves the model. Load is in-flight requests divided by weight; endpoints
+    that already have the model loaded are preferred so it doesn't reload.
+    A failing endpoint is skipped for ENDPOINT_RETRY_SECONDS.
+    """
+
+    def __init__(self, endpoints):
+        self.endpoints = [
+            OllamaEndpoint(e["url"], e.get("weight", 1), e.get("models"))
+            for e in endpoints
+        ] or [OllamaEndpoint(DEFAULT_OLLAMA_URL)]
+        self.lock = threading.Lock()
+
+    @classmethod
+    def fromSettings(cls, endpoints_setting):
+        return cls(endpoints_setting or [{"url": DEFAULT_OLLAMA_URL}])
+
+    async def probe(self):
+        """
+        Refresh liveness and the loaded model list of every endpoint. The
+        endpoints are asked concurrently, so this takes at most PROBE_TIMEOUT.
+        """
+        async with httpx.AsyncClient(timeout=PROBE_TIMEOUT) as client:
+            await asyncio.gather(
+                *(self.probeEndpoint(client, e) for e in self.endpoints)
+            )
+
+    async def probeEndpoint(self, client, endpoint):
+        try:
+            response = await client.get(f"{endpoint.url}/api/ps")
+            response.raise_for_status()
+            data = response.json()
+            endpoint.loaded_models = {
+                m.get("name") or m.get("model") for m in data.get("models", [])
+            }
+            endpoint.down_until = 0.0
+        except Exception as e:
+            with self.lock:
+                self.markDown(endpoint, e)
+
+    def acquire(self, model, exclude=()):
+        with self.lock:
+            candidates = [
+                e
+                for e in self.endpoints
+                if e.healthy and e.servesModel(model) and e not in exclude
+            ]
+            if not candidates:
+                raise NoHealthyEndpointError(
+                    f"No healthy Ollama endpoint serves model '{model}'."
+                )
+            endpoint = min(
+                candidates,
+                key=lambda e: (
+                    (e.in_flight + 1) / e.weight,
+                    model not in e.loaded_models,
+                    (
+                        statistics.median(e.total_latencies)
+                        if e.total_latencies
+                        else 0
+                    ),
+                ),
+            )
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, model, start_time, first_token_time=None):
+        with self.lock:
+            endpoint.in_flight -= 1
+            endpoint.failures = 0
+            endpoint.loaded_models.add(model)
+            if first_token_time is not None:
+                endpoint.recordLatency(
+                    endpoint.first_token_latencies, first_token_time - start_time
+                )
+            endpoint.recordLatency(
+                endpoint.total_latencies, time.perf_counter() - start_time
+            )
+
+    def fail(self, endpoint, error):
+        with self.lock:
+            endpoint.in_flight -= 1
+            self.markDown(endpoint, error)
+
+    def markDown(self, endpoint, error):
+        endpoint.failures += 1
+        endpoint.last_error = str(error)
+        endpoint.down_until = time.monotonic() + ENDPOINT_RETRY_SECONDS
+        print(f"[Ollama pool] {endpoint.url} marked down: {error}")
+
+    def getStats(self):
+        return {endpoint.url: endpoint.getStats() for endpoint in self.endpoints}
+
+
+class PooledChatOllama(ChatOllama):
+    """
+    ChatOllama that sends every request through an OllamaEndpointPool. If an
+    endpoint fails before producing output the request is retried on the next
+    one, so a session keeps working when a box goes away.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    pool: Any = Field(default=None, exclude=True)
+    endpoint_models: dict = Field(default_factory=dict, exclude=True)
+    context_sizer: Any = Field(default=None, exclude=True)
+
+    def getEndpointModel(self, endpoint) -> ChatOllama:
+        chat_model = self.endpoint_models.get(endpoint.url)
+        if chat_model is None:
+            options = {
+                name: getattr(self, name)
+                for name in ChatOllama.model_fields
+                if name not in ENDPOINT_EXCLUDED_FIELDS
+                and getattr(self, name, None) is not None
+            }
+            chat_model = SizedChatOllama(
+                **options, base_url=endpoint.url, context_sizer=self.context_sizer
+            )
+            self.endpoint_models[endpoint.url] = chat_model
+        return chat_model
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tried = []
+        while True:
+            endpoint = self.pool.acquire(self.model, exclude=tried)
+            start_time = time.perf_counter()
+            first_token_time = None
+            try:
+                for chunk in self.getEndpointModel(endpoint)._stream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    yield chunk
+            except CONNECTION_ERRORS as e:
+                self.pool.fail(endpoint, e)
+                if first_token_time is not None:
+                    raise
+                tried.append(endpoint)
+                continue
+            except BaseException:
+                self.pool.release(endpoint, self.model, start_time, first_token_time)
+                raise
+            self.pool.release(endpoint, self.model, start_time, first_token_time)
+            return
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tried = []
+        while True:
+            endpoint = self.pool.acquire(self.model, exclude=tried)
+            start_time = time.perf_counter()
+            first_token_time = None
+            try:
+                async for chunk in self.getEndpointModel(endpoint)._astream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    yield chunk
+            except CONNECTION_ERRORS as e:
+                self.pool.fail(endpoint, e)
+                if first_token_time is not None:
+                    raise
+                tried.append(endpoint)
+                continue
+            except BaseException:
+                self.pool.release(endpoint, self.model, start_time, first_token_time)
+                raise
+            self.pool.release(endpoint, self.model, start_time, first_token_time)
+            return
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tried = []
+        while True:
+            endpoint = self.pool.acquire(self.model, exclude=tried)
+            start_time = time.perf_counter()
+            try:
+                result = self.getEndpointModel(endpoint)._generate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except CONNECTION_ERRORS as e:
+                self.pool.fail(endpoint, e)
+                tried.append(endpoint)
+                continue
+            except BaseException:
+                self.pool.release(endpoint, self.model, start_time)
+                raise
+            self.pool.release(endpoint, self.model, start_time)
+            return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tried = []
+        while True:
+            endpoint = self.pool.acquire(self.model, exclude=tried)
+            start_time = time.perf_counter()
+            try:
+                result = await self.getEndpointModel(endpoint)._agenerate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except CONNECTION_ERRORS as e:
+                self.pool.fail(endpoint, e)
+                tried.append(endpoint)
+                continue
+            except BaseException:
+                self.pool.release(endpoint, self.model, start_time)
+                raise
+            self.pool.release(endpoint, self.model, start_time)
+            return result
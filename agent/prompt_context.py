@@ -0,0 +1,189 @@
+import asyncio
+import os
+import re
+import statistics
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+PREFETCH_MAX_REFERENCES = 8
+PREFETCH_URL_TIMEOUT = 5
+LATENCY_SAMPLES = 50
+TEXT_EXTENSIONS = {
+    ".csv",
+    ".html",
+    ".ini",
+    ".json",
+    ".jsonl",
+    ".log",
+    ".md",
+    ".py",
+    ".toml",
+    ".tsv",
+    ".txt",
+    ".xml",
+    ".yaml",
+    ".yml",
+}
+TEXT_CONTENT_TYPES = ("text/", "application/json", "application/xml")
+
+URL_PATTERN = re.compile(r"https?://[^\s\"'`<>()\[\]]+")
+QUOTED_PATTERN = re.compile(r"[\"'`“‘]([^\"'`”’\n]{1,512})[\"'`”’]")
+# bare tokens that look like a file name with an extension, with or without a directory
+PATH_PATTERN = re.compile(r"(?:~|\.{1,2}|[A-Za-z]:)?[\w.\-~/\\]*\.[A-Za-z0-9]{1,8}")
+
+ATTACHMENT_HEADER = (
+    "The files and pages referenced below were already loaded for you. "
+    "Use their contents directly; do not call tools to read them again."
+)
+
+
+def findReferences(query):
+    """URLs and candidate file paths mentioned in the query, in order."""
+    urls = [url.rstrip(".,;:!?") for url in URL_PATTERN.findall(query)]
+    text = URL_PATTERN.sub(" ", query)
+    candidates = QUOTED_PATTERN.findall(text) + PATH_PATTERN.findall(text)
+    paths = [
+        candidate.strip()
+        for candidate in candidates
+        if os.path.splitext(candidate.strip())[1].lower() in TEXT_EXTENSIONS
+    ]
+    return list(dict.fromkeys(urls)), list(dict.fromkeys(paths))
+
+
+def isUnder(path, roots):
+    for root in roots:
+        try:
+            if os.path.commonpath([path, root]) == root:
+                return True
+        except ValueError:  # different drives on Windows
+            continue
+    return False
+
+
+def readFileLimited(path, max_bytes):
+    with open(path, "rb") as f:
+        data = f.read(max_bytes + 1)
+    return data
+
+
+class PromptPrefetcher:
+    """
+    Loads small local files and allowed URLs mentioned in a query before the
+    agent runs, so the model can answer from them instead of spending a
+    round trip deciding to call a read tool first.
+
+    Files must have a text extension and lie under one of allowed_dirs;
+    URLs must be on one of allowed_hosts. Anything larger than max_bytes,
+    or beyond max_total_bytes for the query, is left to the tools.
+    """
+
+    def __init__(self, allowed_dirs, allowed_hosts=None, max_bytes=32 * 1024):
+        self.allowed_dirs = [
+            os.path.realpath(os.path.expanduser(d)) for d in allowed_dirs or []
+        ]
+        self.allowed_hosts = {h.lower() for h in allowed_hosts or []}
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_bytes * 3
+        # model round trips measured by the agent, to estimate time saved
+        self.round_trip_latencies = []
+
+    def recordRoundTrip(self, seconds):
+        self.round_trip_latencies.append(seconds)
+        del self.round_trip_latencies[:-LATENCY_SAMPLES]
+
+    def resolvePath(self, candidate):
+        path = os.path.realpath(os.path.expanduser(candidate))
+        if not os.path.isfile(path) or not isUnder(path, self.allowed_dirs):
+            return None
+        return path
+
+    def isAllowedUrl(self, url):
+        return (urlparse(url).hostname or "").lower() in self.allowed_hosts
+
+    async def loadFile(self, label, path):
+        data = await asyncio.to_thread(readFileLimited, path, self.max_bytes)
+        if len(data) > self.max_bytes:
+            return None
+        return {"source": label, "bytes": len(data), "text": data.decode("utf-8", "replace")}
+
+    async def loadUrl(self, client, url):
+        async with client.stream("GET", url) as response:
+            content_type = response.headers.get("content-type", "")
+            if response.status_code != 200 or not content_type.startswith(
+                TEXT_CONTENT_TYPES
+            ):
+                return None
+            data = b""
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > self.max_bytes:
+                    return None
+        return {"source": url, "bytes": len(data), "text": data.decode("utf-8", "replace")}
+
+    async def prefetch(self, query):
+        """
+        Returns (query with the loaded contents attached, report). The report
+        is None when nothing was attached.
+        """
+        start = time.perf_counter()
+        urls, candidates = findReferences(query)
+        urls = [url for url in urls if self.isAllowedUrl(url)]
+        files = {}
+        for candidate in candidates:
+            path = self.resolvePath(candidate)
+            if path and path not in files:
+                files[path] = candidate
+        if not urls and not files:
+            return query, None
+
+        jobs = [self.loadFile(label, path) for path, label in files.items()]
+        jobs = jobs[:PREFETCH_MAX_REFERENCES]
+        urls = urls[: PREFETCH_MAX_REFERENCES - len(jobs)]
+        if urls:
+            async with httpx.AsyncClient(
+                timeout=PREFETCH_URL_TIMEOUT, follow_redirects=False
+            ) as client:
+                jobs += [self.loadUrl(client, url) for url in urls]
+                loaded = await asyncio.gather(*jobs, return_exceptions=True)
+        else:
+            loaded = await asyncio.gather(*jobs, return_exceptions=True)
+
+        # failed, too large or not text: the model can still use its tools
+        attachments, skipped, total = [], 0, 0
+        for job_result in loaded:
+            if (
+                isinstance(job_result, Exception)
+                or job_result is None
+                or total + job_result["bytes"] > self.max_total_bytes
+            ):
+                skipped += 1
+                continue
+            total += job_result["bytes"]
+            attachments.append(job_result)
+        if not attachments:
+            return query, None
+
+        blocks = [
+            f'<attachment source="{a["source"]}">\n{a["text"]}\n</attachment>'
+            for a in attachments
+        ]
+        augmented = f"{query}\n\n{ATTACHMENT_HEADER}\n\n" + "\n\n".join(blocks)
+        elapsed = time.perf_counter() - start
+        round_trip = (
+            statistics.median(self.round_trip_latencies)
+            if self.round_trip_latencies
+            else None
+        )
+        report = {
+            "sources": [a["source"] for a in attachments],
+            "bytes": total,
+            "skipped": skipped,
+            "prefetch_ms": round(elapsed * 1000, 1),
+            # the model no longer needs one tool-calling round trip to read them
+            "estimated_saved_ms": round(max(round_trip - elapsed, 0.0) * 1000, 1)
+            if round_trip is not None
+            else None,
+        }
+        return augmented, report
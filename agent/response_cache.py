@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+RESPONSE_CACHE_DB = "response_cache.db"
+DEFAULT_CACHE_MAX_BYTES = 100 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def normalizeText(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip()
+
+
+def hashFile(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashDirectory(path):
+    """A digest of a directory listing: entry names, types, sizes and mtimes."""
+    digest = hashlib.sha256()
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            stats = entry.stat(follow_symlinks=False)
+            digest.update(
+                f"{entry.name}\t{entry.is_dir()}\t{stats.st_size}\t"
+                f"{stats.st_mtime_ns}\n".encode("utf-8", "replace")
+            )
+    return "dir:" + digest.hexdigest()
+
+
+def fingerprintPath(path):
+    """Content hash of a file, or listing hash of a directory."""
+    if os.path.isdir(path):
+        return hashDirectory(path)
+    return hashFile(path)
+
+
+def findPathArguments(tool_args):
+    """Collect string tool arguments that point at existing local files or folders."""
+    paths = set()
+    values = list(tool_args.values()) if isinstance(tool_args, dict) else []
+    while values:
+        value = values.pop()
+        if isinstance(value, dict):
+            values.extend(value.values())
+        elif isinstance(value, list):
+            values.extend(value)
+        elif isinstance(value, str) and value and len(value) < 1024:
+            path = os.path.expanduser(value)
+            if os.path.exists(path):
+                paths.add(os.path.abspath(path))
+    return paths
+
+
+class RecordingQueue:
+    """Forwards events to the real out_queue while keeping a copy for the cache."""
+
+    def __init__(
+        self, out_queue, recorded_types=("chat_token", "chat_step_text", "chat_message")
+    ):
+        self.out_queue = out_queue
+        self.recorded_types = recorded_types
+        self.events = []
+
+    def put(self, item, *args, **kwargs):
+        if item.get("type") in self.recorded_types:
+            self.events.append(item)
+        if self.out_queue is not None:
+            self.out_queue.put(item, *args, **kwargs)
+
+
+class ResponseCache:
+    """
+    Exact-match response cache stored in SQLite with size-bounded LRU eviction.
+
+    An entry keeps the streamed events and the final result of a query plus
+    fingerprints of the local files and folders its tools touched. If any of
+    those changed (or disappeared) the entry is dropped on lookup.
+
+    A hit replays the answer without running any tools, so only turns whose
+    tool calls are all in read_only_tools are cached; a turn that wrote a
+    file would otherwise be "answered" without writing it.
+    """
+
+    def __init__(
+        self,
+        db_file=RESPONSE_CACHE_DB,
+        max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        read_only_tools=(),
+    ):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.read_only_tools = set(read_only_tools)
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, entry TEXT, size INTEGER, last_access REAL)"
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def makeKey(model, temperature, system_prompt, conversation, query, tool_names=()):
+        payload = json.dumps(
+            [
+                model,
+                temperature,
+                normalizeText(system_prompt),
+                [normalizeText(turn) for turn in conversation],
+                normalizeText(query),
+                sorted(tool_names),
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def getUncacheableTools(self, tool_calls):
+        """Names of called tools that may change state; empty if cacheable."""
+        return sorted(
+            {
+                call.get("name", "")
+                for call in tool_calls
+                if call.get("name") not in self.read_only_tools
+            }
+        )
+
+    @staticmethod
+    def hashFiles(paths):
+        hashes = {}
+        for path in sorted(paths):
+            try:
+                hashes[path] = fingerprintPath(path)
+            except OSError:
+                continue
+        return hashes
+
+    def isEntryValid(self, entry):
+        for path, digest in entry.get("file_hashes", {}).items():
+            try:
+                if fingerprintPath(path) != digest:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT entry FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        entry = json.loads(row[0])
+        if not self.isEntryValid(entry):
+            print("[Response cache] Tool inputs changed. Invalidating entry.")
+            self.delete(key)
+            self.misses += 1
+            return None
+        self.conn.execute(
+            "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        self.conn.commit()
+        self.hits += 1
+        return entry
+
+    def put(self, key, events, result, touched_files=()):
+        entry = json.dumps(
+            {
+                "events": events,
+                "result": result,
+                "file_hashes": self.hashFiles(touched_files),
+                "created": time.time(),
+            },
+            ensure_ascii=False,
+            default=str,
+        )
+        size = len(entry.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, entry, size, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            (key, entry, size, time.time()),
+        )
+        self.conn.commit()
+        self.evict()
+
+    def delete(self, key):
+        self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def evict(self):
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM responses")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
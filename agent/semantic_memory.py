@@ -0,0 +1,346 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from agent.chat_record import ROLE_ASSISTANT, ROLE_USER, getContent, recordFromText
+from agent.think_parser import estimateTokens, stripThinking
+from metrics import REGISTRY
+
+MEMORY_INDEX_PREFIX = "chat_memory"
+MEMORY_INDEX_VERSION = 1
+MEMORY_ROLES = (ROLE_USER, ROLE_ASSISTANT)
+MEMORY_CHUNK_CHARS = 1200
+MEMORY_MIN_CHARS = 20
+MEMORY_EMBED_BATCH = 32
+MEMORY_MIN_SCORE = 0.35
+# re-read the history this often, and this long after a requested sync
+MEMORY_SYNC_INTERVAL = 60
+MEMORY_SYNC_DELAY = 2
+MEMORY_QUERY_TIMEOUT = 3
+MEMORY_CONTEXT_HEADER = (
+    "Notes from earlier chats that may be relevant (they may be outdated; "
+    "ignore them if they are not):"
+)
+
+MEMORY_SNIPPETS = REGISTRY.gauge(
+    "memory_index_snippets", "Chat snippets in the semantic memory index."
+)
+RECALL_SECONDS = REGISTRY.histogram(
+    "memory_recall_seconds",
+    "Time to embed a query and search the memory index.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 3),
+)
+
+
+def normalizeRows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def splitChunks(text, size=MEMORY_CHUNK_CHARS):
+    """Split at paragraph or line breaks where possible, hard-cut otherwise."""
+    chunks = []
+    while len(text) > size:
+        cut = max(text.rfind("\n\n", 0, size), text.rfind("\n", 0, size))
+        if cut < size // 2:
+            cut = size
+        chunks.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        chunks.append(text.strip())
+    return chunks
+
+
+class VectorIndex:
+    """
+    Unit-length float32 embeddings in an append-only raw file
+    (<prefix>.f32), memory-mapped for search, with one JSON metadata line per
+    row in <prefix>.jsonl. <prefix>.json records the embedding model and
+    dimension; a different model starts a new index.
+    """
+
+    def __init__(self, prefix, model):
+        self.matrix_file = f"{prefix}.f32"
+        self.entries_file = f"{prefix}.jsonl"
+        self.header_file = f"{prefix}.json"
+        self.model = model
+        self.lock = threading.Lock()
+        self.dim = None
+        self.entries = []
+        self.keys = set()
+        self.matrix = None
+        self.load()
+
+    @staticmethod
+    def entryKey(entry):
+        return (entry["chat"], entry["message"], entry["chunk"])
+
+    def load(self):
+        try:
+            with open(self.header_file, "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            header = {}
+        if (
+            header.get("version") != MEMORY_INDEX_VERSION
+            or header.get("model") != self.model
+        ):
+            self.reset()
+            return
+        self.dim = header["dim"]
+        entries = []
+        torn = False
+        if os.path.exists(self.entries_file):
+            with open(self.entries_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        torn = True
+                        break
+        row_bytes = 4 * self.dim
+        size = os.path.getsize(self.matrix_file) if os.path.exists(self.matrix_file) else 0
+        count = min(size // row_bytes, len(entries))
+        if torn or size != count * row_bytes or count != len(entries):
+            # an interrupted append: keep the rows both files agree on
+            with open(self.matrix_file, "ab") as f:
+                f.truncate(count * row_bytes)
+            self.writeEntries(entries[:count])
+        self.entries = entries[:count]
+        self.keys = {self.entryKey(entry) for entry in self.entries}
+        self.remap()
+
+    def writeEntries(self, entries):
+        with open(self.entries_file, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def writeHeader(self):
+        with open(self.header_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MEMORY_INDEX_VERSION, "model": self.model, "dim": self.dim},
+                f,
+            )
+
+    def remap(self):
+        count = len(self.entries)
+        self.matrix = (
+            np.memmap(self.matrix_file, dtype=np.float32, mode="r", shape=(count, self.dim))
+            if count
+            else None
+        )
+
+    def reset(self):
+        with self.lock:
+            self.matrix = None
+            for path in (self.matrix_file, self.entries_file, self.header_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.dim = None
+            self.entries = []
+            self.keys = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, vectors, entries):
+        vectors = normalizeRows(vectors)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.writeHeader()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"Embedding size changed from {self.dim} to {vectors.shape[1]}."
+                )
+            with open(self.matrix_file, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.entries_file, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.entries.extend(entries)
+            self.keys.update(self.entryKey(entry) for entry in entries)
+            self.remap()
+
+    def search(self, vector, k):
+        """The k most similar rows as (cosine score, entry), best first."""
+        with self.lock:
+            matrix, entries = self.matrix, self.entries
+        if matrix is None or k <= 0:
+            return []
+        scores = matrix @ normalizeRows(vector)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), entries[i]) for i in top]
+
+
+class ChatMemory:
+    """
+    Semantic memory over chat_history.json. A background thread embeds new
+    user and assistant messages (think blocks removed, long ones chunked)
+    into a VectorIndex; recall() embeds the query and returns the most
+    similar past snippets that fit a token budget.
+
+    embeddings is any LangChain Embeddings, normally OllamaEmbeddings.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        model,
+        history_file="chat_history.json",
+        index_prefix=MEMORY_INDEX_PREFIX,
+        top_k=4,
+        token_budget=400,
+    ):
+        self.embeddings = embeddings
+        self.history_file = history_file
+        self.index = VectorIndex(index_prefix, model)
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.wake = threading.Event()
+        self.stopping = False
+        self.history_mtime = None
+        self.last_error = None
+        self.thread = threading.Thread(
+            target=self.indexLoop, daemon=True, name="chat_memory"
+        )
+
+    def start(self):
+        self.thread.start()
+        self.requestSync()
+
+    def stop(self):
+        self.stopping = True
+        self.wake.set()
+
+    def requestSync(self):
+        """Index what was added to the history, soon, on the memory thread."""
+        self.wake.set()
+
+    def indexLoop(self):
+        while not self.stopping:
+            self.wake.wait(MEMORY_SYNC_INTERVAL)
+            self.wake.clear()
+            if self.stopping:
+                return
+            time.sleep(MEMORY_SYNC_DELAY)  # let the UI finish saving the turn
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"[Memory] Indexing failed: {e}")
+                self.last_error = str(e)
+
+    def loadHistory(self):
+        """The chat list and its mtime, or (None, None) if unchanged since the last sync."""
+        try:
+            mtime = os.path.getmtime(self.history_file)
+        except OSError:
+            return None, None
+        if mtime == self.history_mtime:
+            return None, None
+        with open(self.history_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("chat_list", []), mtime
+
+    def collectPending(self, chat_list):
+        pending = []
+        for chat_index, chat in enumerate(chat_list):
+            for message_index, record in enumerate(chat.get("messages", [])):
+                if not isinstance(record, dict):
+                    record = recordFromText(record)
+                if record.get("role") not in MEMORY_ROLES:
+                    continue
+                text = stripThinking(getContent(record)).strip()
+                if len(text) < MEMORY_MIN_CHARS:
+                    continue
+                for chunk_index, chunk in enumerate(splitChunks(text)):
+                    entry = {
+                        "chat": chat_index,
+                        "message": message_index,
+                        "chunk": chunk_index,
+                        "role": record["role"],
+                        "title": chat.get("title", ""),
+                        "text": chunk,
+                    }
+                    if VectorIndex.entryKey(entry) not in self.index.keys:
+                        pending.append(entry)
+        return pending
+
+    def isStale(self, chat_list):
+        """The history was replaced or truncated under the index."""
+        return any(
+            entry["chat"] >= len(chat_list)
+            or entry["message"] >= len(chat_list[entry["chat"]].get("messages", []))
+            for entry in self.index.entries
+        )
+
+    def sync(self):
+        chat_list, mtime = self.loadHistory()
+        if chat_list is None:
+            return
+        if self.isStale(chat_list):
+            print("[Memory] Chat history changed; rebuilding the memory index.")
+            self.index.reset()
+        pending = self.collectPending(chat_list)
+        for start in range(0, len(pending), MEMORY_EMBED_BATCH):
+            if self.stopping:
+                return
+            batch = pending[start : start + MEMORY_EMBED_BATCH]
+            vectors = self.embeddings.embed_documents([e["text"] for e in batch])
+            self.index.append(vectors, batch)
+        self.history_mtime = mtime
+        MEMORY_SNIPPETS.set(len(self.index))
+        if pending:
+            print(f"[Memory] Indexed {len(pending)} snippets ({len(self.index)} total).")
+
+    async def recall(self, query, exclude=()):
+        """
+        Returns (context text to add to the prompt, report), or (None, None)
+        when nothing relevant fits. Snippets whose text is already part of
+        the current conversation (exclude) are skipped.
+        """
+        if not len(self.index):
+            return None, None
+        start = time.perf_counter()
+        try:
+            vector = await asyncio.wait_for(
+                self.embeddings.aembed_query(query), MEMORY_QUERY_TIMEOUT
+            )
+        except Exception as e:
+            print(f"[Memory] Query embedding failed: {str(e) or type(e).__name__}")
+            return None, None
+        hits = self.index.search(vector, self.top_k * 3)
+        RECALL_SECONDS.observe(time.perf_counter() - start)
+        conversation = "\n".join(exclude)
+        selected, tokens = [], 0
+        for score, entry in hits:
+            if score < MEMORY_MIN_SCORE or len(selected) >= self.top_k:
+                break
+            if entry["text"] in conversation:
+                continue
+            cost = estimateTokens(entry["text"])
+            if tokens + cost > self.token_budget:
+                continue
+            tokens += cost
+            selected.append((score, entry))
+        if not selected:
+            return None, None
+        lines = [
+            f'- ({entry["title"]}, {entry["role"]}) {entry["text"]}'
+            for _score, entry in selected
+        ]
+        report = {
+            "snippets": len(selected),
+            "tokens": tokens,
+            "top_score": round(selected[0][0], 3),
+            "recall_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return MEMORY_CONTEXT_HEADER + "\n" + "\n".join(lines), report
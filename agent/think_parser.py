@@ -0,0 +1,92 @@
+import re
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+KIND_REASONING = "reasoning"
+KIND_ANSWER = "answer"
+# rough chars-per-token ratio, same estimate as the tool router
+CHARS_PER_TOKEN = 4
+
+THINK_BLOCK_PATTERN = re.compile(
+    re.escape(THINK_OPEN) + r".*?(?:" + re.escape(THINK_CLOSE) + r"|$)", re.DOTALL
+)
+
+
+def estimateTokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def splitThinking(text):
+    """Split a complete message into (reasoning, answer)."""
+    parser = ThinkStreamParser()
+    segments = parser.feed(text) + parser.flush()
+    reasoning = "".join(t for kind, t in segments if kind == KIND_REASONING)
+    answer = "".join(t for kind, t in segments if kind == KIND_ANSWER)
+    return reasoning, answer
+
+
+def stripThinking(text):
+    """Remove think blocks (an unclosed one runs to the end) from a message."""
+    return THINK_BLOCK_PATTERN.sub("", text).lstrip()
+
+
+class ThinkStreamParser:
+    """
+    Incrementally splits streamed model output into reasoning inside
+    <think>...</think> and answer text. A tag may be split across chunks, so
+    a trailing partial tag is held back until the next chunk decides it.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self.pending = ""
+        self.answer_started = False
+
+    def feed(self, text):
+        """Returns a list of (kind, text) segments ready to display."""
+        self.pending += text
+        segments = []
+        while self.pending:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            index = self.pending.find(tag)
+            if index >= 0:
+                self.emit(segments, self.pending[:index])
+                self.pending = self.pending[index + len(tag) :]
+                self.in_think = not self.in_think
+                continue
+            keep = self.partialTagLength(self.pending, tag)
+            self.emit(segments, self.pending[: len(self.pending) - keep])
+            self.pending = self.pending[len(self.pending) - keep :]
+            break
+        return segments
+
+    def flush(self):
+        segments = []
+        self.emit(segments, self.pending)
+        self.pending = ""
+        return segments
+
+    @staticmethod
+    def partialTagLength(text, tag):
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:length]):
+                return length
+        return 0
+
+    def emit(self, segments, text):
+        if not text:
+            return
+        if self.in_think:
+            kind = KIND_REASONING
+        else:
+            kind = KIND_ANSWER
+            if not self.answer_started:
+                # qwen3 puts blank lines between </think> and the answer
+                text = text.lstrip()
+                if not text:
+                    return
+                self.answer_started = True
+        if segments and segments[-1][0] == kind:
+            segments[-1] = (kind, segments[-1][1] + text)
+        else:
+            segments.append((kind, text))
@@ -0,0 +1,163 @@
+import difflib
+import json
+import uuid
+from contextvars import ContextVar
+
+from langchain_core.tools import StructuredTool, ToolException
+
+from metrics import REGISTRY
+
+# results shorter than this are sent whole; a marker would barely be shorter
+TOOL_DIFF_MIN_CHARS = 256
+# send a diff only if it is at most this fraction of the new result
+TOOL_DIFF_MAX_RATIO = 0.5
+TOOL_DIFF_CONTEXT_LINES = 1
+
+UNCHANGED_TEMPLATE = (
+    "[Unchanged: identical to the earlier {tool} result for the same "
+    "arguments above ({chars} characters).]"
+)
+DIFF_TEMPLATE = (
+    "[Changed since the earlier {tool} result for the same arguments above. "
+    "Unified diff against it; lines starting with '-' were removed and '+' "
+    "were added, everything else is as before:]\n{diff}"
+)
+
+COMPACTED_RESULTS = REGISTRY.counter(
+    "tool_results_compacted_total",
+    "Tool results sent as an unchanged marker or a diff instead of in full.",
+    labels=("kind",),
+)
+CHARS_SAVED = REGISTRY.counter(
+    "tool_result_chars_saved_total",
+    "Characters of tool output kept out of the model context by diffing.",
+)
+
+# the ToolResultMemory of the conversation being answered; tools called
+# outside a chat turn (model comparisons, for example) pass results through
+ACTIVE_TOOL_RESULTS = ContextVar("active_tool_results", default=None)
+
+
+def resultKey(tool_name, arguments):
+    return tool_name + ":" + json.dumps(
+        arguments, sort_keys=True, ensure_ascii=False, default=str
+    )
+
+
+def unifiedDiff(old, new):
+    return "\n".join(
+        difflib.unified_diff(
+            old.splitlines(),
+            new.splitlines(),
+            fromfile="earlier",
+            tofile="now",
+            n=TOOL_DIFF_CONTEXT_LINES,
+            lineterm="",
+        )
+    )
+
+
+class ToolResultMemory:
+    """
+    Remembers, per conversation, the text each tool returned for each set of
+    arguments. When a tool is called again with the same arguments (a file
+    re-read after a write, a directory listed again) the model gets an
+    "unchanged" marker or a unified diff against the earlier result instead
+    of the whole output, if that is much shorter.
+
+    A marker or diff is only useful while the earlier result is still in the
+    model's context, so retain() is given the tool messages of the
+    checkpointed conversation before each query and forgets results that are
+    no longer there (a reset chat, a cascade attempt that was rolled back, a
+    cancelled call).
+    """
+
+    def __init__(self):
+        # key -> (full result text, texts sent to the model for it, oldest first)
+        self.results = {}
+        self.compacted = 0
+        self.chars_saved = 0
+
+    def clear(self):
+        self.results = {}
+
+    def retain(self, context_texts):
+        context_texts = set(context_texts)
+        self.results = {
+            key: (content, sent)
+            for key, (content, sent) in self.results.items()
+            if all(text in context_texts for text in sent)
+        }
+
+    def beginQuery(self):
+        self.compacted = 0
+        self.chars_saved = 0
+
+    def getReport(self):
+        if not self.compacted:
+            return None
+        return {"compacted": self.compacted, "chars_saved": self.chars_saved}
+
+    def compact(self, tool_name, arguments, content):
+        """The text to send to the model for this result."""
+        if not isinstance(content, str):
+            return content
+        key = resultKey(tool_name, arguments)
+        earlier = self.results.get(key)
+        sent = content
+        if earlier is not None and len(content) >= TOOL_DIFF_MIN_CHARS:
+            previous, _sent = earlier
+            if content == previous:
+                sent = UNCHANGED_TEMPLATE.format(tool=tool_name, chars=len(content))
+                kind = "unchanged"
+            else:
+                diff = unifiedDiff(previous, content)
+                if diff and len(diff) <= len(content) * TOOL_DIFF_MAX_RATIO:
+                    sent = DIFF_TEMPLATE.format(tool=tool_name, diff=diff)
+                    kind = "diff"
+        if sent is content:
+            self.results[key] = (content, [content])
+            return content
+        # the model rebuilds this result from the earlier texts plus this one
+        self.results[key] = (content, earlier[1] + [sent])
+        self.compacted += 1
+        self.chars_saved += len(content) - len(sent)
+        COMPACTED_RESULTS.inc(kind=kind)
+        CHARS_SAVED.inc(len(content) - len(sent))
+        return sent
+
+    def wrapTools(self, tools):
+        return [wrapTool(tool) for tool in tools or []]
+
+
+def wrapTool(tool):
+    """
+    A copy of tool whose text results go through the active conversation's
+    ToolResultMemory. The original tool runs unchanged, artifacts included.
+    """
+
+    async def compacting_call(**arguments):
+        message = await tool.ainvoke(
+            {
+                "name": tool.name,
+                "args": arguments,
+                "id": uuid.uuid4().hex,
+                "type": "tool_call",
+            }
+        )
+        if message.status == "error":
+            raise ToolException(message.content)
+        memory = ACTIVE_TOOL_RESULTS.get()
+        content = message.content
+        if memory is not None:
+            content = memory.compact(tool.name, arguments, content)
+        return content, message.artifact
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=compacting_call,
+        response_format="content_and_artifact",
+        handle_tool_error=tool.handle_tool_error,
+    )
@@ -0,0 +1,132 @@
+import json
+import math
+import re
+from collections import Counter
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# rough chars-per-token ratio used to estimate schema size in the prompt
+CHARS_PER_TOKEN = 4
+NAME_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from",
+    "get", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please",
+    "str", "that", "the", "this", "to", "use", "what", "with", "you",
+}
+
+
+def tokenize(text):
+    # split snake_case and camelCase so "get_local_file_list" matches "file list"
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    tokens = []
+    for token in re.findall(r"\w+", text.lower().replace("_", " ")):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def estimateToolTokens(tool):
+    try:
+        schema = convert_to_openai_tool(tool)
+    except Exception:
+        schema = {"name": tool.name, "description": tool.description}
+    return len(json.dumps(schema, ensure_ascii=False)) // CHARS_PER_TOKEN
+
+
+class ToolRouter:
+    """
+    Picks the tools relevant to a query from a BM25 index over tool names,
+    descriptions and argument names, so the model is only sent those schemas.
+    Pinned tools are always included.
+    """
+
+    def __init__(self, tools, top_k=6, pinned=None):
+        self.tools = list(tools or [])
+        self.top_k = top_k
+        self.pinned = set(pinned or [])
+        self.buildIndex()
+
+    def buildIndex(self):
+        self.documents = []
+        for tool in self.tools:
+            args = getattr(tool, "args", None) or {}
+            tokens = (
+                tokenize(tool.name) * NAME_WEIGHT
+                + tokenize(tool.description or "")
+                + tokenize(" ".join(args.keys()))
+            )
+            self.documents.append(Counter(tokens))
+        self.avg_length = (
+            sum(sum(doc.values()) for doc in self.documents) / len(self.documents)
+            if self.documents
+            else 0
+        )
+        document_frequency = Counter(
+            token for doc in self.documents for token in doc.keys()
+        )
+        total = len(self.documents)
+        self.idf = {
+            token: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for token, freq in document_frequency.items()
+        }
+        self.tool_tokens = {tool.name: estimateToolTokens(tool) for tool in self.tools}
+
+    def score(self, query_tokens, doc):
+        length = sum(doc.values())
+        score = 0.0
+        for token in query_tokens:
+            freq = doc.get(token, 0)
+            if not freq:
+                continue
+            score += self.idf.get(token, 0) * (
+                freq
+                * (BM25_K1 + 1)
+                / (freq + BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length))
+            )
+        return score
+
+    def isEnabled(self):
+        return self.top_k > 0 and len(self.tools) > self.top_k
+
+    def selectTools(self, query):
+        """
+        Returns (tools, report). Falls back to every tool when routing is
+        disabled or nothing in the query matches the index.
+        """
+        if not self.isEnabled():
+            return self.tools, self.makeReport(self.tools)
+        query_tokens = set(tokenize(query))
+        scored = sorted(
+            (
+                (self.score(query_tokens, doc), index)
+                for index, doc in enumerate(self.documents)
+            ),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        if not scored or scored[0][0] <= 0:
+            return self.tools, self.makeReport(self.tools)
+        chosen = {index for score, index in scored[: self.top_k] if score > 0}
+        selected = [
+            tool
+            for index, tool in enumerate(self.tools)
+            if index in chosen or tool.name in self.pinned
+        ]
+        return selected, self.makeReport(selected)
+
+    def makeReport(self, selected):
+        total_tokens = sum(self.tool_tokens.values())
+        selected_tokens = sum(self.tool_tokens.get(t.name, 0) for t in selected)
+        return {
+            "tools_total": len(self.tools),
+            "tools_selected": len(selected),
+            "tool_names": [t.name for t in selected],
+            "schema_tokens_total": total_tokens,
+            "schema_tokens_selected": selected_tokens,
+            "schema_tokens_saved": total_tokens - selected_tokens,
+        }
@@ -0,0 +1,99 @@
+"""
+Replay a recorded session cassette through OllamaAgentManager without
+Ollama or MCP servers, and report how long our own code takes per query.
+
+Record a cassette by setting "cassette_mode" to "record" in
+app_settings.json and using the app, then:
+
+    uv run python -m benchmarks.cassette_replay session_cassette.jsonl --runs 3
+
+With --speed 0 (default) recorded model and tool latencies are skipped, so
+the timings are the agent, streaming and tool-plumbing overhead alone. Use
+--json to save the numbers and compare two builds on identical traffic.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from queue import Queue
+
+from agent.cassette import MODE_REPLAY, Cassette
+from agent.llm_ollama import OllamaAgentManager
+
+
+async def replayOnce(path, speed, stream_mode):
+    cassette = Cassette(path, MODE_REPLAY, speed=speed)
+    out_queue = Queue()
+    manager = OllamaAgentManager(
+        mcp_tools=cassette.makeReplayTools(), out_queue=out_queue
+    )
+    if stream_mode:
+        manager.STREAM_MODE = stream_mode
+    models = {entry["model"] for entry in cassette.entries["ollama"]}
+    if models:
+        manager.model_name = sorted(models)[0]
+    manager.configureCassette(cassette)
+    manager.createChatModel(mcp_tools=manager.mcp_tools)
+
+    durations = []
+    for entry in cassette.queries:
+        start = time.perf_counter()
+        result = await manager.chat(
+            entry["query"], system_prompt=entry.get("system_prompt") or None
+        )
+        durations.append(time.perf_counter() - start)
+        if "error" in result:
+            print(f"  query failed: {result['error']}")
+    return {
+        "queries": len(durations),
+        "durations": durations,
+        "total": sum(durations),
+        "events": out_queue.qsize(),
+        "misses": cassette.misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cassette")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--speed", type=float, default=0.0)
+    parser.add_argument("--stream-mode", default="")
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args()
+
+    runs = [
+        asyncio.run(replayOnce(args.cassette, args.speed, args.stream_mode))
+        for _ in range(args.runs)
+    ]
+    totals = [run["total"] for run in runs]
+    summary = {
+        "cassette": args.cassette,
+        "runs": args.runs,
+        "speed": args.speed,
+        "queries": runs[0]["queries"],
+        "total_ms_median": statistics.median(totals) * 1000,
+        "total_ms_min": min(totals) * 1000,
+        "per_query_ms_median": [
+            statistics.median(run["durations"][i] for run in runs) * 1000
+            for i in range(runs[0]["queries"])
+        ],
+        "ui_events": runs[0]["events"],
+        "misses": runs[0]["misses"],
+    }
+    print(
+        f"{summary['queries']} queries, total {summary['total_ms_median']:.1f} ms "
+        f"(median of {args.runs}, min {summary['total_ms_min']:.1f} ms), "
+        f"{summary['ui_events']} UI events, {summary['misses']} cassette misses"
+    )
+    for index, value in enumerate(summary["per_query_ms_median"], start=1):
+        print(f"  query {index}: {value:.1f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare the streaming modes of OllamaAgentManager on the same prompt.
+
+Runs each mode against the local Ollama model with a small in-process tool
+and reports time to first streamed event, total time, number of UI events
+and time spent inside the streaming callback.
+
+    uv run python -m benchmarks.stream_benchmark --runs 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+from queue import Queue
+
+from langchain_core.tools import tool
+
+from agent.llm_ollama import OllamaAgentManager
+from constants import STREAM_MODE_INVOKE, STREAM_MODE_LOG, STREAM_MODE_MESSAGES
+
+DEFAULT_PROMPT = "What time is it now? Use the tool, then answer in two sentences."
+
+
+@tool
+def get_current_time() -> str:
+    """Return the current local time."""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class TimedQueue(Queue):
+    """Queue that records when the first event arrives and how many arrive."""
+
+    def __init__(self):
+        super().__init__()
+        self.start_time = time.perf_counter()
+        self.first_event_time = None
+        self.event_count = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.first_event_time is None:
+            self.first_event_time = time.perf_counter()
+        self.event_count += 1
+        super().put(item, block, timeout)
+
+
+async def runOnce(stream_mode, prompt, temperature):
+    out_queue = TimedQueue()
+    manager = OllamaAgentManager(mcp_tools=[get_current_time], out_queue=out_queue)
+    manager.STREAM_MODE = stream_mode
+    manager.createChatModel(temperature=temperature, mcp_tools=[get_current_time])
+
+    callback_time = 0.0
+    getStreamingCallback = manager.getStreamingCallback
+
+    def timedStreamingCallback(mode):
+        callback, *accumulated = getStreamingCallback(mode)
+
+        def timed(*args):
+            nonlocal callback_time
+            start = time.perf_counter()
+            callback(*args)
+            callback_time += time.perf_counter() - start
+
+        return (timed, *accumulated)
+
+    manager.getStreamingCallback = timedStreamingCallback
+    out_queue.start_time = time.perf_counter()
+    await manager.chat(prompt)
+    end_time = time.perf_counter()
+    first_event = (
+        out_queue.first_event_time - out_queue.start_time
+        if out_queue.first_event_time
+        else end_time - out_queue.start_time
+    )
+    return {
+        "first_event": first_event,
+        "total": end_time - out_queue.start_time,
+        "events": out_queue.event_count,
+        "callback": callback_time,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("--temperature", type=float, default=0.1)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=[STREAM_MODE_LOG, STREAM_MODE_MESSAGES, STREAM_MODE_INVOKE],
+    )
+    args = parser.parse_args()
+
+    print(f"{'mode':<12} {'first event':>12} {'total':>10} {'events':>8} {'callback':>10}")
+    for stream_mode in args.modes:
+        results = [
+            await runOnce(stream_mode, args.prompt, args.temperature)
+            for _ in range(args.runs)
+        ]
+        print(
+            f"{stream_mode:<12} "
+            f"{statistics.median(r['first_event'] for r in results):>11.3f}s "
+            f"{statistics.median(r['total'] for r in results):>9.3f}s "
+            f"{statistics.median(r['events'] for r in results):>8.0f} "
+            f"{statistics.median(r['callback'] for r in results) * 1000:>8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""
+Measure UI frame times while tokens stream into a MessageView, with the
+token producer either on a thread of the UI process (the default Worker
+setup) or in a child process behind the worker_process pipe.
+
+The producer imitates the agent: every token costs some pure-Python work
+(message-chunk merging, callbacks) that holds the GIL. A 16 ms QTimer
+stands in for the frame clock, and the gaps between its ticks show how
+long the UI thread was kept from running.
+
+    uv run python -m benchmarks.ui_frame_benchmark --tokens 3000 --json frames.json
+
+Set QT_QPA_PLATFORM=offscreen to run it without a display.
+"""
+
+import argparse
+import json
+import multiprocessing
+import queue
+import statistics
+import sys
+import threading
+import time
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+
+from constants import EVENT_DATA, EVENT_TYPE
+from ui.widgets.message_view import MessageView
+from worker_process import FrameSender, decodeEvent
+
+FRAME_INTERVAL_MS = 16
+JANK_THRESHOLD_MS = 50
+POLL_INTERVAL_MS = 100  # same as ChatWindow.checkWorkerResult
+
+
+def busyWork(units):
+    total = 0
+    for i in range(units):
+        total += i * i % 7
+    return total
+
+
+def produceTokens(out_queue, tokens, work_units):
+    for index in range(tokens):
+        busyWork(work_units)
+        out_queue.put({EVENT_TYPE: "chat_token", EVENT_DATA: f"tok{index} "})
+    out_queue.put({EVENT_TYPE: "chat_result", EVENT_DATA: {"tokens": tokens}})
+
+
+def produceTokensInProcess(connection, tokens, work_units):
+    sender = FrameSender(connection)
+    produceTokens(sender, tokens, work_units)
+    sender.close()
+
+
+def startThreadProducer(out_queue, tokens, work_units):
+    threading.Thread(
+        target=produceTokens, args=(out_queue, tokens, work_units), daemon=True
+    ).start()
+
+
+def startProcessProducer(out_queue, tokens, work_units):
+    context = multiprocessing.get_context("spawn")
+    parent_end, child_end = context.Pipe(duplex=False)
+    process = context.Process(
+        target=produceTokensInProcess,
+        args=(child_end, tokens, work_units),
+        daemon=True,
+    )
+    process.start()
+    child_end.close()
+
+    def readLoop():
+        while True:
+            try:
+                out_queue.put(decodeEvent(parent_end.recv_bytes()))
+            except (EOFError, OSError):
+                return
+
+    threading.Thread(target=readLoop, daemon=True).start()
+    return process
+
+
+def runScenario(app, mode, tokens, work_units):
+    view = MessageView()
+    view.resize(800, 600)
+    view.show()
+    out_queue = queue.Queue()
+    frame_times = []
+    state = {"last": None, "done": False, "row_open": False, "received": 0}
+
+    def onFrame():
+        now = time.perf_counter()
+        if state["last"] is not None:
+            frame_times.append((now - state["last"]) * 1000)
+        state["last"] = now
+
+    def drain():
+        while True:
+            try:
+                event = out_queue.get_nowait()
+            except queue.Empty:
+                return
+            if event[EVENT_TYPE] == "chat_token":
+                state["received"] += 1
+                if state["row_open"]:
+                    view.appendToLast(event[EVENT_DATA])
+                else:
+                    view.append(event[EVENT_DATA])
+                    state["row_open"] = True
+            elif event[EVENT_TYPE] == "chat_result":
+                state["done"] = True
+                app.quit()
+
+    frame_timer = QTimer()
+    frame_timer.timeout.connect(onFrame)
+    frame_timer.start(FRAME_INTERVAL_MS)
+    poll_timer = QTimer()
+    poll_timer.timeout.connect(drain)
+    poll_timer.start(POLL_INTERVAL_MS)
+
+    start = time.perf_counter()
+    if mode == "process":
+        process = startProcessProducer(out_queue, tokens, work_units)
+    else:
+        process = None
+        startThreadProducer(out_queue, tokens, work_units)
+    app.exec()
+    elapsed = time.perf_counter() - start
+    frame_timer.stop()
+    poll_timer.stop()
+    if process is not None:
+        process.join(timeout=5)
+    view.close()
+
+    ordered = sorted(frame_times)
+    return {
+        "mode": mode,
+        "tokens": tokens,
+        "elapsed_s": round(elapsed, 3),
+        "frames": len(frame_times),
+        "frame_ms_p50": round(statistics.median(ordered), 2),
+        "frame_ms_p95": round(ordered[int(len(ordered) * 0.95) - 1], 2),
+        "frame_ms_max": round(ordered[-1], 2),
+        "jank_frames": sum(1 for value in ordered if value > JANK_THRESHOLD_MS),
+        "token_frames": state["received"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, default=3000)
+    parser.add_argument("--work", type=int, default=20000, help="loop iterations per token")
+    parser.add_argument("--modes", default="thread,process")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = [
+        runScenario(app, mode.strip(), args.tokens, args.work)
+        for mode in args.modes.split(",")
+    ]
+    for result in results:
+        print(
+            f"{result['mode']:>8}: {result['elapsed_s']:.2f} s, "
+            f"frame p50 {result['frame_ms_p50']:.1f} ms, "
+            f"p95 {result['frame_ms_p95']:.1f} ms, max {result['frame_ms_max']:.1f} ms, "
+            f"{result['jank_frames']} frames over {JANK_THRESHOLD_MS} ms, "
+            f"{result['token_frames']} token events for {result['tokens']} tokens"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
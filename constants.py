@@ -5,6 +5,57 @@ DEFAULT_LLM_MODEL = "qwen3:4b"
 DEFAULT_TEMPERATURE = 0.1
 DEFAULT_QUERY_TIMEOUT = 60 * 5
 RECURSION_LIMIT = 100
+# per-query ReAct loop guard; RECURSION_LIMIT stays as the hard backstop
+DEFAULT_AGENT_STEP_BUDGET = 25
+DEFAULT_LOOP_REPEAT_LIMIT = 3
+DEFAULT_CASSETTE_FILE = "session_cassette.jsonl"
+DEFAULT_TOOL_ROUTER_TOP_K = 6
+DEFAULT_CASCADE_STEP_BUDGET = 12
+# tools that only read: turns calling any other tool are not cached, and the
+# fan-out planner gets only these
+DEFAULT_READ_ONLY_TOOLS = [
+    "get_local_file_list",
+    "get_local_file_lists",
+    "stat_local_paths",
+    "list_fitness_users",
+    "fitness_daily_summary",
+    "fitness_rolling_heart_rate",
+    "fitness_load_and_fatigue",
+    "fitness_compare_users",
+]
+STREAM_MODE_MESSAGES = "messages"
+STREAM_MODE_LOG = "astream_log"
+STREAM_MODE_INVOKE = "invoke"
+DEFAULT_STREAM_MODE = STREAM_MODE_MESSAGES
+
+# MCP server supervision (seconds)
+MCP_HEALTH_CHECK_INTERVAL = 15
+MCP_START_TIMEOUT = 60
+MCP_PING_TIMEOUT = 5
+MCP_SLOW_PING_THRESHOLD = 2
+MCP_TOOL_CALL_TIMEOUT = 120
+MCP_BACKOFF_BASE = 2
+MCP_BACKOFF_MAX = 120
+MCP_CIRCUIT_BREAKER_THRESHOLD = 5
+MCP_CIRCUIT_OPEN_SECONDS = 300
+# stop MCP servers with no tool call for this long; 0 keeps them running
+DEFAULT_MCP_IDLE_SHUTDOWN = 600
+# files mentioned in a prompt are attached up front only from these directories
+DEFAULT_PREFETCH_ALLOWED_DIRS = ["fitness-history-data"]
+DEFAULT_PREFETCH_MAX_KB = 32
+DEFAULT_MEMORY_EMBEDDING_MODEL = "nomic-embed-text"
+DEFAULT_MEMORY_TOP_K = 4
+DEFAULT_MEMORY_TOKEN_BUDGET = 400
+# num_ctx sizes a request can get; few sizes means few model reloads
+DEFAULT_NUM_CTX_BUCKETS = [2048, 4096, 8192, 16384, 32768]
+DEFAULT_NUM_CTX_MAX = 32768
+DEFAULT_NUM_PREDICT_TOOL_STEP = 2048
+DEFAULT_NUM_PREDICT_FINAL_ANSWER = 0
+# sub-agents a fanned-out question runs at once, and the most it may be split into
+DEFAULT_FAN_OUT_MAX_PARALLEL = 4
+DEFAULT_FAN_OUT_MAX_SUBTASKS = 8
+# partial tool output lines kept on the progress row
+TOOL_PARTIAL_LINES = 5
 DEFAULT_SYSTEM_PROMPT = """
         You are a helpful AI assistant that can use tools to answer questions.
         You have access to the following tools:
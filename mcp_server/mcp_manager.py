@@ -8,6 +8,13 @@ MCP_ADD_TEMPLATES = {
     "transport": "set_stdio_for_local_server",
 }
 MCP_CONFIG_PATH = "mcp_config.json"
+URL_TRANSPORTS = ("sse", "websocket")
+URL_SCHEMES = ("http://", "https://", "ws://", "wss://")
+
+
+def isUrlServer(server):
+    """True for entries that connect to an already running server by URL."""
+    return "url" in server
 
 
 class MCPManager:
@@ -41,8 +48,18 @@ class MCPManager:
         for name, server in config["mcpServers"].items():
             if not isinstance(server, dict):
                 return False, f'"{name}" server config is not a dictionary.'
+            if isUrlServer(server):
+                # a running daemon: connect over HTTP instead of spawning it
+                if server.get("transport", "sse") not in URL_TRANSPORTS:
+                    return (
+                        False,
+                        f'"{name}" server "transport" must be one of {", ".join(URL_TRANSPORTS)}.',
+                    )
+                if not str(server["url"]).startswith(URL_SCHEMES):
+                    return False, f'"{name}" server "url" must start with {" or ".join(URL_SCHEMES)}.'
+                continue
             if "command" not in server or "args" not in server:
-                return False, f'"{name}" server has no "command" or "args".'
+                return False, f'"{name}" server has no "command" and "args", or "url".'
             if not isinstance(server["args"], list):
                 return False, f'"{name}" server "args" must be a list.'
         return True, "Valid MCP config."
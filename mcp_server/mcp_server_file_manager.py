@@ -1,8 +1,23 @@
+import argparse
+import asyncio
+import functools
 import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+
+# How many directory entries to process between progress notifications
+PROGRESS_EVERY = 200
+# Filesystem calls run on this many threads so a slow disk can't stall the loop
+FILE_IO_WORKERS = 8
+MAX_BATCH_PATHS = 256
+
+file_io_pool = ThreadPoolExecutor(
+    max_workers=FILE_IO_WORKERS, thread_name_prefix="file_io"
+)
 
 # Initialize FastMCP server with configuration
 mcp = FastMCP(
@@ -13,9 +28,87 @@ mcp = FastMCP(
 )
 
 
+async def report_partial(ctx: Context, text: str):
+    """
+    Send a partial result to the client as a log message whose logger name
+    carries the request's progress token, so the client can attach it to
+    the running tool call.
+    """
+    meta = ctx.request_context.meta
+    if meta is None or meta.progressToken is None:
+        return
+    await ctx.log("info", text, logger_name=f"progress:{meta.progressToken}")
+
+
+def format_size(size: int) -> str:
+    # Convert size unit
+    if size > 1024 * 1024 * 1024:
+        return f"{size/(1024*1024*1024):.2f} GB"
+    if size > 1024 * 1024:
+        return f"{size/(1024*1024):.2f} MB"
+    if size > 1024:
+        return f"{size/1024:.2f} KB"
+    return f"{size:,} bytes"
+
+
+def describe_entries(entries: list) -> list:
+    """Blocking: stat directory entries and format one line per entry."""
+    lines = []
+    for entry in entries:
+        try:
+            stats = entry.stat()
+        except OSError as e:
+            lines.append(f"[?] {entry.name:<50} Error: {e}")
+            continue
+        modified_time = datetime.fromtimestamp(stats.st_mtime).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        # File/directory distinction
+        type_str = "[DIR]" if entry.is_dir() else "[FILE]"
+        lines.append(
+            f"{type_str} {entry.name:<50} {format_size(stats.st_size):<15} {modified_time}"
+        )
+    return lines
+
+
+def scan_directory(path: str) -> list:
+    """Blocking: list directory entries, or raise if the path is missing."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Path '{path}' does not exist")
+    with os.scandir(path) as iterator:
+        return list(iterator)
+
+
+def list_directory(path: str) -> str:
+    """Blocking: the sorted listing of a directory."""
+    return "\n".join(sorted(describe_entries(scan_directory(path))))
+
+
+def stat_path(path: str) -> str:
+    """Blocking: one line describing a file or directory."""
+    stats = os.stat(path)
+    modified_time = datetime.fromtimestamp(stats.st_mtime).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    type_str = "[DIR]" if stat.S_ISDIR(stats.st_mode) else "[FILE]"
+    return f"{type_str} {path:<60} {format_size(stats.st_size):<15} {modified_time}"
+
+
+def write_text(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+async def run_blocking(func, *args):
+    """Run blocking filesystem work on the bounded pool, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        file_io_pool, functools.partial(func, *args)
+    )
+
+
 # Get list of files and directories in a specified path
 @mcp.tool()
-async def get_local_file_list(path: str) -> str:
+async def get_local_file_list(path: str, ctx: Context) -> str:
     """
     Get a list of files and directories in a specified path.
 
@@ -26,34 +119,18 @@ async def get_local_file_list(path: str) -> str:
         str: A string containing the file list separated by newlines
     """
     try:
-        if not os.path.exists(path):
-            return f"Error: Path '{path}' does not exist"
-
+        entries = await run_blocking(scan_directory, path)
+        total = len(entries)
         file_list = []
 
-        # Collect file/directory information
-        for entry in os.scandir(path):
-            stats = entry.stat()
-            size = stats.st_size
-            modified_time = datetime.fromtimestamp(stats.st_mtime).strftime(
-                "%Y-%m-%d %H:%M:%S"
+        # Collect file/directory information, one chunk per pool task
+        for start in range(0, total, PROGRESS_EVERY):
+            lines = await run_blocking(
+                describe_entries, entries[start : start + PROGRESS_EVERY]
             )
-
-            # Convert size unit
-            size_str = f"{size:,} bytes"
-            if size > 1024 * 1024 * 1024:
-                size_str = f"{size/(1024*1024*1024):.2f} GB"
-            elif size > 1024 * 1024:
-                size_str = f"{size/(1024*1024):.2f} MB"
-            elif size > 1024:
-                size_str = f"{size/1024:.2f} KB"
-
-            # File/directory distinction
-            type_str = "[DIR]" if entry.is_dir() else "[FILE]"
-
-            # Generate result string
-            file_info = f"{type_str} {entry.name:<50} {size_str:<15} {modified_time}"
-            file_list.append(file_info)
+            file_list.extend(lines)
+            await ctx.report_progress(len(file_list), total)
+            await report_partial(ctx, "\n".join(lines[:20]))
 
         # Sort and return results
         return "\n".join(sorted(file_list))
@@ -62,6 +139,54 @@ async def get_local_file_list(path: str) -> str:
         return f"Error: {str(e)}"
 
 
+# Get file information for many paths in one call
+@mcp.tool()
+async def stat_local_paths(paths: list[str]) -> str:
+    """
+    Get type, size and modification time of many files or directories at once.
+
+    Args:
+        paths (list[str]): local file or directory paths
+
+    Returns:
+        str: One line per path, in the order given
+    """
+    if len(paths) > MAX_BATCH_PATHS:
+        return f"Error: At most {MAX_BATCH_PATHS} paths per call"
+    results = await asyncio.gather(
+        *(run_blocking(stat_path, path) for path in paths), return_exceptions=True
+    )
+    return "\n".join(
+        f"[?] {path:<60} Error: {result}" if isinstance(result, Exception) else result
+        for path, result in zip(paths, results)
+    )
+
+
+# Get lists of files and directories in many paths in one call
+@mcp.tool()
+async def get_local_file_lists(paths: list[str]) -> str:
+    """
+    Get the lists of files and directories in several paths at once.
+
+    Args:
+        paths (list[str]): local directory paths to get file lists
+
+    Returns:
+        str: Each path's file list under a "== path ==" header
+    """
+    if len(paths) > MAX_BATCH_PATHS:
+        return f"Error: At most {MAX_BATCH_PATHS} paths per call"
+    results = await asyncio.gather(
+        *(run_blocking(list_directory, path) for path in paths),
+        return_exceptions=True,
+    )
+    return "\n\n".join(
+        f"== {path} ==\n"
+        + (f"Error: {result}" if isinstance(result, Exception) else result)
+        for path, result in zip(paths, results)
+    )
+
+
 # Write specified text to a file
 @mcp.tool()
 async def write_text_to_file(file_name: str, text: str) -> str:
@@ -78,8 +203,7 @@ async def write_text_to_file(file_name: str, text: str) -> str:
     try:
         path = os.path.join(os.path.expanduser("~"), "Downloads", file_name)
 
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(text)
+        await run_blocking(write_text, path, text)
 
         result_text = f"Successfully wrote to file: {path}\n{text}"
         return result_text
@@ -88,5 +212,12 @@ async def write_text_to_file(file_name: str, text: str) -> str:
 
 
 if __name__ == "__main__":
-    # Start the MCP server with stdio transport
-    mcp.run(transport="stdio")
+    # stdio by default (spawned per app); --transport sse runs a shared daemon
+    parser = argparse.ArgumentParser(description=mcp.name)
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8006)
+    args = parser.parse_args()
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=args.transport)
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from mcp.server.fastmcp import FastMCP
+
+# Directory with one <user>.json file per user
+FITNESS_DATA_DIR = Path(
+    os.environ.get(
+        "FITNESS_DATA_DIR",
+        Path(__file__).resolve().parent.parent / "fitness-history-data",
+    )
+)
+# Heart-rate reserve bounds for the training load (TRIMP) when not given
+DEFAULT_REST_HR = 60
+DEFAULT_MAX_HR = 190
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+DEFAULT_LIMIT = 14
+
+# Initialize FastMCP server with configuration
+mcp = FastMCP(
+    "fitness_analytics",  # Name of the MCP server
+    instructions=(
+        "You analyze users' exercise history. Use these tools instead of "
+        "reading the fitness JSON files directly."
+    ),
+    host="0.0.0.0",  # Host address (0.0.0.0 allows connections from any IP)
+    port=8007,  # Port number for the server
+)
+
+
+class FitnessTable:
+    """One user's entries as columnar NumPy arrays, sorted by date."""
+
+    def __init__(self, user, entries):
+        entries = sorted(entries, key=lambda e: e.get("date", ""))
+        self.user = user
+        self.dates = np.array([e.get("date") for e in entries], dtype="datetime64[D]")
+        self.duration = self.numericColumn(entries, "duration_min")
+        self.heart_rate = self.numericColumn(entries, "heart_rate")
+        self.exercise_names, self.exercise = np.unique(
+            np.array([str(e.get("exercise", "")) for e in entries], dtype=object),
+            return_inverse=True,
+        )
+
+    @staticmethod
+    def numericColumn(entries, key):
+        values = [e.get(key) for e in entries]
+        return np.array(
+            [v if isinstance(v, (int, float)) else np.nan for v in values],
+            dtype=np.float64,
+        )
+
+    def select(self, start_date="", end_date=""):
+        """Boolean mask of entries within [start_date, end_date]."""
+        mask = np.ones(len(self.dates), dtype=bool)
+        if start_date:
+            mask &= self.dates >= np.datetime64(start_date, "D")
+        if end_date:
+            mask &= self.dates <= np.datetime64(end_date, "D")
+        return mask
+
+    def trimp(self, rest_hr, max_hr):
+        """Banister TRIMP per session. Sessions without heart rate count as 0."""
+        reserve = np.clip((self.heart_rate - rest_hr) / (max_hr - rest_hr), 0, 1)
+        load = np.nan_to_num(self.duration) * reserve * 0.64 * np.exp(1.92 * reserve)
+        return np.nan_to_num(load)
+
+    def dailySeries(self, values, mask=None):
+        """
+        Sum values per calendar day from the first to the last entry, with
+        empty days as 0. Returns (days, sums, counts).
+        """
+        dates = self.dates if mask is None else self.dates[mask]
+        values = values if mask is None else values[mask]
+        if len(dates) == 0:
+            return dates, np.zeros(0), np.zeros(0)
+        offsets = (dates - dates[0]).astype(np.int64)
+        size = int(offsets[-1]) + 1
+        valid = ~np.isnan(values)
+        sums = np.bincount(offsets[valid], weights=values[valid], minlength=size)
+        counts = np.bincount(offsets[valid], minlength=size).astype(np.float64)
+        days = dates[0] + np.arange(size)
+        return days, sums, counts
+
+
+# user id -> (file mtime_ns, FitnessTable)
+table_cache = {}
+
+
+def user_files():
+    return {path.stem: path for path in sorted(FITNESS_DATA_DIR.glob("*.json"))}
+
+
+def load_table(user: str) -> FitnessTable:
+    """Load a user's file into a FitnessTable, reusing it until the file changes."""
+    path = user_files().get(user)
+    if path is None:
+        raise ValueError(f"Unknown user '{user}'")
+    mtime = path.stat().st_mtime_ns
+    cached = table_cache.get(user)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    table = FitnessTable(data.get("user", user), data.get("entries", []))
+    table_cache[user] = (mtime, table)
+    return table
+
+
+def rolling_sum(values, window):
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    start = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    return cumulative[1:] - cumulative[start]
+
+
+def fmt(value, digits=1):
+    return "-" if value is None or np.isnan(value) else f"{value:.{digits}f}"
+
+
+def load_indicators(table, rest_hr, max_hr, mask=None):
+    """Daily acute/chronic load and their ratio (ACWR) over the selected range."""
+    days, loads, _counts = table.dailySeries(table.trimp(rest_hr, max_hr), mask)
+    acute = rolling_sum(loads, ACUTE_DAYS) / ACUTE_DAYS
+    chronic = rolling_sum(loads, CHRONIC_DAYS) / CHRONIC_DAYS
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(chronic > 0, acute / chronic, np.nan)
+    # the chronic average is meaningless until it covers a full window
+    ratio[: CHRONIC_DAYS - 1] = np.nan
+    return days, loads, acute, chronic, ratio
+
+
+def fatigue_label(ratio):
+    if np.isnan(ratio):
+        return f"needs {CHRONIC_DAYS} days of history"
+    if ratio > 1.5:
+        return "high fatigue risk"
+    if ratio > 1.3:
+        return "load rising fast"
+    if ratio < 0.8:
+        return "detraining / recovered"
+    return "balanced"
+
+
+# List the users with fitness data
+@mcp.tool()
+async def list_fitness_users() -> str:
+    """
+    List the users that have fitness data, with entry counts and date ranges.
+
+    Returns:
+        str: One line per user
+    """
+    lines = []
+    for user in user_files():
+        try:
+            table = load_table(user)
+        except Exception as e:
+            lines.append(f"{user}: Error: {e}")
+            continue
+        if len(table.dates) == 0:
+            lines.append(f"{user}: no entries")
+            continue
+        lines.append(
+            f"{user}: {len(table.dates)} entries, {table.dates[0]} ~ {table.dates[-1]}"
+        )
+    return "\n".join(lines) or "No fitness data found."
+
+
+# Per-day summary of a user's exercise
+@mcp.tool()
+async def fitness_daily_summary(
+    user: str, start_date: str = "", end_date: str = "", limit: int = DEFAULT_LIMIT
+) -> str:
+    """
+    Summarize each day with exercise: sessions, minutes, average and maximum
+    heart rate, and exercise types.
+
+    Args:
+        user (str): user id, e.g. "user_01"
+        start_date (str): first day (YYYY-MM-DD), empty for no bound
+        end_date (str): last day (YYYY-MM-DD), empty for no bound
+        limit (int): only the most recent days are returned
+
+    Returns:
+        str: One line per day, oldest first
+    """
+    try:
+        table = load_table(user)
+        index = np.flatnonzero(table.select(start_date, end_date))
+        if len(index) == 0:
+            return f"No entries for {user} in that range."
+        dates = table.dates[index]
+        # entries are sorted, so each day is a contiguous run
+        days, starts = np.unique(dates, return_index=True)
+        total_days = len(days)
+        days, starts = days[-limit:], starts[-limit:]
+        ends = np.append(starts[1:], len(index))
+        duration = table.duration[index]
+        heart_rate = table.heart_rate[index]
+        lines = [f"{user} daily summary ({len(days)} of {total_days} days)"]
+        for day, start, end in zip(days, starts, ends):
+            hr = heart_rate[start:end]
+            has_hr = not np.all(np.isnan(hr))
+            names = ", ".join(
+                dict.fromkeys(table.exercise_names[table.exercise[index[start:end]]])
+            )
+            lines.append(
+                f"{day}: {end - start} session(s), {np.nansum(duration[start:end]):.0f} min, "
+                f"HR avg {fmt(np.nanmean(hr)) if has_hr else '-'} "
+                f"max {fmt(np.nanmax(hr), 0) if has_hr else '-'}, {names}"
+            )
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+# Rolling heart-rate average of a user
+@mcp.tool()
+async def fitness_rolling_heart_rate(
+    user: str, window_days: int = 7, limit: int = DEFAULT_LIMIT
+) -> str:
+    """
+    Rolling average of exercise heart rate over a window of calendar days,
+    plus the overall trend.
+
+    Args:
+        user (str): user id, e.g. "user_01"
+        window_days (int): rolling window length in days
+        limit (int): only the most recent days are returned
+
+    Returns:
+        str: The trend and one line per day with the rolling average
+    """
+    try:
+        table = load_table(user)
+        days, sums, counts = table.dailySeries(table.heart_rate)
+        if len(days) == 0:
+            return f"No entries for {user}."
+        window = max(int(window_days), 1)
+        rolling_counts = rolling_sum(counts, window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rolling = np.where(
+                rolling_counts > 0, rolling_sum(sums, window) / rolling_counts, np.nan
+            )
+        measured = counts > 0
+        trend = "-"
+        if measured.sum() >= 3:
+            x = np.flatnonzero(measured)
+            slope = np.polyfit(x, sums[measured] / counts[measured], 1)[0]
+            trend = f"{slope * 7:+.1f} bpm/week"
+        lines = [f"{user} {window}-day rolling heart rate (trend {trend})"]
+        for day, value, count in zip(days[-limit:], rolling[-limit:], counts[-limit:]):
+            lines.append(f"{day}: {fmt(value)}{'' if count else ' (rest day)'}")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+# Training load and fatigue indicators of a user
+@mcp.tool()
+async def fitness_load_and_fatigue(
+    user: str,
+    rest_hr: int = DEFAULT_REST_HR,
+    max_hr: int = DEFAULT_MAX_HR,
+    limit: int = DEFAULT_LIMIT,
+) -> str:
+    """
+    Training load (TRIMP from duration and heart rate) with 7-day acute and
+    28-day chronic averages. Their ratio (ACWR) above 1.5 signals fatigue risk.
+
+    Args:
+        user (str): user id, e.g. "user_01"
+        rest_hr (int): the user's resting heart rate
+        max_hr (int): the user's maximum heart rate
+        limit (int): only the most recent days are returned
+
+    Returns:
+        str: The current fatigue status and one line per day
+    """
+    try:
+        table = load_table(user)
+        days, loads, acute, chronic, ratio = load_indicators(table, rest_hr, max_hr)
+        if len(days) == 0:
+            return f"No entries for {user}."
+        lines = [
+            f"{user} training load: latest ACWR {fmt(ratio[-1], 2)} "
+            f"({fatigue_label(ratio[-1])})",
+            "day: load / acute(7d) / chronic(28d) / ACWR",
+        ]
+        for row in zip(
+            days[-limit:], loads[-limit:], acute[-limit:], chronic[-limit:], ratio[-limit:]
+        ):
+            day, load, acute_load, chronic_load, day_ratio = row
+            lines.append(
+                f"{day}: {load:.0f} / {acute_load:.1f} / {chronic_load:.1f} / {fmt(day_ratio, 2)}"
+            )
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+# Compare several users
+@mcp.tool()
+async def fitness_compare_users(
+    users: list[str] | None = None, start_date: str = "", end_date: str = ""
+) -> str:
+    """
+    Compare users over a date range: sessions, minutes, average heart rate,
+    weekly training load and current fatigue status.
+
+    Args:
+        users (list[str]): user ids to compare, empty for all users
+        start_date (str): first day (YYYY-MM-DD), empty for no bound
+        end_date (str): last day (YYYY-MM-DD), empty for no bound
+
+    Returns:
+        str: One line per user
+    """
+    lines = ["user: sessions / minutes / HR avg / load per week / ACWR (status)"]
+    for user in users or list(user_files()):
+        try:
+            table = load_table(user)
+            mask = table.select(start_date, end_date)
+            if not mask.any():
+                lines.append(f"{user}: no entries")
+                continue
+            days, loads, _acute, _chronic, ratio = load_indicators(
+                table, DEFAULT_REST_HR, DEFAULT_MAX_HR, mask
+            )
+            weeks = max(len(days) / 7, 1)
+            heart_rate = table.heart_rate[mask]
+            lines.append(
+                f"{user}: {int(mask.sum())} / {np.nansum(table.duration[mask]):.0f} / "
+                f"{fmt(np.nanmean(heart_rate)) if not np.all(np.isnan(heart_rate)) else '-'} / "
+                f"{loads.sum() / weeks:.0f} / {fmt(ratio[-1], 2)} ({fatigue_label(ratio[-1])})"
+            )
+        except Exception as e:
+            lines.append(f"{user}: Error: {e}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # stdio by default (spawned per app); --transport sse runs a shared daemon
+    parser = argparse.ArgumentParser(description=mcp.name)
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8007)
+    args = parser.parse_args()
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=args.transport)
@@ -0,0 +1,582 @@
+import asyncio
+import functools
+import os
+import statistics
+import time
+import uuid
+
+from langchain_core.tools import StructuredTool, ToolException
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from mcp import types
+from pydantic import ValidationError
+
+from constants import (
+    MCP_BACKOFF_BASE,
+    MCP_BACKOFF_MAX,
+    MCP_CIRCUIT_BREAKER_THRESHOLD,
+    MCP_CIRCUIT_OPEN_SECONDS,
+    MCP_HEALTH_CHECK_INTERVAL,
+    MCP_PING_TIMEOUT,
+    MCP_SLOW_PING_THRESHOLD,
+    MCP_START_TIMEOUT,
+    MCP_TOOL_CALL_TIMEOUT,
+)
+from mcp_server.mcp_manager import isUrlServer
+from mcp_server.tool_catalog import toolResult, toolSpec
+from metrics import REGISTRY, childProcesses, processTreeStats
+
+STATUS_STARTING = "starting"
+STATUS_HEALTHY = "healthy"
+STATUS_DOWN = "down"
+STATUS_CIRCUIT_OPEN = "circuit_open"
+# not running, but its tools are offered and the first call starts it
+STATUS_IDLE = "idle"
+
+LATENCY_SAMPLES = 50
+SLOW_PINGS_TO_DROP = 3
+# servers send partial tool output as log messages from this logger prefix
+PARTIAL_LOGGER_PREFIX = "progress:"
+
+TOOL_CALLS = REGISTRY.counter(
+    "mcp_tool_calls_total",
+    "MCP tool calls by server and outcome (ok, error, timeout, unavailable).",
+    labels=("server", "outcome"),
+)
+TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "mcp_tool_call_seconds", "Duration of MCP tool calls.", labels=("server",)
+)
+PING_SECONDS = REGISTRY.histogram(
+    "mcp_ping_seconds",
+    "MCP health check ping latency.",
+    labels=("server",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 5),
+)
+SERVER_RESTARTS = REGISTRY.counter(
+    "mcp_server_restarts_total",
+    "MCP server restarts or reconnects.",
+    labels=("server",),
+)
+SERVER_UP = REGISTRY.gauge(
+    "mcp_server_up", "1 if the MCP server is running and healthy.", labels=("server",)
+)
+SERVER_RSS = REGISTRY.gauge(
+    "mcp_server_resident_memory_bytes",
+    "Resident memory of an MCP server subprocess and its children.",
+    labels=("server",),
+)
+SERVER_CPU = REGISTRY.gauge(
+    "mcp_server_cpu_seconds",
+    "CPU time used by an MCP server subprocess and its children.",
+    labels=("server",),
+)
+
+
+def commandName(path):
+    return os.path.splitext(os.path.basename(path))[0].lower()
+
+
+def matchesCommand(cmdline, config):
+    """Whether a process command line is the one a stdio server entry launches."""
+    args = [str(arg) for arg in config.get("args", [])]
+    return (
+        len(cmdline) == len(args) + 1
+        and cmdline[1:] == args
+        and commandName(cmdline[0]) == commandName(config.get("command", ""))
+    )
+
+
+class ServerState:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.client = None
+        self.task = None
+        self.stop_event = None
+        self.tools = []
+        self.tool_specs = []
+        self.status = STATUS_STARTING
+        self.start_lock = asyncio.Lock()
+        self.active_calls = 0
+        self.last_used_at = 0.0
+        self.started_at = None
+        self.consecutive_failures = 0
+        self.consecutive_slow = 0
+        self.next_retry_at = 0.0
+        self.restarts = 0
+        self.last_error = ""
+        self.ping_latencies = []
+        self.call_latencies = []
+        # the stdio subprocess, found on the first metrics collection
+        self.pid = None
+
+    @property
+    def is_remote(self):
+        return isUrlServer(self.config)
+
+    @property
+    def available(self):
+        return self.status == STATUS_HEALTHY
+
+    @property
+    def offered(self):
+        """Whether the agent should see this server's tools."""
+        return self.status in (STATUS_HEALTHY, STATUS_IDLE)
+
+    def recordLatency(self, samples, value):
+        samples.append(value)
+        del samples[:-LATENCY_SAMPLES]
+
+    def getStats(self):
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "status": self.status,
+            "uptime": uptime if self.available else 0.0,
+            "restarts": self.restarts,
+            "tools": len(self.tools),
+            "url": self.config.get("url"),
+            "ping_ms": (
+                statistics.median(self.ping_latencies) * 1000
+                if self.ping_latencies
+                else None
+            ),
+            "call_ms": (
+                statistics.median(self.call_latencies) * 1000
+                if self.call_latencies
+                else None
+            ),
+            "last_error": self.last_error,
+        }
+
+
+class MCPSupervisor:
+    """
+    Runs each configured MCP server in its own MultiServerMCPClient so one
+    crashed or wedged server can be restarted without touching the others.
+    Entries with a "url" connect to an already running server (see
+    --transport sse on the bundled servers); each keeps one long-lived
+    session that all tool calls share, and "restarting" it reconnects.
+
+    Servers are pinged every MCP_HEALTH_CHECK_INTERVAL seconds. A failed or
+    repeatedly slow server is dropped from getTools() and restarted with
+    exponential backoff; after MCP_CIRCUIT_BREAKER_THRESHOLD consecutive
+    failures its circuit opens and restarts pause for MCP_CIRCUIT_OPEN_SECONDS.
+
+    Every tool call carries a progress token. Progress notifications and
+    partial results logged under that token are passed to on_tool_progress.
+
+    With a ToolCatalog, servers whose tool list is already in the catalog
+    are not started by start(): their saved tools are offered and the server
+    starts on the first call to one of them. With idle_shutdown, a server
+    with no tool call for that many seconds is stopped again.
+    """
+
+    def __init__(
+        self,
+        servers_config,
+        on_tools_changed=None,
+        on_tool_progress=None,
+        cassette=None,
+        catalog=None,
+        idle_shutdown=0,
+    ):
+        self.servers = {
+            name: ServerState(name, config) for name, config in servers_config.items()
+        }
+        self.on_tools_changed = on_tools_changed
+        self.on_tool_progress = on_tool_progress
+        # a recording Cassette gets every tool list and tool call
+        self.cassette = cassette
+        self.catalog = catalog
+        self.idle_shutdown = idle_shutdown
+        self.progress_calls = {}
+        self.background_tasks = set()
+        self.last_check_at = 0.0
+
+    async def start(self):
+        eager = []
+        for server in self.servers.values():
+            specs = self.catalog.get(server.name, server.config) if self.catalog else None
+            if specs is None:
+                eager.append(server)
+                continue
+            self.setTools(server, specs)
+            server.status = STATUS_IDLE
+            if self.cassette:
+                self.cassette.recordTools(server.name, server.tools)
+            print(f"[MCP] {server.name}: {len(specs)} tools from catalog, starts on first use.")
+        await asyncio.gather(*(self.startServer(s) for s in eager))
+        self.last_check_at = time.monotonic()
+
+    async def hostServer(self, server, ready):
+        """
+        Keep the server's client session open inside one task, so the context
+        is entered and exited in the same task as anyio requires.
+        """
+        config = dict(server.config)
+        if server.is_remote:
+            config.setdefault("transport", "sse")
+        config["session_kwargs"] = {
+            **config.get("session_kwargs", {}),
+            "message_handler": functools.partial(self.handleServerMessage, server),
+        }
+        try:
+            async with MultiServerMCPClient({server.name: config}) as client:
+                server.client = client
+                ready.set_result(client.get_tools())
+                await server.stop_event.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"[MCP] {server.name} session ended: {e}")
+        finally:
+            server.client = None
+            if ready.done() and not server.stop_event.is_set():
+                self.onConnectionLost(server, "session ended")
+
+    def onConnectionLost(self, server, error):
+        """
+        The transport failed on its own (a daemon restarted or the connection
+        dropped): stop offering the server's tools now and reconnect on the
+        next health check instead of waiting for a ping to time out.
+        """
+        if not server.available:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self.markFailed(server, f"connection lost: {error}")
+        )
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def startServer(self, server):
+        server.status = STATUS_STARTING
+        server.pid = None
+        server.stop_event = asyncio.Event()
+        ready = asyncio.get_running_loop().create_future()
+        server.task = asyncio.get_running_loop().create_task(
+            self.hostServer(server, ready)
+        )
+        try:
+            tools = await asyncio.wait_for(asyncio.shield(ready), MCP_START_TIMEOUT)
+        except Exception as e:
+            await self.stopServerTask(server)
+            self.recordFailure(server, f"start failed: {str(e) or type(e).__name__}")
+            return False, False
+        if self.cassette:
+            self.cassette.recordTools(server.name, tools)
+        specs = [toolSpec(tool) for tool in tools]
+        if self.catalog:
+            self.catalog.put(server.name, server.config, specs)
+        tools_changed = specs != server.tool_specs
+        if tools_changed:
+            self.setTools(server, specs)
+        server.status = STATUS_HEALTHY
+        server.started_at = time.monotonic()
+        server.last_used_at = server.started_at
+        server.consecutive_failures = 0
+        server.consecutive_slow = 0
+        server.last_error = ""
+        print(f"[MCP] {server.name} started with {len(tools)} tools.")
+        return True, tools_changed
+
+    async def ensureStarted(self, server):
+        """
+        Start an idle server for a tool call; concurrent calls share one start.
+        This runs inside the agent's query, so on_tools_changed must not swap
+        the agent straight away (the worker rebinds once the query is done).
+        """
+        async with server.start_lock:
+            if server.status != STATUS_IDLE:
+                return
+            print(f"[MCP] Starting {server.name} on first use.")
+            started, tools_changed = await self.startServer(server)
+            if not started:
+                server.tools = []
+                server.tool_specs = []
+                self.notifyToolsChanged()
+            elif tools_changed:
+                # the catalog was stale; the agent gets the real tool list
+                self.notifyToolsChanged()
+
+    async def stopIdleServer(self, server):
+        idle_for = time.monotonic() - server.last_used_at
+        print(f"[MCP] Stopping {server.name} after {idle_for:.0f}s without tool calls.")
+        server.status = STATUS_IDLE
+        server.started_at = None
+        await self.stopServerTask(server)
+
+    def isIdle(self, server, now):
+        return (
+            self.idle_shutdown
+            and server.status == STATUS_HEALTHY
+            and server.active_calls == 0
+            and now - server.last_used_at >= self.idle_shutdown
+        )
+
+    async def stopServerTask(self, server):
+        task, server.task = server.task, None
+        if task is None:
+            return
+        server.stop_event.set()
+        try:
+            await asyncio.wait_for(task, MCP_PING_TIMEOUT)
+        except BaseException as e:  # a wedged server may not shut down cleanly
+            print(f"[MCP] Error while stopping {server.name}: {str(e) or type(e).__name__}")
+
+    def recordFailure(self, server, error):
+        server.consecutive_failures += 1
+        server.last_error = str(error)
+        if server.consecutive_failures >= MCP_CIRCUIT_BREAKER_THRESHOLD:
+            server.status = STATUS_CIRCUIT_OPEN
+            delay = MCP_CIRCUIT_OPEN_SECONDS
+        else:
+            server.status = STATUS_DOWN
+            delay = min(
+                MCP_BACKOFF_BASE * 2 ** (server.consecutive_failures - 1),
+                MCP_BACKOFF_MAX,
+            )
+        server.next_retry_at = time.monotonic() + delay
+        print(
+            f"[MCP] {server.name} {server.status} ({error}); retry in {delay:.0f}s"
+        )
+
+    async def markFailed(self, server, error):
+        was_available = server.available
+        server.tools = []
+        server.tool_specs = []
+        self.recordFailure(server, error)
+        await self.stopServerTask(server)
+        if was_available:
+            self.notifyToolsChanged()
+
+    async def pingServer(self, server):
+        session = server.client.sessions.get(server.name) if server.client else None
+        if session is None or server.task is None or server.task.done():
+            await self.markFailed(server, "no session")
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(session.send_ping(), MCP_PING_TIMEOUT)
+        except Exception as e:
+            await self.markFailed(server, f"ping failed: {str(e) or type(e).__name__}")
+            return
+        latency = time.perf_counter() - start
+        server.recordLatency(server.ping_latencies, latency)
+        PING_SECONDS.observe(latency, server=server.name)
+        if latency > MCP_SLOW_PING_THRESHOLD:
+            server.consecutive_slow += 1
+            if server.consecutive_slow >= SLOW_PINGS_TO_DROP:
+                await self.markFailed(server, f"slow ping {latency:.2f}s")
+        else:
+            server.consecutive_slow = 0
+
+    async def restartServer(self, server):
+        server.restarts += 1
+        SERVER_RESTARTS.inc(server=server.name)
+        action = "Reconnecting to" if server.is_remote else "Restarting"
+        print(f"[MCP] {action} {server.name} (attempt {server.restarts})")
+        started, _tools_changed = await self.startServer(server)
+        if started:
+            self.notifyToolsChanged()
+
+    async def checkHealth(self):
+        now = time.monotonic()
+        self.last_check_at = now
+        tasks = []
+        for server in self.servers.values():
+            if self.isIdle(server, now):
+                tasks.append(self.stopIdleServer(server))
+            elif server.status == STATUS_HEALTHY:
+                tasks.append(self.pingServer(server))
+            elif (
+                server.status in (STATUS_DOWN, STATUS_CIRCUIT_OPEN)
+                and now >= server.next_retry_at
+            ):
+                tasks.append(self.restartServer(server))
+        await asyncio.gather(*tasks)
+
+    def isHealthCheckDue(self):
+        return time.monotonic() - self.last_check_at >= MCP_HEALTH_CHECK_INTERVAL
+
+    async def handleServerMessage(self, server, message):
+        if isinstance(message, Exception):
+            # the transport reports read errors here; bad messages are skipped
+            if not isinstance(message, ValidationError):
+                self.onConnectionLost(server, str(message) or type(message).__name__)
+            return
+        if not isinstance(message, types.ServerNotification):
+            return
+        notification = message.root
+        if isinstance(notification, types.ProgressNotification):
+            params = notification.params
+            self.reportProgress(
+                params.progressToken,
+                progress=params.progress,
+                total=params.total,
+            )
+        elif isinstance(notification, types.LoggingMessageNotification):
+            logger = notification.params.logger or ""
+            if logger.startswith(PARTIAL_LOGGER_PREFIX):
+                self.reportProgress(
+                    logger[len(PARTIAL_LOGGER_PREFIX) :],
+                    partial=str(notification.params.data),
+                )
+
+    def reportProgress(self, token, progress=None, total=None, partial=None):
+        tool_name = self.progress_calls.get(str(token))
+        if tool_name is None or self.on_tool_progress is None:
+            return
+        self.on_tool_progress(
+            {
+                "tool": tool_name,
+                "progress": progress,
+                "total": total,
+                "partial": partial,
+            }
+        )
+
+    async def callToolWithProgress(self, server, tool_name, arguments):
+        """
+        Same as ClientSession.call_tool, but the request carries a progress
+        token so the server can stream progress back while the tool runs.
+        """
+        session = server.client.sessions[server.name]
+        token = uuid.uuid4().hex
+        self.progress_calls[token] = tool_name
+        start = time.perf_counter()
+        result = None
+        error = None
+        try:
+            result = await session.send_request(
+                types.ClientRequest(
+                    types.CallToolRequest(
+                        method="tools/call",
+                        params=types.CallToolRequestParams(
+                            name=tool_name,
+                            arguments=arguments,
+                            _meta=types.RequestParams.Meta(progressToken=token),
+                        ),
+                    )
+                ),
+                types.CallToolResult,
+            )
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            del self.progress_calls[token]
+            if self.cassette:
+                self.cassette.recordToolCall(
+                    server.name,
+                    tool_name,
+                    arguments,
+                    result,
+                    time.perf_counter() - start,
+                    error or (None if result else "cancelled"),
+                )
+        return toolResult(result)
+
+    def setTools(self, server, specs):
+        server.tool_specs = specs
+        server.tools = [self.makeTool(server, spec) for spec in specs]
+
+    def makeTool(self, server, spec):
+        """
+        A LangChain tool for one of the server's tools that routes calls
+        through the supervisor: an idle server is started first, calls to an
+        unavailable server fail fast, and timeouts or transport errors mark
+        the server as failed.
+        """
+        tool_name = spec["name"]
+
+        async def supervised_call(**arguments):
+            if server.status == STATUS_IDLE:
+                await self.ensureStarted(server)
+            if not server.available or server.client is None:
+                TOOL_CALLS.inc(server=server.name, outcome="unavailable")
+                raise ToolException(
+                    f"MCP server '{server.name}' is unavailable ({server.status})."
+                )
+            server.active_calls += 1
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await asyncio.wait_for(
+                    self.callToolWithProgress(server, tool_name, arguments),
+                    MCP_TOOL_CALL_TIMEOUT,
+                )
+                outcome = "ok"
+            except ToolException:
+                raise
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                await self.markFailed(server, f"{tool_name} timed out")
+                raise ToolException(
+                    f"Tool '{tool_name}' timed out after {MCP_TOOL_CALL_TIMEOUT}s."
+                )
+            except Exception as e:
+                await self.markFailed(server, f"{tool_name} failed: {e}")
+                raise ToolException(f"Tool '{tool_name}' failed: {e}")
+            finally:
+                server.active_calls -= 1
+                server.last_used_at = time.monotonic()
+                elapsed = time.perf_counter() - start
+                TOOL_CALLS.inc(server=server.name, outcome=outcome)
+                TOOL_CALL_SECONDS.observe(elapsed, server=server.name)
+            server.recordLatency(server.call_latencies, elapsed)
+            return result
+
+        return StructuredTool(
+            name=tool_name,
+            description=spec["description"] or "",
+            args_schema=spec["schema"],
+            coroutine=supervised_call,
+            response_format="content_and_artifact",
+        )
+
+    def notifyToolsChanged(self):
+        if self.on_tools_changed:
+            self.on_tools_changed(self.getTools())
+
+    def getTools(self):
+        return [
+            tool
+            for server in self.servers.values()
+            if server.offered
+            for tool in server.tools
+        ]
+
+    def getStats(self):
+        return {name: server.getStats() for name, server in self.servers.items()}
+
+    def findServerProcess(self, server, children):
+        claimed = {s.pid for s in self.servers.values() if s.pid}
+        for pid, cmdline in children:
+            if pid not in claimed and matchesCommand(cmdline, server.config):
+                return pid
+        return None
+
+    def collectMetrics(self):
+        """Registry collector: server status and subprocess memory and CPU."""
+        children = None
+        for server in self.servers.values():
+            SERVER_UP.set(1 if server.available else 0, server=server.name)
+            stats = None
+            if server.available and not server.is_remote:
+                if server.pid is None:
+                    if children is None:
+                        children = childProcesses()
+                    server.pid = self.findServerProcess(server, children)
+                stats = processTreeStats(server.pid) if server.pid else None
+                if stats is None:
+                    server.pid = None
+            if stats:
+                SERVER_RSS.set(stats["rss_bytes"], server=server.name)
+                SERVER_CPU.set(stats["cpu_seconds"], server=server.name)
+            else:
+                SERVER_RSS.remove(server=server.name)
+                SERVER_CPU.remove(server=server.name)
+
+    async def stop(self):
+        for server in self.servers.values():
+            await self.stopServerTask(server)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+
+from langchain_core.tools import ToolException
+from mcp import types
+
+MCP_TOOL_CATALOG_PATH = "mcp_tool_catalog.json"
+# config keys that don't change which tools a server offers
+VOLATILE_CONFIG_KEYS = ("session_kwargs",)
+
+
+def configHash(config):
+    stable = {k: v for k, v in config.items() if k not in VOLATILE_CONFIG_KEYS}
+    text = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def toolSpec(tool):
+    """Name, description and JSON schema of a LangChain tool."""
+    return {
+        "name": tool.name,
+        "description": tool.description,
+        "schema": tool.args_schema
+        if isinstance(tool.args_schema, dict)
+        else tool.args_schema.model_json_schema(),
+    }
+
+
+def toolResult(result):
+    """
+    The (content, artifact) pair a content_and_artifact tool returns for an
+    MCP CallToolResult: the text parts as content (one string when there is
+    a single part) and any other parts as the artifact. A result flagged as
+    an error raises ToolException with its text.
+    """
+    texts, others = [], []
+    for part in result.content:
+        if isinstance(part, types.TextContent):
+            texts.append(part.text)
+        else:
+            others.append(part)
+    content = texts[0] if len(texts) == 1 else texts
+    if result.isError:
+        raise ToolException(content)
+    return content, others or None
+
+
+class ToolCatalog:
+    """
+    Tool lists of MCP servers saved in MCP_TOOL_CATALOG_PATH, keyed by a hash
+    of each server's config entry, so the agent can be built without
+    starting the servers. Editing a server's entry invalidates its tools.
+    """
+
+    def __init__(self, path=MCP_TOOL_CATALOG_PATH):
+        self.path = path
+        self.entries = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[MCP] Ignoring unreadable tool catalog: {e}")
+            return {}
+
+    def save(self):
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print(f"[MCP] Could not save tool catalog: {e}")
+
+    def get(self, name, config):
+        """The saved tool specs for this server entry, or None."""
+        entry = self.entries.get(configHash(config))
+        if entry is None or entry["server"] != name:
+            return None
+        return entry["tools"]
+
+    def put(self, name, config, specs):
+        key = configHash(config)
+        entry = self.entries.get(key)
+        if entry is not None and entry["server"] == name and entry["tools"] == specs:
+            return
+        # drop tools saved for an older version of this entry
+        self.entries = {
+            k: v for k, v in self.entries.items() if v["server"] != name or k == key
+        }
+        self.entries[key] = {"server": name, "tools": specs}
+        self.save()
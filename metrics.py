@@ -0,0 +1,445 @@
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+except ImportError:  # process stats fall back to /proc on Linux
+    psutil = None
+
+METRICS_HOST = "127.0.0.1"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_METRICS_FILE = "metrics.prom"
+DEFAULT_METRICS_DUMP_INTERVAL = 60
+# seconds; covers a fast tool call up to a long agent query
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PROC_DIR = "/proc"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def formatValue(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def escapeLabel(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatLabels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    pairs = ",".join(f'{name}="{escapeLabel(value)}"' for name, value in pairs)
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Values of one metric, keyed by the tuple of its label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} takes labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def remove(self, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(
+                f"{self.name}{formatLabels(self.label_names, key)} {formatValue(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        return HistogramTimer(self, labels)
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            items = sorted((key, (list(c), s)) for key, (c, s) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = ("le", formatValue(bound))
+                labels = formatLabels(self.label_names, key, le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = formatLabels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {formatValue(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class HistogramTimer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format.
+    Modules create their metrics at import time with counter()/gauge()/
+    histogram(), which return the existing metric for a known name.
+    Collectors are called just before rendering, to set gauges that are
+    cheaper to read on demand (queue depths, file sizes, process stats).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = {}
+
+    def register(self, metric_class, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, help_text, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already a {metric.kind}.")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter, name, help_text, labels=labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge, name, help_text, labels=labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(
+            Histogram, name, help_text, labels=labels, buckets=buckets
+        )
+
+    def setCollector(self, key, collector):
+        """Register collector() under key, replacing an earlier one; None removes it."""
+        with self.lock:
+            if collector is None:
+                self.collectors.pop(key, None)
+            else:
+                self.collectors[key] = collector
+
+    def collect(self):
+        with self.lock:
+            collectors = list(self.collectors.items())
+        for key, collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"[Metrics] Collector {key} failed: {str(e) or type(e).__name__}")
+
+    def render(self):
+        self.collect()
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def readProcStat(pid):
+    """(ppid, cpu seconds, rss bytes) of a process from /proc, or None."""
+    try:
+        with open(f"{PROC_DIR}/{pid}/stat", "r") as f:
+            text = f.read()
+    except OSError:
+        return None
+    # the command name is in parentheses and may itself contain spaces
+    fields = text[text.rfind(")") + 2 :].split()
+    ppid = int(fields[1])
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss_bytes = int(fields[21]) * PAGE_SIZE
+    return ppid, cpu_seconds, rss_bytes
+
+
+def readProcCmdline(pid):
+    try:
+        with open(f"{PROC_DIR}/{pid}/cmdline", "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    return [part.decode("utf-8", "replace") for part in data.split(b"\0") if part]
+
+
+def listProcParents():
+    parents = {}
+    for entry in os.listdir(PROC_DIR):
+        if entry.isdigit():
+            stat = readProcStat(entry)
+            if stat is not None:
+                parents[int(entry)] = stat[0]
+    return parents
+
+
+def childProcesses(pid=None):
+    """[(pid, cmdline)] of the direct children of pid (default: this process)."""
+    pid = pid or os.getpid()
+    if psutil is not None:
+        children = []
+        try:
+            for child in psutil.Process(pid).children():
+                try:
+                    children.append((child.pid, child.cmdline()))
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            pass
+        return children
+    if not os.path.isdir(PROC_DIR):
+        return []
+    return [
+        (child, readProcCmdline(child))
+        for child, parent in listProcParents().items()
+        if parent == pid
+    ]
+
+
+def processTreeStats(pid):
+    """
+    {"rss_bytes", "cpu_seconds"} summed over pid and its descendants, so a
+    server launched through a wrapper (uv, npx) is counted whole; None if
+    the process is gone or stats are unavailable on this platform.
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        rss_bytes, cpu_seconds = 0, 0.0
+        for process in processes:
+            try:
+                rss_bytes += process.memory_info().rss
+                times = process.cpu_times()
+                cpu_seconds += times.user + times.system
+            except psutil.Error:
+                continue
+        return {"rss_bytes": rss_bytes, "cpu_seconds": cpu_seconds}
+    if not os.path.isdir(PROC_DIR) or readProcStat(pid) is None:
+        return None
+    parents = listProcParents()
+    tree, frontier = [pid], [pid]
+    while frontier:
+        frontier = [child for child, parent in parents.items() if parent in frontier]
+        tree.extend(frontier)
+    rss_bytes, cpu_seconds = 0, 0.0
+    for member in tree:
+        stat = readProcStat(member)
+        if stat is not None:
+            cpu_seconds += stat[1]
+            rss_bytes += stat[2]
+    return {"rss_bytes": rss_bytes, "cpu_seconds": cpu_seconds}
+
+
+def processStats(pid=None):
+    """{"rss_bytes", "cpu_seconds"} of a single process (default: this one), or None."""
+    pid = pid or os.getpid()
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return {
+                "rss_bytes": process.memory_info().rss,
+                "cpu_seconds": times.user + times.system,
+            }
+        except psutil.Error:
+            return None
+    stat = readProcStat(pid) if os.path.isdir(PROC_DIR) else None
+    if stat is None:
+        return None
+    return {"rss_bytes": stat[2], "cpu_seconds": stat[1]}
+
+
+PROCESS_RSS = REGISTRY.gauge(
+    "process_resident_memory_bytes", "Resident memory of the agent process."
+)
+PROCESS_CPU = REGISTRY.gauge(
+    "process_cpu_seconds", "User and system CPU time used by the agent process."
+)
+
+
+def collectProcess():
+    stats = processStats()
+    if stats:
+        PROCESS_RSS.set(stats["rss_bytes"])
+        PROCESS_CPU.set(stats["cpu_seconds"])
+
+
+REGISTRY.setCollector("process", collectProcess)
+
+
+class MetricsExporter:
+    """
+    Serves the registry at http://127.0.0.1:<port>/metrics for a Prometheus
+    scraper (port 0 disables it) and rewrites dump_file with the same text
+    every dump_interval seconds (an empty name disables it).
+    """
+
+    def __init__(
+        self,
+        registry=REGISTRY,
+        port=0,
+        dump_file=DEFAULT_METRICS_FILE,
+        dump_interval=DEFAULT_METRICS_DUMP_INTERVAL,
+    ):
+        self.registry = registry
+        self.port = port
+        self.dump_file = dump_file
+        self.dump_interval = max(dump_interval, 1)
+        self.server = None
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def start(self):
+        if self.port:
+            try:
+                self.server = ThreadingHTTPServer(
+                    (METRICS_HOST, self.port), self.makeHandler()
+                )
+            except OSError as e:
+                print(f"[Metrics] Could not listen on port {self.port}: {e}")
+            else:
+                self.server.daemon_threads = True
+                self.startThread(self.server.serve_forever, "metrics_http")
+                print(f"[Metrics] Serving http://{METRICS_HOST}:{self.port}/metrics")
+        if self.dump_file:
+            self.startThread(self.dumpLoop, "metrics_dump")
+
+    def startThread(self, target, name):
+        thread = threading.Thread(target=target, daemon=True, name=name)
+        thread.start()
+        self.threads.append(thread)
+
+    def makeHandler(self):
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # a scrape every few seconds would flood the console
+
+        return MetricsHandler
+
+    def dumpLoop(self):
+        while not self.stopping.wait(self.dump_interval):
+            self.dump()
+
+    def dump(self):
+        temp_file = f"{self.dump_file}.tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                f.write(self.registry.render())
+            os.replace(temp_file, self.dump_file)
+        except OSError as e:
+            print(f"[Metrics] Could not write {self.dump_file}: {e}")
+
+    def stop(self):
+        self.stopping.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.dump_file:
+            self.dump()
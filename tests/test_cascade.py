@@ -0,0 +1,98 @@
+import queue
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agent.cascade import (
+    ALL_TRIGGERS,
+    TRIGGER_LOW_CONFIDENCE,
+    TRIGGER_STEP_BUDGET,
+    TRIGGER_TOOL_CALL_PARSE,
+    HeldBackQueue,
+    detectEscalation,
+)
+
+
+def token(text):
+    return {"type": "chat_token", "data": text}
+
+
+def drain(out_queue):
+    events = []
+    while not out_queue.empty():
+        events.append(out_queue.get())
+    return events
+
+
+def test_marker_reply_is_never_shown():
+    out_queue = queue.Queue()
+    held_back = HeldBackQueue(out_queue, "[ESCALATE]")
+    for text in ("\n", "[ESC", "ALATE", "]"):
+        held_back.put(token(text))
+    assert drain(out_queue) == []
+    held_back.finish(escalated=True)
+    assert drain(out_queue) == []
+
+
+def test_answer_streams_once_it_cannot_be_the_marker():
+    out_queue = queue.Queue()
+    held_back = HeldBackQueue(out_queue, "[ESCALATE]")
+    held_back.put(token("["))
+    assert drain(out_queue) == []
+    held_back.put(token("1] Paris"))
+    held_back.put(token(" is the capital."))
+    shown = [event["data"] for event in drain(out_queue)]
+    assert shown == ["[", "1] Paris", " is the capital."]
+    held_back.finish(escalated=False)
+    assert drain(out_queue) == []
+
+
+def test_short_answer_is_released_when_not_escalating():
+    out_queue = queue.Queue()
+    held_back = HeldBackQueue(out_queue, "[ESCALATE]")
+    held_back.put(token("["))
+    held_back.finish(escalated=False)
+    assert drain(out_queue) == [token("[")]
+
+
+def test_shown_answer_is_collapsed_on_escalation():
+    out_queue = queue.Queue()
+    held_back = HeldBackQueue(out_queue, "[ESCALATE]")
+    held_back.put(token("Not sure. "))
+    held_back.put(token("[ESCALATE]"))
+    drain(out_queue)
+    held_back.finish(escalated=True)
+    assert drain(out_queue) == [
+        {"type": "chat_step_text", "data": "Not sure. [ESCALATE]"}
+    ]
+
+
+def test_step_text_is_passed_through_and_not_collapsed_again():
+    out_queue = queue.Queue()
+    held_back = HeldBackQueue(out_queue, "[ESCALATE]")
+    held_back.put(token("["))
+    step = {"type": "chat_step_text", "data": "["}
+    held_back.put(step)
+    tool_result = {"type": "chat_message", "data": "[lookup] 42"}
+    held_back.put(tool_result)
+    held_back.finish(escalated=True)
+    assert drain(out_queue) == [token("["), step, tool_result]
+
+
+def test_detect_escalation_triggers():
+    assert (
+        detectEscalation({"error_type": TRIGGER_STEP_BUDGET}, [], ALL_TRIGGERS)
+        == TRIGGER_STEP_BUDGET
+    )
+    bad_call = ToolMessage(
+        content="Error: nope is not a valid tool", tool_call_id="1", status="error"
+    )
+    assert (
+        detectEscalation({"output": "x"}, [bad_call], ALL_TRIGGERS)
+        == TRIGGER_TOOL_CALL_PARSE
+    )
+    marker_reply = [AIMessage(content="[ESCALATE]")]
+    assert (
+        detectEscalation({"output": "[ESCALATE]"}, marker_reply, ALL_TRIGGERS)
+        == TRIGGER_LOW_CONFIDENCE
+    )
+    assert detectEscalation({"output": "[ESCALATE]"}, [], [TRIGGER_STEP_BUDGET]) is None
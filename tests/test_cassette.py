@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langchain_ollama import ChatOllama
+from mcp import types
+
+from agent.cassette import (
+    MODE_RECORD,
+    MODE_REPLAY,
+    Cassette,
+    CassetteChatOllama,
+    CassetteMissError,
+    withoutIds,
+)
+
+LIST_CALL = {"function": {"name": "list_dir", "arguments": {"path": "/data"}}}
+REPLIES = {
+    "What is in /data?": [
+        {"message": {"role": "assistant", "content": "", "tool_calls": [LIST_CALL]}},
+    ],
+    "Summarize: a.txt": [
+        {"message": {"role": "assistant", "content": "There is "}},
+        {"message": {"role": "assistant", "content": "one file."}},
+    ],
+}
+
+
+@tool
+def list_dir(path: str) -> str:
+    """List a directory."""
+    return "a.txt"
+
+
+def done(**fields):
+    return {
+        "message": {"role": "assistant", "content": ""},
+        "done": True,
+        "done_reason": "stop",
+        **fields,
+    }
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    """A fake Ollama that streams the canned reply for the last user message."""
+    requests = []
+
+    async def fake_stream(self, messages, stop=None, **kwargs):
+        requests.append(messages[-1].content)
+        for part in REPLIES[messages[-1].content]:
+            yield {**part, "done": False}
+        yield done(eval_count=3)
+
+    monkeypatch.setattr(ChatOllama, "_acreate_chat_stream", fake_stream)
+    return requests
+
+
+def askBoth(model):
+    async def ask():
+        first = await model.ainvoke([HumanMessage(content="What is in /data?")])
+        second = await model.ainvoke([HumanMessage(content="Summarize: a.txt")])
+        return first, second
+
+    return asyncio.run(ask())
+
+
+def record(path):
+    cassette = Cassette(path, MODE_RECORD)
+    cassette.recordTools("files", [list_dir])
+    answers = askBoth(CassetteChatOllama(model="m", cassette=cassette))
+    result = types.CallToolResult(
+        content=[types.TextContent(type="text", text="a.txt")]
+    )
+    cassette.recordToolCall("files", "list_dir", {"path": "/data"}, result, 0.01)
+    return answers
+
+
+def test_replay_gives_the_recorded_model_and_tool_output(tmp_path, ollama):
+    path = str(tmp_path / "session.jsonl")
+    recorded = record(path)
+    assert len(ollama) == 2
+
+    replay = Cassette(path, MODE_REPLAY)
+    replayed = askBoth(CassetteChatOllama(model="m", cassette=replay))
+    assert len(ollama) == 2  # Ollama was not asked again
+    for before, after in zip(recorded, replayed):
+        assert after.content == before.content
+        # tool call ids are generated by langchain-ollama on every parse
+        assert withoutIds(after.tool_calls) == withoutIds(before.tool_calls)
+    assert replayed[0].tool_calls[0]["args"] == {"path": "/data"}
+    assert replayed[1].content == "There is one file."
+
+    [replay_tool] = replay.makeReplayTools()
+    assert replay_tool.name == "list_dir"
+    assert asyncio.run(replay_tool.ainvoke({"path": "/data"})) == "a.txt"
+    assert replay.misses == 0
+
+
+def test_recording_starts_a_new_file(tmp_path, ollama):
+    path = str(tmp_path / "session.jsonl")
+    record(path)
+    record(path)
+    replay = Cassette(path, MODE_REPLAY)
+    assert len(replay.entries["ollama"]) == 2
+    assert len(replay.entries["mcp"]) == 1
+
+
+def test_running_out_of_recorded_entries_fails_clearly(tmp_path, ollama):
+    path = str(tmp_path / "session.jsonl")
+    record(path)
+    replay = Cassette(path, MODE_REPLAY)
+    model = CassetteChatOllama(model="m", cassette=replay)
+    askBoth(model)
+    with pytest.raises(CassetteMissError, match="no more ollama entries"):
+        asyncio.run(model.ainvoke([HumanMessage(content="Something new?")]))
+    [replay_tool] = replay.makeReplayTools()
+    asyncio.run(replay_tool.ainvoke({"path": "/data"}))
+    with pytest.raises(CassetteMissError, match="no more mcp entries"):
+        asyncio.run(replay.replayToolCall("files", "list_dir", {"path": "/data"}))
+
+
+def test_unmatched_request_falls_back_to_recorded_order(tmp_path, ollama):
+    path = str(tmp_path / "session.jsonl")
+    record(path)
+    replay = Cassette(path, MODE_REPLAY)
+    model = CassetteChatOllama(model="m", cassette=replay)
+    answer = asyncio.run(model.ainvoke([HumanMessage(content="Reworded question")]))
+    assert answer.tool_calls[0]["name"] == "list_dir"
+    assert replay.misses == 1
@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+from agent.chat_history import HISTORY_VERSION, ChatHistory
+from agent.chat_record import (
+    ROLE_ASSISTANT,
+    ROLE_ERROR,
+    ROLE_SETTINGS,
+    ROLE_TOOL,
+    ROLE_USER,
+    ZSTD_MIN_SIZE,
+    encodeRecord,
+    formatRecord,
+    getContent,
+    makeRecord,
+    recordFromText,
+)
+
+TOOL_TEXT = "Tool Used: list_dir\nResult: a.txt\nb.txt\n---------------------"
+V1_MESSAGES = [
+    "[Settings] Model: qwen3:8b, Temperature: 0.2",
+    "You: what is in /tmp?",
+    TOOL_TEXT,
+    "Two files: a.txt and b.txt.",
+    "Error: model not found",
+]
+
+
+def test_legacy_strings_become_typed_records():
+    records = [recordFromText(text, ts=0) for text in V1_MESSAGES]
+    assert [record["role"] for record in records] == [
+        ROLE_SETTINGS,
+        ROLE_USER,
+        ROLE_TOOL,
+        ROLE_ASSISTANT,
+        ROLE_ERROR,
+    ]
+    assert records[0]["model"] == "qwen3:8b"
+    assert records[1]["content"] == "what is in /tmp?"
+    assert records[2]["tool"] == "list_dir"
+    assert records[2]["content"] == "a.txt\nb.txt"
+    assert all(record["ts"] == 0 for record in records)
+
+
+def test_records_format_back_to_the_legacy_strings():
+    for text in V1_MESSAGES:
+        assert formatRecord(recordFromText(text)) == text
+
+
+def test_empty_optional_fields_are_omitted():
+    record = makeRecord(ROLE_ASSISTANT, "hi", tokens={}, duration=1.23456)
+    assert set(record) == {"role", "ts", "content", "duration"}
+    assert record["duration"] == 1.235
+
+
+def test_large_content_is_compressed():
+    pytest.importorskip("zstandard")
+    content = "the same line again\n" * (ZSTD_MIN_SIZE // 10)
+    record = encodeRecord(makeRecord(ROLE_TOOL, content, tool="read_file"))
+    assert "content" not in record
+    assert getContent(record) == content
+    small = makeRecord(ROLE_USER, "short")
+    assert encodeRecord(small) is small
+
+
+@pytest.fixture
+def v1_history(tmp_path):
+    history_file = tmp_path / "chat_history.json"
+    history_file.write_text(
+        json.dumps(
+            {"chat_list": [{"title": "Files", "messages": V1_MESSAGES}]},
+            indent=4,
+        ),
+        encoding="utf-8",
+    )
+    return str(history_file)
+
+
+def test_v1_history_is_migrated_once_with_a_backup(v1_history):
+    original = open(v1_history, encoding="utf-8").read()
+    history = ChatHistory(v1_history)
+
+    with open(f"{v1_history}.v1.bak", encoding="utf-8") as f:
+        assert f.read() == original
+    with open(v1_history, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["version"] == HISTORY_VERSION
+    messages = data["chat_list"][0]["messages"]
+    assert all(isinstance(message, dict) for message in messages)
+    # the model named in the settings line carries over to the messages after it
+    assert messages[3]["model"] == "qwen3:8b"
+    assert history.getDisplayMessages(0) == V1_MESSAGES
+
+    os.remove(f"{v1_history}.v1.bak")
+    ChatHistory(v1_history)
+    assert not os.path.exists(f"{v1_history}.v1.bak")
+
+
+def test_migrated_history_accepts_new_messages(v1_history):
+    history = ChatHistory(v1_history)
+    history.addMessage(0, makeRecord(ROLE_USER, "and /srv?"))
+    history.addMessage(0, "Nothing there.")
+    assert ChatHistory(v1_history).getDisplayMessages(0)[-2:] == [
+        "You: and /srv?",
+        "Nothing there.",
+    ]
@@ -0,0 +1,133 @@
+import sqlite3
+
+import pytest
+
+from agent.chat_search import SNIPPET_CLOSE, SNIPPET_OPEN, ChatSearchIndex
+
+CHATS = [
+    {"title": "Running", "messages": ["You: my 10k pace?", "About 5:10 per km."]},
+    {"title": "Sleep", "messages": ["You: how did I sleep?", "7 hours on average."]},
+]
+
+ODD_CHATS = [
+    {
+        "title": "Odd",
+        "messages": [
+            'They say "hi" a lot.',
+            "The x-ray was clear.",
+            "Compute a*b first.",
+            "Somewhere near the lake.",
+        ],
+    }
+]
+
+
+class NoFts5Connection:
+    """A connection that fails to create FTS5 tables, like an SQLite without it."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if "USING fts5" in sql:
+            raise sqlite3.OperationalError("no such module: fts5")
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+@pytest.fixture(params=["fts5", "like"])
+def index(request, tmp_path, monkeypatch):
+    if request.param == "like":
+        connect = sqlite3.connect
+        monkeypatch.setattr(
+            "agent.chat_search.sqlite3.connect",
+            lambda *args: NoFts5Connection(connect(*args)),
+        )
+    index = ChatSearchIndex(str(tmp_path / "search.db"))
+    assert index.use_fts == (request.param == "fts5")
+    yield index
+    index.close()
+
+
+def hits(index, query):
+    return [(r["chat_index"], r["message_index"]) for r in index.search(query)]
+
+
+def rowCount(index):
+    return index.conn.execute(f"SELECT COUNT(*) FROM {index.table}").fetchone()[0]
+
+
+def test_search_finds_messages_with_their_titles(index):
+    index.sync(CHATS)
+    assert hits(index, "pace") == [(0, 0)]
+    [result] = index.search("hours")
+    assert result["title"] == "Sleep"
+    assert SNIPPET_OPEN + "hours" + SNIPPET_CLOSE in result["snippet"]
+    assert index.search("   ") == []
+
+
+def test_sync_only_adds_new_messages(index):
+    index.sync(CHATS)
+    assert rowCount(index) == 4
+    index.sync(CHATS)
+    assert rowCount(index) == 4
+    chats = [dict(chat, messages=list(chat["messages"])) for chat in CHATS]
+    chats[1]["messages"].append("You: and last week?")
+    chats.append({"title": "Weather", "messages": ["You: rain tomorrow?"]})
+    index.sync(chats)
+    assert rowCount(index) == 6
+    assert hits(index, "week") == [(1, 2)]
+    assert hits(index, "rain") == [(2, 0)]
+
+
+def test_sync_rebuilds_truncated_and_drops_removed_chats(index):
+    index.sync(CHATS)
+    replaced = [{"title": "Running", "messages": ["You: marathon plan?"]}]
+    index.sync(replaced)
+    assert rowCount(index) == 1
+    assert hits(index, "pace") == []
+    assert hits(index, "hours") == []
+    assert hits(index, "marathon") == [(0, 0)]
+
+
+def test_added_message_and_new_title_are_searchable(index):
+    index.sync(CHATS)
+    index.addMessage(0, "Running", "Try intervals on Tuesday.")
+    index.updateTitle(0, "Training")
+    [result] = index.search("intervals")
+    assert (result["message_index"], result["title"]) == (2, "Training")
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ('say "hi"', [(0, 0)]),
+        ("x-ray", [(0, 1)]),
+        ("a*b", [(0, 2)]),
+        ("NEAR", [(0, 3)]),
+    ],
+)
+def test_query_syntax_is_searched_as_text(index, query, expected):
+    index.sync(ODD_CHATS)
+    assert hits(index, query) == expected
+
+
+@pytest.mark.parametrize("query", ["-", '"', "*", "NEAR(", "AND OR NOT", "(lake"])
+def test_stray_query_syntax_does_not_fail(index, query):
+    index.sync(ODD_CHATS)
+    assert isinstance(index.search(query), list)
+
+
+def test_match_query_quotes_every_term():
+    assert ChatSearchIndex.buildMatchQuery('say "hi" NEAR -') == (
+        '"say"* """hi"""* "NEAR"* "-"*'
+    )
+
+
+def test_snippet_html_is_escaped():
+    snippet = f"<b>x</b> {SNIPPET_OPEN}pace{SNIPPET_CLOSE} & more"
+    assert ChatSearchIndex.snippetToHtml(snippet) == (
+        "&lt;b&gt;x&lt;/b&gt; <b>pace</b> &amp; more"
+    )
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_ollama import ChatOllama
+from ollama import Options
+
+from agent.context_sizer import (
+    CHARS_PER_TOKEN,
+    STEP_ANSWER,
+    STEP_TOOL,
+    ContextSizer,
+    SizedChatOllama,
+)
+
+TOOL_SCHEMA = {
+    "type": "function",
+    "function": {"name": "lookup", "description": "Look up", "parameters": {}},
+}
+
+
+@pytest.fixture
+def sizer(tmp_path):
+    return ContextSizer(
+        buckets=(2048, 4096, 8192),
+        max_ctx=8192,
+        predict_caps={STEP_TOOL: 4, STEP_ANSWER: 1024},
+        log_file=str(tmp_path / "sizing.jsonl"),
+    )
+
+
+def request(prompt_tokens, tools=True, last_role="user", **options):
+    messages = [{"role": "user", "content": "x" * prompt_tokens * CHARS_PER_TOKEN}]
+    if last_role == "tool":
+        messages += [
+            {"role": "assistant", "content": "", "tool_calls": TOOL_CALL},
+            {"role": "tool", "content": "42"},
+        ]
+    params = {"model": "m", "messages": messages, "options": Options(**options)}
+    if tools:
+        params["tools"] = [TOOL_SCHEMA]
+    return params
+
+
+def part(content="", tool_calls=None, done=False, **fields):
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {"message": message, "done": done, **fields}
+
+
+def answer(prompt_tokens):
+    return request(prompt_tokens, last_role="tool")
+
+
+TOOL_CALL = [{"function": {"name": "lookup", "arguments": {}}}]
+
+
+def test_user_turn_with_tools_is_sized_as_a_tool_step(sizer):
+    decision = sizer.choose("url", request(100))
+    assert decision["step"] == STEP_TOOL
+    assert decision["num_predict"] == 4
+
+
+def test_reply_to_a_tool_result_is_sized_as_an_answer(sizer):
+    decision = sizer.choose("url", answer(100))
+    assert decision["step"] == STEP_ANSWER
+    assert decision["num_predict"] == 1024
+
+
+def test_request_without_tools_is_an_answer(sizer):
+    assert sizer.choose("url", request(100, tools=False))["step"] == STEP_ANSWER
+
+
+def test_appended_system_instruction_does_not_change_the_step(sizer):
+    params = request(100)
+    params["messages"].append({"role": "system", "content": "Be brief."})
+    assert sizer.choose("url", params)["step"] == STEP_TOOL
+
+
+def test_uncapped_step_reserves_output_room(tmp_path):
+    sizer = ContextSizer(
+        buckets=(2048, 4096, 8192),
+        max_ctx=8192,
+        predict_caps={STEP_TOOL: 4, STEP_ANSWER: 0},
+        log_file=str(tmp_path / "sizing.jsonl"),
+    )
+    decision = sizer.choose("url", answer(100))
+    assert decision["num_predict"] == -1
+    assert decision["num_ctx"] == 4096
+
+
+def test_smallest_bucket_that_holds_prompt_and_answer(sizer):
+    assert sizer.choose("a", answer(500))["num_ctx"] == 2048
+    assert sizer.choose("b", answer(1500))["num_ctx"] == 4096
+    assert sizer.choose("c", answer(20000))["num_ctx"] == 8192
+
+
+def test_model_stays_on_a_bucket_one_size_too_large(sizer):
+    assert sizer.choose("url", answer(1500))["num_ctx"] == 4096
+    decision = sizer.choose("url", answer(100))
+    assert decision["num_ctx"] == 4096
+    assert not decision["reload"]
+
+
+def test_explicit_options_win(sizer):
+    decision = sizer.choose("url", request(100, num_ctx=16384, num_predict=50))
+    assert decision["num_ctx"] == 16384
+    assert decision["num_predict"] == 50
+
+
+def test_observe_logs_the_step_and_calibrates(sizer):
+    decision = sizer.choose("url", request(1000))
+    sizer.track(decision, part("<think>"))
+    assert not decision["made_tool_calls"]
+    sizer.track(decision, part(tool_calls=TOOL_CALL))
+    prompt_eval_count = decision["estimated_tokens"] * 2
+    sizer.observe(
+        decision,
+        part(done=True, done_reason="stop", prompt_eval_count=prompt_eval_count),
+    )
+    with open(sizer.log_file, encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert entry["step"] == STEP_TOOL
+    assert entry["made_tool_calls"]
+    assert entry["prompt_eval_count"] == prompt_eval_count
+    assert sizer.calibration("m") == 2.0
+
+
+def test_sized_model_sends_the_cap_and_reads_the_whole_stream(sizer, monkeypatch):
+    sent_options = []
+
+    async def fake_stream(self, messages, stop=None, **kwargs):
+        sent_options.append(kwargs["options"])
+        # Ollama streams the thinking first and the tool calls at the end
+        for _ in range(10):
+            yield part("thinking ")
+        yield part(tool_calls=TOOL_CALL)
+        yield part(done=True, done_reason="stop", eval_count=12)
+
+    monkeypatch.setattr(ChatOllama, "_acreate_chat_stream", fake_stream)
+    chat_model = SizedChatOllama(model="m", context_sizer=sizer)
+
+    async def read():
+        return [
+            p
+            async for p in chat_model._acreate_chat_stream(
+                [HumanMessage(content="hi")], tools=[TOOL_SCHEMA]
+            )
+        ]
+
+    parts = asyncio.run(read())
+    assert len(parts) == 12
+    assert sent_options[0]["num_predict"] == 4
+    assert sent_options[0]["num_ctx"] == 2048
+    with open(sizer.log_file, encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert entry["step"] == STEP_TOOL
+    assert entry["made_tool_calls"]
+    assert entry["eval_count"] == 12
+    assert entry["done_reason"] == "stop"
@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.fan_out import PLANNER_PROMPT, FanOutPlanner, parsePlan
+
+QUERY = "Compare the runs in each file"
+
+
+@pytest.mark.parametrize(
+    "reply, expected",
+    [
+        ('{"subtasks": ["a", "b"]}', ["a", "b"]),
+        ('<think>{"subtasks": ["x"]} maybe</think>\n{"subtasks": ["a"]}', ["a"]),
+        ('Here is the plan:\n```json\n{"subtasks": ["a", "b"]}\n```', ["a", "b"]),
+        ('{"subtasks": ["a", " a ", "b", "", 3]}', ["a", "b"]),
+        ('{"subtasks": "a, b"}', []),
+        ('["a", "b"]', []),
+        ('{"subtasks": [}', []),
+        ("I will answer this directly.", []),
+    ],
+)
+def test_parse_plan(reply, expected):
+    assert parsePlan(reply) == expected
+
+
+class StubChatModel:
+    """Replies to the planner with a fixed plan and to sub-tasks after a delay."""
+
+    def __init__(self, plan, delay=0.0):
+        self.plan = plan
+        self.delay = delay
+        self.subtasks = []
+
+    async def ainvoke(self, messages):
+        if messages[0].content == PLANNER_PROMPT:
+            return AIMessage(content=self.plan)
+        task = messages[-1].content.split("Your part: ")[-1]
+        self.subtasks.append(task)
+        await asyncio.sleep(self.delay)
+        return AIMessage(
+            content=f"<think>hm</think>{task} done",
+            usage_metadata={"input_tokens": 10, "output_tokens": 2, "total_tokens": 12},
+        )
+
+
+def makeManager(plan, delay=0.0):
+    reduce_calls = []
+
+    async def processQuery(agent, system_prompt, prompt, timeout=None):
+        reduce_calls.append((prompt, timeout))
+        return {"output": "merged", "usage": {"total_tokens": 5}}
+
+    return SimpleNamespace(
+        chat_model=StubChatModel(plan, delay),
+        read_only_tools={"list_dir"},
+        tool_router=None,
+        out_queue=None,
+        processQuery=processQuery,
+        reduce_calls=reduce_calls,
+    )
+
+
+def runFanOut(manager, timeout=30, tools=(), max_subtasks=8, query=QUERY):
+    planner = FanOutPlanner(manager, max_parallel=2, max_subtasks=max_subtasks)
+    return asyncio.run(
+        planner.run(None, "system", query, query, list(tools), timeout=timeout)
+    )
+
+
+def test_fanned_out_query_merges_the_parts():
+    manager = makeManager('{"subtasks": ["file a", "file b", "file c"]}')
+    result = runFanOut(manager)
+    assert sorted(manager.chat_model.subtasks) == ["file a", "file b", "file c"]
+    assert result["output"] == "merged"
+    assert result["usage"] == {
+        "total_tokens": 5 + 3 * 12,
+        "input_tokens": 30,
+        "output_tokens": 6,
+    }
+    assert result["fan_out"]["subtasks"] == 3
+    assert result["fan_out"]["failed"] == 0
+    [(reduce_prompt, _timeout)] = manager.reduce_calls
+    assert "### Part 2: file b\nfile b done" in reduce_prompt
+    assert "<think>" not in reduce_prompt
+
+
+@pytest.mark.parametrize(
+    "plan", ['{"subtasks": []}', '{"subtasks": ["only one"]}', "not a plan"]
+)
+def test_plans_with_fewer_than_two_parts_are_answered_normally(plan):
+    manager = makeManager(plan)
+    assert runFanOut(manager) is None
+    assert manager.chat_model.subtasks == []
+    assert manager.reduce_calls == []
+
+
+def test_plans_with_too_many_parts_are_answered_normally():
+    manager = makeManager('{"subtasks": ["a", "b", "c"]}')
+    assert runFanOut(manager, max_subtasks=2) is None
+    assert manager.reduce_calls == []
+
+
+def test_questions_without_a_hint_are_not_planned():
+    manager = makeManager('{"subtasks": ["a", "b"]}')
+    manager.chat_model.ainvoke = None  # any model call would fail
+    assert runFanOut(manager, query="What is in notes.txt?") is None
+
+
+def test_planner_gets_only_read_only_tools(monkeypatch):
+    planner_tools = []
+
+    def fakeCreateReactAgent(model, tools):
+        planner_tools.append([tool.name for tool in tools])
+
+        async def ainvoke(state, config=None):
+            return {"messages": [AIMessage(content='{"subtasks": []}')]}
+
+        return SimpleNamespace(ainvoke=ainvoke)
+
+    monkeypatch.setattr("agent.fan_out.create_react_agent", fakeCreateReactAgent)
+    tools = [SimpleNamespace(name=name) for name in ("list_dir", "write_file")]
+    assert runFanOut(makeManager(""), tools=tools) is None
+    assert planner_tools == [["list_dir"]]
+
+
+def test_parts_and_reduce_share_the_query_deadline():
+    manager = makeManager('{"subtasks": ["a", "b"]}', delay=1.0)
+    result = runFanOut(manager, timeout=0.2)
+    assert result["error"].startswith("⏱️ Request exceeded timeout")
+    assert manager.reduce_calls == []
+    assert result["fan_out"]["failed"] == 2
+    assert {part["error"] for part in result["fan_out"]["parts"]} == {
+        "ran out of time"
+    }
+
+
+def test_reduce_gets_the_time_that_is_left():
+    manager = makeManager('{"subtasks": ["a", "b"]}', delay=0.1)
+    runFanOut(manager, timeout=5)
+    [(_prompt, timeout)] = manager.reduce_calls
+    assert 4 < timeout < 4.95
@@ -0,0 +1,116 @@
+import asyncio
+import math
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from mcp_server.mcp_server_fitness import (
+    CHRONIC_DAYS,
+    FitnessTable,
+    fatigue_label,
+    fitness_compare_users,
+    fitness_daily_summary,
+    fitness_load_and_fatigue,
+    fitness_rolling_heart_rate,
+    list_fitness_users,
+    load_indicators,
+    rolling_sum,
+)
+
+
+def trimp(minutes, heart_rate, rest_hr=60, max_hr=190):
+    reserve = (heart_rate - rest_hr) / (max_hr - rest_hr)
+    return minutes * reserve * 0.64 * math.exp(1.92 * reserve)
+
+
+def sessions(days, minutes=30, heart_rate=150, start=date(2025, 1, 1)):
+    """One session on each of the given day offsets."""
+    return [
+        {
+            "date": (start + timedelta(days=day)).isoformat(),
+            "exercise": "run",
+            "duration_min": minutes,
+            "heart_rate": heart_rate,
+        }
+        for day in days
+    ]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_rolling_sum():
+    assert rolling_sum(np.array([1.0, 2, 3, 4]), 2).tolist() == [1, 3, 5, 7]
+    assert rolling_sum(np.array([1.0, 2, 3]), 10).tolist() == [1, 3, 6]
+
+
+def test_daily_series_fills_rest_days_and_sums_sessions():
+    entries = sessions([0, 0, 3], heart_rate=140)
+    entries[1]["heart_rate"] = "n/a"
+    table = FitnessTable("u", entries)
+    days, sums, counts = table.dailySeries(table.duration)
+    assert [str(day) for day in days] == [
+        "2025-01-01",
+        "2025-01-02",
+        "2025-01-03",
+        "2025-01-04",
+    ]
+    assert sums.tolist() == [60, 0, 0, 30]
+    assert counts.tolist() == [2, 0, 0, 1]
+    # a session without a heart rate is not counted for it
+    _days, sums, counts = table.dailySeries(table.heart_rate)
+    assert sums.tolist() == [140, 0, 0, 140]
+    assert counts.tolist() == [1, 0, 0, 1]
+
+
+def test_trimp_matches_the_banister_formula():
+    table = FitnessTable("u", sessions([0], minutes=45, heart_rate=165))
+    assert table.trimp(60, 190)[0] == pytest.approx(trimp(45, 165))
+
+
+def test_steady_training_is_balanced():
+    table = FitnessTable("u", sessions(range(40)))
+    _days, loads, acute, chronic, ratio = load_indicators(table, 60, 190)
+    assert np.isnan(ratio[: CHRONIC_DAYS - 1]).all()
+    assert ratio[-1] == pytest.approx(1.0)
+    assert acute[-1] == pytest.approx(loads[0])
+    assert fatigue_label(ratio[-1]) == "balanced"
+
+
+def test_load_spike_is_a_fatigue_risk():
+    entries = sessions(range(0, 35, 2)) + sessions(range(35, 42), minutes=90)
+    table = FitnessTable("u", entries)
+    ratio = load_indicators(table, 60, 190)[-1]
+    assert ratio[-1] > 1.5
+    assert fatigue_label(ratio[-1]) == "high fatigue risk"
+    assert fatigue_label(0.5) == "detraining / recovered"
+    assert fatigue_label(np.nan) == f"needs {CHRONIC_DAYS} days of history"
+
+
+def test_tools_on_the_bundled_user():
+    assert run(list_fitness_users()).splitlines()[0] == (
+        "user_01: 2 entries, 2025-05-13 ~ 2025-05-14"
+    )
+    summary = run(fitness_daily_summary("user_01", start_date="2025-05-14"))
+    assert summary.splitlines()[1:] == [
+        "2025-05-14: 1 session(s), 20 min, HR avg 168.0 max 168, 계단 오르기"
+    ]
+    rolling = run(fitness_rolling_heart_rate("user_01", window_days=7))
+    assert rolling.splitlines()[-1] == "2025-05-14: 171.0"
+    load = run(fitness_load_and_fatigue("user_01")).splitlines()
+    assert load[0].endswith(f"(needs {CHRONIC_DAYS} days of history)")
+    assert load[2].startswith(f"2025-05-13: {trimp(30, 174):.0f} / ")
+    compare = run(fitness_compare_users(["user_01"])).splitlines()
+    assert compare[1].startswith("user_01: 2 / 50 / 171.0 / ")
+
+
+def test_tools_report_errors_as_text():
+    assert run(fitness_daily_summary("nobody")) == "Error: Unknown user 'nobody'"
+    assert run(fitness_compare_users(["nobody"])).splitlines()[1] == (
+        "nobody: Error: Unknown user 'nobody'"
+    )
+    assert run(fitness_daily_summary("user_01", start_date="2030-01-01")) == (
+        "No entries for user_01 in that range."
+    )
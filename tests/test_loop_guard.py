@@ -0,0 +1,123 @@
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import (
+    FakeMessagesListChatModel,
+)
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from agent.loop_guard import (
+    ABORT_OSCILLATION,
+    ABORT_REPEATED_CALL,
+    ABORT_STEP_BUDGET,
+    ABORT_TIME_BUDGET,
+    LoopGuard,
+    nodeUpdatesFromLog,
+)
+
+
+@tool
+def lookup(query: str) -> str:
+    """Look something up."""
+    return f"nothing about {query}"
+
+
+class ToolCallingFake(FakeMessagesListChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def toolCall(query, call_id):
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": "lookup", "args": {"query": query}, "id": call_id}],
+    )
+
+
+def agentUpdate(*queries):
+    calls = [toolCall(query, f"call-{i}") for i, query in enumerate(queries)]
+    return {"agent": {"messages": calls}}
+
+
+def toolsUpdate():
+    return {"tools": {"messages": [ToolMessage(content="ok", tool_call_id="1")]}}
+
+
+def test_each_node_update_is_a_step():
+    guard = LoopGuard(max_steps=3, max_seconds=0, repeat_limit=0)
+    guard.observeUpdate(agentUpdate("a"))
+    guard.observeUpdate(toolsUpdate())
+    assert guard.check() is None
+    guard.observeUpdate(agentUpdate("b"))
+    assert guard.check() == ABORT_STEP_BUDGET
+
+
+def test_non_update_values_are_ignored():
+    guard = LoopGuard(max_steps=1, max_seconds=0, repeat_limit=0)
+    guard.observeUpdate({"id": "run", "logs": {}, "streamed_output": []})
+    guard.observeUpdate("text")
+    assert guard.check() is None
+
+
+def test_repeated_call():
+    guard = LoopGuard(max_steps=0, max_seconds=0, repeat_limit=3)
+    for _ in range(2):
+        guard.observeUpdate(agentUpdate("same"))
+    assert guard.check() is None
+    guard.observeUpdate(agentUpdate("same"))
+    assert guard.check() == ABORT_REPEATED_CALL
+    assert guard.getReport()["last_calls"] == ["lookup"] * 3
+
+
+def test_oscillation():
+    guard = LoopGuard(max_steps=0, max_seconds=0, repeat_limit=0)
+    for query in ("a", "b", "a"):
+        guard.observeUpdate(agentUpdate(query))
+    assert guard.check() is None
+    guard.observeUpdate(agentUpdate("b"))
+    assert guard.check() == ABORT_OSCILLATION
+
+
+def test_time_budget(monkeypatch):
+    guard = LoopGuard(max_steps=0, max_seconds=5, repeat_limit=0)
+    monkeypatch.setattr(
+        "agent.loop_guard.time.perf_counter", lambda: guard.start_time + 5
+    )
+    assert guard.check() == ABORT_TIME_BUDGET
+
+
+def test_reason_is_kept_once_set():
+    guard = LoopGuard(max_steps=1, max_seconds=0, repeat_limit=0)
+    guard.observeUpdate(agentUpdate("a"))
+    assert guard.check() == ABORT_STEP_BUDGET
+    guard.max_steps = 0
+    assert guard.check() == ABORT_STEP_BUDGET
+
+
+def test_guard_sees_node_updates_in_astream_log():
+    model = ToolCallingFake(
+        responses=[toolCall("same", f"call-{i}") for i in range(10)]
+    )
+    agent = create_react_agent(model=model, tools=[lookup])
+    guard = LoopGuard(max_steps=0, max_seconds=0, repeat_limit=3)
+
+    async def run():
+        updates = []
+        async for chunk in agent.astream_log(
+            {"messages": [HumanMessage(content="hi")]},
+            include_types=["llm", "tool"],
+        ):
+            for update in nodeUpdatesFromLog(chunk.ops):
+                updates.append(update)
+                guard.observeUpdate(update)
+            if guard.check():
+                return updates
+        return updates
+
+    updates = asyncio.run(run())
+    assert guard.reason == ABORT_REPEATED_CALL
+    assert [next(iter(update)) for update in updates] == ["agent", "tools"] * 2 + [
+        "agent"
+    ]
+    assert guard.steps == 5
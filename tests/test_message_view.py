@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from ui.widgets.message_view import LAYOUT_BATCH_SIZE, MessageView  # noqa: E402
+
+MESSAGES = [f"message {i}\nsecond line\nthird line" for i in range(500)]
+
+
+@pytest.fixture
+def view():
+    app = QApplication.instance() or QApplication([])
+    view = MessageView()
+    view.resize(400, 300)
+    view.show()
+    yield view
+    view.close()
+    view.deleteLater()
+    app.processEvents()
+
+
+def waitUntil(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        QApplication.processEvents()
+        time.sleep(0.005)
+
+
+def rowTop(view, row):
+    return view.visualRect(view.message_model.index(row)).top()
+
+
+def test_opening_a_chat_scrolls_to_the_bottom(view):
+    view.setMessages(MESSAGES)
+    waitUntil(lambda: not view.scroll_to_bottom_pending)
+    scroll_bar = view.verticalScrollBar()
+    assert scroll_bar.maximum() > 0
+    assert scroll_bar.value() == scroll_bar.maximum()
+
+
+def test_jump_to_a_row_past_the_first_layout_batch(view):
+    row = 8 * LAYOUT_BATCH_SIZE
+    view.setMessages(MESSAGES)
+    view.scrollToMessage(row)
+    assert view.scroll_to_row_pending == row
+    waitUntil(lambda: view.scroll_to_row_pending is None)
+    assert view.verticalScrollBar().value() > 0
+    assert rowTop(view, row) == 0
+    assert view.currentIndex().row() == row
+    # the jump wins over the scroll to the bottom of the newly opened chat
+    waitUntil(lambda: view.isLaidOut(len(MESSAGES) - 1))
+    QApplication.processEvents()
+    assert rowTop(view, row) == 0
+
+
+def test_jump_to_a_laid_out_row_is_immediate(view):
+    view.setMessages(MESSAGES)
+    waitUntil(lambda: not view.scroll_to_bottom_pending)
+    view.scrollToMessage(10)
+    assert view.scroll_to_row_pending is None
+    assert rowTop(view, 10) == 0
+
+
+def test_user_scroll_cancels_a_pending_jump(view):
+    view.setMessages(MESSAGES)
+    view.scrollToMessage(400)
+    view.verticalScrollBar().triggerAction(
+        view.verticalScrollBar().SliderAction.SliderSingleStepAdd
+    )
+    assert view.scroll_to_row_pending is None
+    assert not view.scroll_to_bottom_pending
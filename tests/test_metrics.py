@@ -0,0 +1,102 @@
+import pytest
+
+from metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsExporter,
+    MetricsRegistry,
+    escapeLabel,
+    formatValue,
+)
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_histogram_render_is_cumulative():
+    histogram = Histogram(
+        "query_seconds", "Query time.", labels=("model",), buckets=(1, 0.1)
+    )
+    for value in (0.05, 0.5, 0.7, 30):
+        histogram.observe(value, model="qwen3")
+    assert histogram.render() == [
+        "# HELP query_seconds Query time.",
+        "# TYPE query_seconds histogram",
+        'query_seconds_bucket{model="qwen3",le="0.1"} 1',
+        'query_seconds_bucket{model="qwen3",le="1"} 3',
+        'query_seconds_bucket{model="qwen3",le="+Inf"} 4',
+        'query_seconds_sum{model="qwen3"} 31.25',
+        'query_seconds_count{model="qwen3"} 4',
+    ]
+
+
+def test_histogram_timer_observes_once():
+    histogram = Histogram("step_seconds", "Step time.")
+    with histogram.time():
+        pass
+    assert histogram.render()[-1] == "step_seconds_count 1"
+
+
+def test_format_value():
+    assert formatValue(3.0) == "3"
+    assert formatValue(0.25) == "0.25"
+    assert formatValue(float("inf")) == "+Inf"
+
+
+def test_escape_label():
+    assert escapeLabel('C:\\tmp "x"\nnext') == 'C:\\\\tmp \\"x\\"\\nnext'
+    counter = Counter("calls_total", "Calls.", labels=("tool",))
+    counter.inc(tool='say "hi"')
+    assert counter.render()[-1] == 'calls_total{tool="say \\"hi\\""} 1'
+
+
+def test_labels_must_match_the_declared_names():
+    counter = Counter("calls_total", "Calls.", labels=("tool", "status"))
+    counter.inc(tool="read_file", status="ok")
+    for labels in ({"tool": "read_file"}, {"tool": "x", "status": "ok", "extra": 1}):
+        with pytest.raises(ValueError, match="takes labels"):
+            counter.inc(**labels)
+    with pytest.raises(ValueError):
+        Gauge("depth", "Queue depth.").set(1, queue="in")
+
+
+def test_gauge_set_inc_dec():
+    gauge = Gauge("in_flight", "Requests in flight.")
+    gauge.set(5)
+    gauge.inc(2)
+    gauge.dec()
+    assert gauge.render()[-1] == "in_flight 6"
+
+
+def test_register_returns_the_existing_metric(registry):
+    first = registry.counter("calls_total", "Calls.")
+    assert registry.counter("calls_total", "Calls again.") is first
+
+
+def test_register_rejects_a_name_of_another_type(registry):
+    registry.counter("calls_total", "Calls.")
+    with pytest.raises(ValueError, match="already a counter"):
+        registry.gauge("calls_total", "Calls.")
+    with pytest.raises(ValueError):
+        registry.histogram("calls_total", "Calls.")
+
+
+def test_render_runs_collectors_and_survives_failures(registry, capsys):
+    gauge = registry.gauge("queue_depth", "Queue depth.")
+    registry.setCollector("queue", lambda: gauge.set(7))
+    registry.setCollector("broken", lambda: 1 / 0)
+    text = registry.render()
+    assert "queue_depth 7\n" in text
+    assert "Collector broken failed" in capsys.readouterr().out
+    registry.setCollector("broken", None)
+    assert list(registry.collectors) == ["queue"]
+
+
+def test_exporter_dump_writes_the_registry(registry, tmp_path):
+    registry.counter("calls_total", "Calls.").inc(3)
+    dump_file = tmp_path / "metrics.prom"
+    MetricsExporter(registry, dump_file=str(dump_file)).dump()
+    assert "calls_total 3\n" in dump_file.read_text(encoding="utf-8")
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import queue
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from agent.model_compare import ModelComparison, ModelRun
+
+
+class FakeChatModel:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def astream(self, messages):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+
+class FakeManager:
+    system_prompt = "Be brief."
+    temperature = 0.2
+
+    def __init__(self, models):
+        self.models = models
+
+    def routeTools(self, query):
+        return None, [], None
+
+    def createOllamaModel(self, temperature, model):
+        return self.models[model]
+
+
+def chunk(text, **metadata):
+    return AIMessageChunk(content=text, response_metadata=metadata)
+
+
+def test_metrics_from_fixed_times():
+    run = ModelRun(0, "qwen3")
+    run.start_time = 10.0
+    run.first_token_time = 10.25
+    run.end_time = 12.25
+    run.output_tokens = 40
+    assert run.getMetrics()["ttft_ms"] == 250.0
+    assert run.getMetrics()["total_ms"] == 2250.0
+    # without Ollama timings the rate is over the time after the first token
+    assert run.getMetrics()["tokens_per_s"] == 20.0
+
+
+def test_observe_message_counts_steps_and_prefers_ollama_timings():
+    run = ModelRun(0, "qwen3")
+    step = AIMessage(
+        content="",
+        tool_calls=[{"name": "read_file", "args": {}, "id": "1"}],
+        usage_metadata={"input_tokens": 900, "output_tokens": 12, "total_tokens": 912},
+        response_metadata={"eval_count": 12, "eval_duration": 0.5e9},
+    )
+    answer = AIMessage(
+        content="done",
+        usage_metadata={"input_tokens": 950, "output_tokens": 38, "total_tokens": 988},
+        response_metadata={"eval_count": 38, "eval_duration": 1.5e9},
+    )
+    run.observeMessage(step)
+    run.observeMessage(answer)
+    metrics = run.getMetrics()
+    assert metrics["model_calls"] == 2
+    assert metrics["tool_calls"] == 1
+    assert metrics["prompt_tokens"] == 900
+    assert metrics["output_tokens"] == 50
+    assert metrics["tokens_per_s"] == 25.0
+
+
+def test_comparison_streams_scores_and_saves_each_model(tmp_path):
+    models = {
+        "a": FakeChatModel(
+            [chunk("<think>plan</think>"), chunk("Hi "), chunk("there", eval_count=2)]
+        ),
+        "b": FakeChatModel([chunk("partial")], error=RuntimeError("model not found")),
+    }
+    events = queue.Queue()
+    results_file = tmp_path / "compare.jsonl"
+    comparison = ModelComparison(FakeManager(models), events, str(results_file))
+    record = asyncio.run(comparison.run("hello", ["a", "b"]))
+
+    first, second = record["runs"]
+    assert first["output"] == "Hi there"
+    assert first["reasoning_chars"] == len("plan")
+    assert first["model_calls"] == 1
+    assert first["error"] is None
+    assert second["error"] == "model not found"
+    assert second["output"] == "partial"
+    assert record["temperature"] == 0.2
+    assert json.loads(results_file.read_text(encoding="utf-8")) == record
+
+    sent = [events.get_nowait() for _ in range(events.qsize())]
+    tokens = "".join(
+        e["data"]["text"]
+        for e in sent
+        if e["type"] == "compare_token" and e["data"]["index"] == 0
+    )
+    assert tokens == "Hi there"
+    done = [e["data"]["index"] for e in sent if e["type"] == "compare_model_done"]
+    assert sorted(done) == [0, 1]
+
+
+def test_slow_model_times_out(tmp_path):
+    class SlowChatModel:
+        async def astream(self, messages):
+            await asyncio.sleep(10)
+            yield chunk("late")
+
+    comparison = ModelComparison(
+        FakeManager({"slow": SlowChatModel()}),
+        results_file=str(tmp_path / "compare.jsonl"),
+    )
+    record = asyncio.run(comparison.run("hello", ["slow"], timeout=0.05))
+    assert record["runs"][0]["error"] == "timed out after 0.05s"
+    assert record["runs"][0]["ttft_ms"] is None
+
+
+def test_save_failure_does_not_raise(tmp_path, capsys):
+    comparison = ModelComparison(
+        FakeManager({"a": FakeChatModel([chunk("ok")])}),
+        results_file=str(tmp_path / "missing" / "compare.jsonl"),
+    )
+    record = asyncio.run(comparison.run("hello", ["a"]))
+    assert record["runs"][0]["output"] == "ok"
+    assert "Could not save results" in capsys.readouterr().out
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent import ollama_pool
+from agent.ollama_pool import (
+    ENDPOINT_RETRY_SECONDS,
+    NoHealthyEndpointError,
+    OllamaEndpointPool,
+    PooledChatOllama,
+)
+
+MODEL = "stand-in:latest"
+
+
+class OllamaStandIn(BaseHTTPRequestHandler):
+    """Answers /api/ps and streams a one-word /api/chat reply naming the server."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def sendJson(self, lines):
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            self.sendJson([{"models": [{"name": MODEL}]}])
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+        message = {"role": "assistant", "content": self.server.name}
+        self.sendJson(
+            [
+                {"model": MODEL, "message": message, "done": False},
+                {
+                    "model": MODEL,
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": 1,
+                    "eval_count": 1,
+                },
+            ]
+        )
+
+
+def startServer(name):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OllamaStandIn)
+    server.name = name
+    threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    ).start()
+    return server
+
+
+def stopServer(server):
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = {"a": startServer("a"), "b": startServer("b")}
+    yield started
+    for server in started.values():
+        if server.socket.fileno() != -1:
+            stopServer(server)
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def makePool(servers, weight_a=1, weight_b=1):
+    pool = OllamaEndpointPool(
+        [
+            {"url": url(servers["a"]), "weight": weight_a},
+            {"url": url(servers["b"]), "weight": weight_b},
+        ]
+    )
+    asyncio.run(pool.probe())
+    return pool
+
+
+def endpointFor(pool, server):
+    return next(e for e in pool.endpoints if e.url == url(server))
+
+
+def ask(pool):
+    chat_model = PooledChatOllama(model=MODEL, pool=pool)
+    return asyncio.run(chat_model.ainvoke([HumanMessage(content="hi")])).content
+
+
+def test_probe_reads_loaded_models(servers):
+    pool = makePool(servers)
+    for endpoint in pool.endpoints:
+        assert endpoint.healthy
+        assert endpoint.loaded_models == {MODEL}
+
+
+def test_probe_marks_unreachable_endpoint_down(servers):
+    stopServer(servers["b"])
+    pool = makePool(servers)
+    assert endpointFor(pool, servers["a"]).healthy
+    assert not endpointFor(pool, servers["b"]).healthy
+
+
+def test_requests_follow_weights(servers):
+    pool = makePool(servers, weight_a=3, weight_b=1)
+    acquired = [pool.acquire(MODEL).url for _ in range(8)]
+    assert acquired.count(url(servers["a"])) == 6
+    assert acquired.count(url(servers["b"])) == 2
+
+
+def test_fails_over_before_first_token(servers):
+    pool = makePool(servers, weight_a=10, weight_b=1)
+    stopServer(servers["a"])
+    assert ask(pool) == "b"
+    down = endpointFor(pool, servers["a"])
+    assert not down.healthy
+    assert down.failures == 1
+    assert down.in_flight == 0
+    assert endpointFor(pool, servers["b"]).requests == 1
+
+
+def test_down_endpoint_is_skipped_for_retry_window(servers, monkeypatch):
+    pool = makePool(servers, weight_a=10, weight_b=1)
+    clock = [1000.0]
+    monkeypatch.setattr(ollama_pool.time, "monotonic", lambda: clock[0])
+    endpoint_a = endpointFor(pool, servers["a"])
+    pool.markDown(endpoint_a, ConnectionError("gone"))
+
+    clock[0] += ENDPOINT_RETRY_SECONDS - 1
+    endpoint = pool.acquire(MODEL)
+    pool.release(endpoint, MODEL, 0.0)
+    assert endpoint.url == url(servers["b"])
+
+    clock[0] += 1
+    assert pool.acquire(MODEL) is endpoint_a
+
+
+def test_no_endpoint_left(servers):
+    pool = makePool(servers)
+    stopServer(servers["a"])
+    stopServer(servers["b"])
+    with pytest.raises(NoHealthyEndpointError):
+        ask(pool)
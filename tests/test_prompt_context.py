@@ -0,0 +1,123 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from agent.prompt_context import (
+    ATTACHMENT_HEADER,
+    PromptPrefetcher,
+    findReferences,
+    isUnder,
+)
+
+
+def test_find_references():
+    urls, paths = findReferences(
+        "Compare https://example.com/a.txt, 'my notes.md' and data/runs.csv "
+        "with ~/report.json. Ignore photo.png and https://example.com/a.txt."
+    )
+    assert urls == ["https://example.com/a.txt"]
+    # the tail of a quoted name is a candidate too; it must still resolve
+    assert paths == ["my notes.md", "notes.md", "data/runs.csv", "~/report.json"]
+
+
+def test_find_references_without_any():
+    assert findReferences("How far did I run last week?") == ([], [])
+
+
+def test_is_under():
+    root = os.path.join(os.sep, "data", "allowed")
+    assert isUnder(os.path.join(root, "a.txt"), [root])
+    assert isUnder(root, [root])
+    assert not isUnder(os.path.join(os.sep, "data", "allowed-not", "a.txt"), [root])
+    assert not isUnder(os.path.join(os.sep, "etc", "passwd"), [root])
+
+
+@pytest.fixture
+def tree(tmp_path):
+    allowed = tmp_path / "allowed"
+    allowed.mkdir()
+    (allowed / "notes.txt").write_text("allowed notes", encoding="utf-8")
+    (allowed / "big.txt").write_text("x" * 200, encoding="utf-8")
+    (tmp_path / "secret.txt").write_text("secret", encoding="utf-8")
+    return tmp_path
+
+
+@pytest.fixture
+def prefetcher(tree):
+    return PromptPrefetcher(
+        [str(tree / "allowed")], allowed_hosts=["docs.example.com"], max_bytes=100
+    )
+
+
+def test_resolve_path_stays_in_the_allowed_dirs(tree, prefetcher):
+    allowed = tree / "allowed"
+    assert prefetcher.resolvePath(str(allowed / "notes.txt")) == os.path.realpath(
+        allowed / "notes.txt"
+    )
+    assert prefetcher.resolvePath(str(allowed / ".." / "secret.txt")) is None
+    assert prefetcher.resolvePath(str(tree / "secret.txt")) is None
+    assert prefetcher.resolvePath(str(allowed / "missing.txt")) is None
+
+
+def test_symlink_out_of_the_allowed_dirs_is_refused(tree, prefetcher):
+    link = tree / "allowed" / "link.txt"
+    try:
+        os.symlink(tree / "secret.txt", link)
+    except (OSError, NotImplementedError):
+        pytest.skip("symlinks are not supported here")
+    assert prefetcher.resolvePath(str(link)) is None
+
+
+def test_prefetch_attaches_allowed_files_up_to_max_bytes(tree, prefetcher):
+    allowed = tree / "allowed"
+    query = (
+        f'Summarize "{allowed / "notes.txt"}", "{allowed / "big.txt"}" '
+        f'and "{tree / "secret.txt"}"'
+    )
+    augmented, report = asyncio.run(prefetcher.prefetch(query))
+    assert augmented.startswith(query + "\n\n" + ATTACHMENT_HEADER)
+    assert "allowed notes" in augmented
+    assert "x" * 200 not in augmented
+    assert "secret" not in augmented.replace(str(tree / "secret.txt"), "")
+    assert report["sources"] == [str(allowed / "notes.txt")]
+    assert report["bytes"] == len("allowed notes")
+    assert report["skipped"] == 1
+
+
+def test_query_without_allowed_references_is_unchanged(tree, prefetcher):
+    query = f"Read {tree / 'secret.txt'} and https://evil.example.com/x.txt"
+    assert asyncio.run(prefetcher.prefetch(query)) == (query, None)
+
+
+def test_host_allowlist(prefetcher):
+    assert prefetcher.isAllowedUrl("https://docs.example.com/guide.md")
+    assert prefetcher.isAllowedUrl("https://DOCS.example.com/guide.md")
+    assert not prefetcher.isAllowedUrl("https://example.com/guide.md")
+    assert not prefetcher.isAllowedUrl("https://docs.example.com.evil.net/x")
+    assert not prefetcher.isAllowedUrl("file:///etc/passwd")
+
+
+def test_url_is_loaded_only_if_text_and_small(prefetcher):
+    bodies = {"/small.txt": "hello", "/big.txt": "x" * 101}
+
+    def handler(request):
+        if request.url.path in bodies:
+            return httpx.Response(
+                200,
+                text=bodies[request.url.path],
+                headers={"content-type": "text/plain"},
+            )
+        return httpx.Response(
+            200, content=b"\x89PNG", headers={"content-type": "image/png"}
+        )
+
+    async def load(path):
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await prefetcher.loadUrl(client, "https://docs.example.com" + path)
+
+    assert asyncio.run(load("/small.txt"))["text"] == "hello"
+    assert asyncio.run(load("/big.txt")) is None
+    assert asyncio.run(load("/image.png")) is None
@@ -0,0 +1,190 @@
+import asyncio
+import os
+
+import pytest
+from langchain_core.language_models.fake_chat_models import (
+    FakeMessagesListChatModel,
+)
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from agent.llm_ollama import OllamaAgentManager
+from agent.response_cache import ResponseCache, findPathArguments
+
+KEY_ARGS = dict(
+    model="qwen3:8b",
+    temperature=0.2,
+    system_prompt="You are helpful.",
+    conversation=["user: hi", "assistant: hello"],
+    query="list my files",
+    tool_names=["list_dir", "read_file"],
+)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(
+        str(tmp_path / "cache.db"), read_only_tools=["list_dir", "read_file"]
+    )
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("model", "qwen3:32b"),
+        ("temperature", 0.7),
+        ("system_prompt", "You are terse."),
+        ("conversation", ["user: hi", "assistant: hi there"]),
+        ("query", "list my folders"),
+        ("tool_names", ["list_dir"]),
+    ],
+)
+def test_key_covers_each_input(field, value):
+    changed = ResponseCache.makeKey(**{**KEY_ARGS, field: value})
+    assert changed != ResponseCache.makeKey(**KEY_ARGS)
+
+
+def test_key_ignores_whitespace_and_tool_order():
+    same = dict(
+        KEY_ARGS,
+        system_prompt="  You are\nhelpful. ",
+        conversation=["user:  hi", "assistant: hello\n"],
+        query="list  my files",
+        tool_names=["read_file", "list_dir"],
+    )
+    assert ResponseCache.makeKey(**same) == ResponseCache.makeKey(**KEY_ARGS)
+
+
+def test_hit_and_miss(cache):
+    assert cache.get("key") is None
+    cache.put("key", [{"type": "chat_token", "data": "hi"}], {"output": "hi"})
+    entry = cache.get("key")
+    assert entry["result"] == {"output": "hi"}
+    assert entry["events"] == [{"type": "chat_token", "data": "hi"}]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_changed_file_invalidates_the_entry(cache, tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("v1", encoding="utf-8")
+    cache.put("key", [], {"output": "v1"}, touched_files=[str(notes)])
+    assert cache.get("key") is not None
+    notes.write_text("v2", encoding="utf-8")
+    assert cache.get("key") is None
+    # the entry is gone, not just skipped
+    notes.write_text("v1", encoding="utf-8")
+    assert cache.get("key") is None
+
+
+def test_deleted_file_invalidates_the_entry(cache, tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("v1", encoding="utf-8")
+    cache.put("key", [], {"output": "v1"}, touched_files=[str(notes)])
+    os.remove(notes)
+    assert cache.get("key") is None
+
+
+def test_new_file_in_a_listed_folder_invalidates_the_entry(cache, tmp_path):
+    folder = tmp_path / "folder"
+    folder.mkdir()
+    (folder / "a.txt").write_text("a", encoding="utf-8")
+    cache.put("key", [], {"output": "a.txt"}, touched_files=[str(folder)])
+    assert cache.get("key") is not None
+    (folder / "b.txt").write_text("b", encoding="utf-8")
+    assert cache.get("key") is None
+
+
+def test_path_arguments(tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("x", encoding="utf-8")
+    args = {"path": str(notes), "options": {"paths": [str(tmp_path), "nope.txt"]}}
+    assert findPathArguments(args) == {str(notes), str(tmp_path)}
+    assert findPathArguments("not a dict") == set()
+
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("agent.response_cache.time.time", lambda: next(clock))
+    cache.put("a", [], {"output": "x" * 100})
+    size = cache.conn.execute("SELECT size FROM responses").fetchone()[0]
+    cache.max_bytes = size * 2
+    cache.put("b", [], {"output": "x" * 100})
+    assert cache.get("a") is not None
+    cache.put("c", [], {"output": "x" * 100})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_entry_larger_than_the_cache_is_not_stored(cache):
+    cache.max_bytes = 100
+    cache.put("key", [], {"output": "x" * 200})
+    assert cache.get("key") is None
+
+
+def test_uncacheable_tools(cache):
+    calls = [{"name": "read_file"}, {"name": "write_file"}, {"name": "delete"}]
+    assert cache.getUncacheableTools(calls) == ["delete", "write_file"]
+    assert cache.getUncacheableTools(calls[:1]) == []
+
+
+class ToolCallingFake(FakeMessagesListChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@tool
+def read_file(path: str) -> str:
+    """Read a file."""
+    return "contents"
+
+
+@tool
+def write_file(path: str) -> str:
+    """Write a file."""
+    return "written"
+
+
+def runTurn(manager, tool_name):
+    model = ToolCallingFake(
+        responses=[
+            AIMessage(
+                content="",
+                tool_calls=[{"name": tool_name, "args": {"path": "x"}, "id": "1"}],
+            ),
+            AIMessage(content="done"),
+        ]
+    )
+    agent = create_react_agent(
+        model=model,
+        tools=[read_file, write_file],
+        checkpointer=manager.checkpointer,
+    )
+
+    async def run():
+        await agent.ainvoke(
+            {"messages": [HumanMessage(content="go")]}, manager.getRunConfig()
+        )
+        await manager.cacheResponse(agent, "key", [], {"output": "done"})
+
+    asyncio.run(run())
+
+
+def test_turn_that_writes_is_not_cached(cache):
+    manager = OllamaAgentManager(mcp_tools=[])
+    manager.response_cache = cache
+    runTurn(manager, "write_file")
+    assert cache.get("key") is None
+    runTurn(manager, "read_file")
+    assert cache.get("key")["result"] == {"output": "done"}
+
+
+def test_fanned_out_answer_is_not_cached(cache):
+    manager = OllamaAgentManager(mcp_tools=[])
+    manager.response_cache = cache
+    result = {"output": "done", "fan_out": {"subtasks": 2}}
+    asyncio.run(manager.cacheResponse(None, "key", [], result))
+    assert cache.get("key") is None
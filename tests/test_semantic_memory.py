@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from agent.semantic_memory import VectorIndex, splitChunks
+
+
+def entry(chat, text="", message=0, chunk=0):
+    return {"chat": chat, "message": message, "chunk": chunk, "text": text}
+
+
+@pytest.fixture
+def prefix(tmp_path):
+    return str(tmp_path / "memory")
+
+
+@pytest.fixture
+def index(prefix):
+    index = VectorIndex(prefix, "embed-a")
+    index.append(
+        [[1, 0, 0], [0, 2, 0], [1, 1, 0]],
+        [entry(0, "x"), entry(1, "y"), entry(2, "xy")],
+    )
+    return index
+
+
+def test_search_ranks_by_cosine_similarity(index):
+    hits = index.search([2, 0, 0], 2)
+    assert [hit["text"] for _score, hit in hits] == ["x", "xy"]
+    assert hits[0][0] == pytest.approx(1)
+    assert hits[1][0] == pytest.approx(2**-0.5)
+
+
+def test_search_limits(index, prefix):
+    assert len(index.search([1, 0, 0], 10)) == 3
+    assert index.search([1, 0, 0], 0) == []
+    assert VectorIndex(prefix + "-empty", "embed-a").search([1, 0, 0], 3) == []
+
+
+def test_index_is_reloaded_from_disk(index, prefix):
+    reloaded = VectorIndex(prefix, "embed-a")
+    assert len(reloaded) == 3
+    assert reloaded.dim == 3
+    assert (1, 0, 0) in reloaded.keys
+    assert reloaded.search([0, 1, 0], 1)[0][1]["text"] == "y"
+
+
+def test_another_model_starts_a_new_index(index, prefix):
+    other = VectorIndex(prefix, "embed-b")
+    assert len(other) == 0
+    assert other.dim is None
+    other.append([[0, 0, 1, 0]], [entry(0, "z")])
+    assert other.search([0, 0, 1, 0], 1)[0][1]["text"] == "z"
+
+
+def test_embedding_size_must_not_change(index):
+    with pytest.raises(ValueError):
+        index.append([[1, 0]], [entry(3)])
+    assert len(index) == 3
+
+
+def test_interrupted_append_is_rolled_back(index, prefix):
+    # a row written to the matrix but not to the metadata, then a torn line
+    with open(index.matrix_file, "ab") as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes())
+    with open(index.entries_file, "a", encoding="utf-8") as f:
+        f.write('{"chat": 3, "mess')
+
+    reloaded = VectorIndex(prefix, "embed-a")
+    assert len(reloaded) == 3
+    with open(reloaded.entries_file, encoding="utf-8") as f:
+        assert [json.loads(line)["chat"] for line in f] == [0, 1, 2]
+    reloaded.append([[0, 0, 1]], [entry(3, "z")])
+    assert VectorIndex(prefix, "embed-a").search([0, 0, 1], 1)[0][1]["text"] == "z"
+
+
+def test_split_chunks_prefers_line_breaks():
+    text = "a" * 70 + "\n\n" + "b" * 70
+    assert splitChunks(text, size=100) == ["a" * 70, "b" * 70]
+    assert splitChunks("c" * 250, size=100) == ["c" * 100, "c" * 100, "c" * 50]
+    assert splitChunks("   ") == []
@@ -0,0 +1,77 @@
+import pytest
+
+from agent.think_parser import (
+    KIND_ANSWER,
+    KIND_REASONING,
+    ThinkStreamParser,
+    splitThinking,
+    stripThinking,
+)
+
+MESSAGE = "<think>\nThe user wants a sum.\n</think>\n\nThe total is 42 km."
+
+
+def feedAll(chunks):
+    parser = ThinkStreamParser()
+    segments = []
+    for chunk in chunks:
+        segments.extend(parser.feed(chunk))
+    segments.extend(parser.flush())
+    return segments
+
+
+def joined(segments, kind):
+    return "".join(text for segment_kind, text in segments if segment_kind == kind)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, len(MESSAGE)])
+def test_tags_split_across_chunks(size):
+    chunks = [MESSAGE[i : i + size] for i in range(0, len(MESSAGE), size)]
+    segments = feedAll(chunks)
+    assert joined(segments, KIND_REASONING) == "\nThe user wants a sum.\n"
+    assert joined(segments, KIND_ANSWER) == "The total is 42 km."
+    assert "<" not in joined(segments, KIND_ANSWER)
+
+
+def test_partial_tag_is_held_back():
+    parser = ThinkStreamParser()
+    assert parser.feed("<thi") == []
+    assert parser.feed("nk>why") == [(KIND_REASONING, "why")]
+    assert parser.feed("</th") == []
+    assert parser.feed("ink>ok") == [(KIND_ANSWER, "ok")]
+
+
+def test_text_that_only_looks_like_a_tag_is_released():
+    parser = ThinkStreamParser()
+    assert parser.feed("a <th") == [(KIND_ANSWER, "a ")]
+    assert parser.feed("e end") == [(KIND_ANSWER, "<the end")]
+    assert parser.feed(" <") == [(KIND_ANSWER, " ")]
+    assert parser.flush() == [(KIND_ANSWER, "<")]
+
+
+def test_answer_without_think_block():
+    segments = feedAll(["Just ", "an answer."])
+    assert joined(segments, KIND_ANSWER) == "Just an answer."
+    assert joined(segments, KIND_REASONING) == ""
+
+
+def test_blank_lines_before_the_answer_are_dropped():
+    segments = feedAll(["<think>x</think>", "\n\n", "\n", "Answer"])
+    assert segments == [(KIND_REASONING, "x"), (KIND_ANSWER, "Answer")]
+
+
+def test_unclosed_think_block_is_reasoning():
+    assert feedAll(["<think>still going"]) == [(KIND_REASONING, "still going")]
+
+
+def test_split_thinking():
+    assert splitThinking(MESSAGE) == (
+        "\nThe user wants a sum.\n",
+        "The total is 42 km.",
+    )
+
+
+def test_strip_thinking():
+    assert stripThinking(MESSAGE) == "The total is 42 km."
+    assert stripThinking("<think>unfinished") == ""
+    assert stripThinking("no think block") == "no think block"
@@ -0,0 +1,41 @@
+import pytest
+from langchain_core.tools import ToolException
+from mcp import types
+
+from mcp_server.tool_catalog import ToolCatalog, toolResult
+
+CONFIG = {"command": "python", "args": ["server.py"], "transport": "stdio"}
+
+
+def text(value):
+    return types.TextContent(type="text", text=value)
+
+
+def test_single_text_part_is_the_content():
+    result = types.CallToolResult(content=[text("42")])
+    assert toolResult(result) == ("42", None)
+
+
+def test_other_parts_are_the_artifact():
+    image = types.ImageContent(type="image", data="aGk=", mimeType="image/png")
+    result = types.CallToolResult(content=[text("a"), image, text("b")])
+    assert toolResult(result) == (["a", "b"], [image])
+
+
+def test_error_result_raises():
+    result = types.CallToolResult(content=[text("no such file")], isError=True)
+    with pytest.raises(ToolException, match="no such file"):
+        toolResult(result)
+
+
+def test_catalog_entry_follows_the_server_config(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    catalog = ToolCatalog(path)
+    catalog.put("files", CONFIG, ["old spec"])
+    catalog.put("files", {**CONFIG, "args": ["v2.py"]}, ["spec"])
+    catalog.put("files", CONFIG, ["spec"])
+    reloaded = ToolCatalog(path)
+    assert reloaded.get("files", CONFIG) == ["spec"]
+    assert reloaded.get("files", {**CONFIG, "args": ["v2.py"]}) is None
+    assert reloaded.get("other", CONFIG) is None
+    assert reloaded.get("files", {**CONFIG, "session_kwargs": {"x": 1}}) == ["spec"]
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import StructuredTool, ToolException, tool
+
+from agent.tool_diff import (
+    ACTIVE_TOOL_RESULTS,
+    TOOL_DIFF_MIN_CHARS,
+    ToolResultMemory,
+    wrapTool,
+)
+
+LISTING = "\n".join(f"file_{i:03}.txt" for i in range(50))
+ARGS = {"path": "/tmp"}
+
+
+@pytest.fixture
+def memory():
+    return ToolResultMemory()
+
+
+def test_first_result_is_sent_whole(memory):
+    assert memory.compact("list_dir", ARGS, LISTING) == LISTING
+    assert memory.getReport() is None
+
+
+def test_identical_result_becomes_a_marker(memory):
+    memory.compact("list_dir", ARGS, LISTING)
+    sent = memory.compact("list_dir", ARGS, LISTING)
+    assert sent.startswith("[Unchanged:")
+    assert f"({len(LISTING)} characters)" in sent
+    assert memory.getReport() == {
+        "compacted": 1,
+        "chars_saved": len(LISTING) - len(sent),
+    }
+
+
+def test_small_change_becomes_a_diff(memory):
+    memory.compact("list_dir", ARGS, LISTING)
+    changed = LISTING.replace("file_010.txt", "notes.md")
+    sent = memory.compact("list_dir", ARGS, changed)
+    assert sent.startswith("[Changed since")
+    assert "\n-file_010.txt\n+notes.md\n" in sent
+    assert len(sent) < len(changed)
+
+
+def test_large_change_is_sent_whole(memory):
+    memory.compact("list_dir", ARGS, LISTING)
+    rewritten = LISTING.replace("file_", "doc_")
+    assert memory.compact("list_dir", ARGS, rewritten) == rewritten
+
+
+def test_short_or_non_text_results_are_sent_whole(memory):
+    short = "x" * (TOOL_DIFF_MIN_CHARS - 1)
+    memory.compact("read_file", ARGS, short)
+    assert memory.compact("read_file", ARGS, short) == short
+    blocks = [{"type": "text", "text": LISTING}]
+    memory.compact("read_file", ARGS, blocks)
+    assert memory.compact("read_file", ARGS, blocks) is blocks
+
+
+def test_other_arguments_are_a_different_result(memory):
+    memory.compact("list_dir", ARGS, LISTING)
+    assert memory.compact("list_dir", {"path": "/srv"}, LISTING) == LISTING
+
+
+def test_argument_order_does_not_matter(memory):
+    memory.compact("search", {"a": 1, "b": 2}, LISTING)
+    sent = memory.compact("search", {"b": 2, "a": 1}, LISTING)
+    assert sent.startswith("[Unchanged:")
+
+
+def test_results_no_longer_in_context_are_forgotten(memory):
+    memory.compact("list_dir", ARGS, LISTING)
+    memory.retain(["something else"])
+    assert memory.compact("list_dir", ARGS, LISTING) == LISTING
+
+
+def test_retain_needs_every_text_the_result_was_sent_as(memory):
+    memory.compact("list_dir", ARGS, LISTING)
+    marker = memory.compact("list_dir", ARGS, LISTING)
+    memory.retain([LISTING, marker])
+    assert memory.compact("list_dir", ARGS, LISTING).startswith("[Unchanged:")
+    memory.retain([marker])
+    assert memory.compact("list_dir", ARGS, LISTING) == LISTING
+
+
+@tool
+def list_dir(path: str) -> str:
+    """List a directory."""
+    return LISTING
+
+
+def fail(path: str) -> str:
+    """Always fails."""
+    raise ToolException("no such directory")
+
+
+broken = StructuredTool.from_function(fail, name="broken", handle_tool_error=True)
+
+
+def test_wrapped_tool_compacts_in_the_active_conversation(memory):
+    wrapped = wrapTool(list_dir)
+    assert wrapped.name == "list_dir"
+
+    async def callTwice():
+        token = ACTIVE_TOOL_RESULTS.set(memory)
+        try:
+            first = await wrapped.ainvoke(ARGS)
+            second = await wrapped.ainvoke(ARGS)
+        finally:
+            ACTIVE_TOOL_RESULTS.reset(token)
+        return first, second
+
+    first, second = asyncio.run(callTwice())
+    assert first == LISTING
+    assert second.startswith("[Unchanged:")
+
+
+def test_wrapped_tool_passes_results_through_without_a_conversation():
+    wrapped = wrapTool(list_dir)
+    results = [asyncio.run(wrapped.ainvoke(ARGS)) for _ in range(2)]
+    assert results == [LISTING, LISTING]
+
+
+def test_wrapped_tool_keeps_errors():
+    wrapped = wrapTool(broken)
+    assert asyncio.run(wrapped.ainvoke(ARGS)) == "no such directory"
@@ -0,0 +1,89 @@
+from langchain_core.tools import tool
+
+from agent.tool_router import ToolRouter, tokenize
+
+
+@tool
+def get_local_file_list(path: str) -> str:
+    """List the files in a local directory."""
+    return path
+
+
+@tool
+def read_file(path: str) -> str:
+    """Read the contents of a file."""
+    return path
+
+
+@tool
+def get_weather(city: str) -> str:
+    """Get the current weather forecast for a city."""
+    return city
+
+
+@tool
+def convert_currency(amount: float, currency: str) -> str:
+    """Convert an amount of money into another currency."""
+    return currency
+
+
+@tool
+def send_email(recipient: str, subject: str) -> str:
+    """Send an email message to a recipient."""
+    return recipient
+
+
+TOOLS = [get_local_file_list, read_file, get_weather, convert_currency, send_email]
+
+
+def names(tools):
+    return [t.name for t in tools]
+
+
+def test_tokenize_splits_names_and_drops_stopwords():
+    assert tokenize("get_local_file_list") == ["local", "file", "list"]
+    assert tokenize("readFiles") == ["read", "file"]
+    assert tokenize("What is the weather in Paris?") == ["weather", "pari"]
+
+
+def test_best_matching_tools_are_selected():
+    router = ToolRouter(TOOLS, top_k=2)
+    tools, report = router.selectTools("what's the weather forecast in Oslo")
+    assert names(tools) == ["get_weather"]
+    assert report["tools_total"] == 5
+    assert report["tools_selected"] == 1
+    assert report["schema_tokens_saved"] > 0
+
+
+def test_selection_keeps_tool_order_and_top_k():
+    router = ToolRouter(TOOLS, top_k=2)
+    tools, _ = router.selectTools("read the file list in my local folder")
+    assert names(tools) == ["get_local_file_list", "read_file"]
+
+
+def test_name_match_outranks_description_match():
+    router = ToolRouter(TOOLS, top_k=1)
+    tools, _ = router.selectTools("email")
+    assert names(tools) == ["send_email"]
+
+
+def test_pinned_tools_are_always_included():
+    router = ToolRouter(TOOLS, top_k=1, pinned=["read_file"])
+    tools, report = router.selectTools("convert 10 dollars to another currency")
+    assert names(tools) == ["read_file", "convert_currency"]
+    assert report["tool_names"] == ["read_file", "convert_currency"]
+
+
+def test_no_match_falls_back_to_every_tool():
+    router = ToolRouter(TOOLS, top_k=2)
+    tools, report = router.selectTools("tell me a joke")
+    assert tools == TOOLS
+    assert report["schema_tokens_saved"] == 0
+
+
+def test_routing_is_disabled_for_small_tool_sets():
+    assert not ToolRouter(TOOLS, top_k=0).isEnabled()
+    router = ToolRouter(TOOLS, top_k=5)
+    assert not router.isEnabled()
+    tools, _ = router.selectTools("weather")
+    assert tools == TOOLS
@@ -0,0 +1,62 @@
+import queue
+from unittest import mock
+
+import pytest
+
+from constants import EVENT_DATA, EVENT_TYPE
+from mcp_server.mcp_supervisor import STATUS_HEALTHY, STATUS_IDLE, MCPSupervisor
+from worker import Worker
+
+
+@pytest.fixture
+def worker():
+    worker = Worker(queue.Queue(), queue.Queue())
+    supervisor = MCPSupervisor(
+        {"files": {"command": "python", "args": [], "transport": "stdio"}},
+        on_tools_changed=worker.onMCPToolsChanged,
+    )
+    supervisor.servers["files"].status = STATUS_IDLE
+
+    async def startServer(server):
+        # the real tool list differs from the catalog's
+        server.status = STATUS_HEALTHY
+        return True, True
+
+    supervisor.startServer = startServer
+    worker.mcp_supervisor = supervisor
+    worker.agent_manager = mock.MagicMock()
+    yield worker
+    worker.loop.close()
+
+
+def test_lazy_start_during_query_rebinds_after_it(worker):
+    supervisor = worker.mcp_supervisor
+    rebind = worker.agent_manager.rebindTools
+
+    async def chat(query, **kwargs):
+        await supervisor.ensureStarted(supervisor.servers["files"])
+        rebinds_during_query = rebind.call_count
+        worker.running = False
+        return {"output": str(rebinds_during_query)}
+
+    worker.agent_manager.chat = chat
+    worker.in_queue.put({EVENT_TYPE: "chat", EVENT_DATA: "list my files"})
+    worker.run()
+
+    results = []
+    while not worker.out_queue.empty():
+        event = worker.out_queue.get()
+        if event[EVENT_TYPE] == "chat_result":
+            results.append(event[EVENT_DATA])
+    assert results == [{"output": "0"}]
+    assert rebind.call_count == 1
+    assert not worker.tools_rebind_pending
+
+
+def test_tool_change_between_queries_rebinds_at_once(worker):
+    supervisor = worker.mcp_supervisor
+    worker.loop.run_until_complete(
+        supervisor.ensureStarted(supervisor.servers["files"])
+    )
+    assert worker.agent_manager.rebindTools.call_count == 1
+    assert not worker.tools_rebind_pending
@@ -0,0 +1,75 @@
+from multiprocessing import Pipe
+
+from constants import EVENT_DATA, EVENT_TYPE
+from worker_process import (
+    FRAME_EVENT,
+    FRAME_TOKEN,
+    FrameSender,
+    decodeEvent,
+    encodeEvent,
+)
+
+
+def token(text):
+    return {EVENT_TYPE: "chat_token", EVENT_DATA: text}
+
+
+def receiveAll(connection):
+    events = []
+    while connection.poll(0.1):
+        events.append(decodeEvent(connection.recv_bytes()))
+    return events
+
+
+def test_token_frames_skip_json():
+    frame = encodeEvent(token('안녕 "hi"'))
+    assert frame == FRAME_TOKEN + '안녕 "hi"'.encode("utf-8")
+    assert decodeEvent(frame) == token('안녕 "hi"')
+
+
+def test_event_frames_round_trip():
+    event = {EVENT_TYPE: "chat_done", EVENT_DATA: {"text": "끝", "steps": [1, 2]}}
+    frame = encodeEvent(event)
+    assert frame[:1] == FRAME_EVENT
+    assert decodeEvent(frame) == event
+
+
+def test_sender_merges_consecutive_tokens():
+    parent, child = Pipe()
+    sender = FrameSender(child)
+    sender.sendEvents(
+        [token("a"), token("b"), {EVENT_TYPE: "chat_step"}, token("c"), token("d")]
+    )
+    sender.close()
+    assert receiveAll(parent) == [
+        token("ab"),
+        {EVENT_TYPE: "chat_step"},
+        token("cd"),
+    ]
+
+
+def test_sender_round_trip_over_a_pipe_keeps_order():
+    parent, child = Pipe()
+    sender = FrameSender(child)
+    for i in range(50):
+        sender.put(token(str(i % 10)))
+        if i % 7 == 0:
+            sender.put({EVENT_TYPE: "chat_step", EVENT_DATA: i})
+    sender.put({EVENT_TYPE: "chat_done", EVENT_DATA: None})
+    sender.close()
+    events = receiveAll(parent)
+    assert events[-1] == {EVENT_TYPE: "chat_done", EVENT_DATA: None}
+    assert [e[EVENT_DATA] for e in events if e[EVENT_TYPE] == "chat_step"] == list(
+        range(0, 50, 7)
+    )
+    text = "".join(e[EVENT_DATA] for e in events if e[EVENT_TYPE] == "chat_token")
+    assert text == "".join(str(i % 10) for i in range(50))
+
+
+def test_sender_ignores_a_closed_pipe():
+    parent, child = Pipe()
+    parent.close()
+    sender = FrameSender(child)
+    sender.put(token("lost"))
+    sender.close()
+    assert not sender.thread.is_alive()
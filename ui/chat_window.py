@@ -1,7 +1,8 @@
+import html
 import queue
 
-from PySide6.QtCore import QThread, QTimer, Signal
-from PySide6.QtGui import QKeySequence, QShortcut
+from PySide6.QtCore import Qt, QThread, QTimer, Signal
+from PySide6.QtGui import QColor, QKeySequence, QShortcut
 from PySide6.QtWidgets import (
     QAbstractItemView,
     QFrame,
@@ -9,21 +10,34 @@ from PySide6.QtWidgets import (
     QLabel,
     QLineEdit,
     QListWidget,
+    QListWidgetItem,
     QMainWindow,
     QPushButton,
     QSizePolicy,
-    QTextEdit,
     QVBoxLayout,
     QWidget,
 )
 
 from agent.chat_history import ChatHistory
+from agent.chat_search import ChatSearchIndex
+from agent.chat_record import (
+    ROLE_ASSISTANT,
+    ROLE_ERROR,
+    ROLE_SETTINGS,
+    ROLE_SYSTEM,
+    ROLE_USER,
+    makeRecord,
+    recordFromText,
+)
 from app_settings import AppSettings
-from constants import EVENT_DATA, EVENT_TYPE
+from constants import EVENT_DATA, EVENT_TYPE, TOOL_PARTIAL_LINES
 from mcp_server.mcp_manager import MCPManager
 from ui.widgets.ai_settings_dialog import AISettingsDialog
+from ui.widgets.compare_dialog import CompareDialog
 from ui.widgets.mcp_server_dialog import MCPServerDialog
+from ui.widgets.message_view import REASONING_MESSAGE_PREFIX, MessageView
 from worker import Worker
+from worker_process import WorkerProcessClient
 
 BOOTSTRAP_QSS = """
 QWidget {
@@ -80,8 +94,22 @@ QTextEdit:disabled {
 QTextEdit:read-only {
     background: #e8e9ea;
 }
+QListView[panel="messages"] {
+    background: #fff;
+    border: 1px solid #ced4da;
+    border-radius: 4px;
+    color: #212529;
+}
 """
 
+MCP_STATUS_COLORS = {
+    "healthy": "#198754",
+    "starting": "#6c757d",
+    "down": "#dc3545",
+    "circuit_open": "#dc3545",
+    "idle": "#0d6efd",
+}
+
 
 class ChatWindow(QMainWindow):
     ollama_init_done = Signal()
@@ -94,6 +122,13 @@ class ChatWindow(QMainWindow):
         self.chat_history = ChatHistory()
         self.current_chat_index = -1
         self.is_new_chat = True
+        self.is_streaming_row_open = False
+        self.is_progress_row_open = False
+        self.is_reasoning_row_open = False
+        self.tool_partials = []
+        self.mcp_stats = {}
+        self.ollama_stats = {}
+        self.compare_dialog = None
 
         # make MCPManager instance
         self.mcp_manager = MCPManager()
@@ -105,6 +140,9 @@ class ChatWindow(QMainWindow):
         self.llm_model = self.config.get("llm_model", {}).get("value", "")
         self.ai_service = self.config.get("ai_service", {}).get("value", "")
         self.timeout = self.config.get("timeout", {}).get("value", 5 * 60)
+        self.cascade_large_model = self.config.get("cascade_large_model", {}).get(
+            "value", ""
+        )
 
         self.central_widget = QWidget()
         self.main_layout = QHBoxLayout()
@@ -136,6 +174,17 @@ class ChatWindow(QMainWindow):
                     self.chat_history_list.itemClicked.connect(self.selectChatHistory)
                     self.sidebar_layout.addWidget(self.chat_history_list)
                     self.refreshChatHistoryList()
+
+                    self.search_input = QLineEdit()
+                    self.search_input.setPlaceholderText("Search all chats")
+                    self.search_input.textChanged.connect(self.searchChatHistory)
+                    self.sidebar_layout.addWidget(self.search_input)
+
+                    self.search_result_list = QListWidget()
+                    self.search_result_list.setMaximumHeight(150)
+                    self.search_result_list.setVisible(False)
+                    self.search_result_list.itemClicked.connect(self.selectSearchResult)
+                    self.sidebar_layout.addWidget(self.search_result_list)
                     # === End Chat history section ===
 
                     self.servers_label_layout = QHBoxLayout()
@@ -168,6 +217,9 @@ class ChatWindow(QMainWindow):
                     self.llm_info_list.addItem(f"LLM model: {self.llm_model}")
                     self.llm_info_list.addItem(f"TEMP: {self.temperature}")
                     self.llm_info_list.addItem(f"Timeout: {self.timeout} (s)")
+                    self.llm_info_list.addItem(
+                        f"Cascade model: {self.cascade_large_model or 'off'}"
+                    )
                     self.llm_info_list.addItem("Prompt: click to edit")
                     self.sidebar_layout.addWidget(self.llm_info_list)
 
@@ -183,8 +235,8 @@ class ChatWindow(QMainWindow):
                 self.chat_area.setFrameShape(QFrame.Shape.StyledPanel)
                 self.chat_layout = QVBoxLayout()
                 if self.chat_layout:
-                    self.chat_display = QTextEdit()
-                    self.chat_display.setReadOnly(True)
+                    self.chat_display = MessageView()
+                    self.chat_display.setProperty("panel", "messages")
                     self.chat_layout.addWidget(self.chat_display)
 
                     self.input_layout = QHBoxLayout()
@@ -198,9 +250,16 @@ class ChatWindow(QMainWindow):
                     self.send_button = QPushButton("&Send")
                     self.send_button.clicked.connect(self.sendMessage)
                     self.input_layout.addWidget(self.send_button)
+                    self.stop_button = QPushButton("S&top")
+                    self.stop_button.setEnabled(False)
+                    self.stop_button.clicked.connect(self.stopQuery)
+                    self.input_layout.addWidget(self.stop_button)
                     self.clear_button = QPushButton("&Clear")
                     self.clear_button.clicked.connect(self.clearChat)
                     self.input_layout.addWidget(self.clear_button)
+                    self.compare_button = QPushButton("Co&mpare")
+                    self.compare_button.clicked.connect(self.openCompareDialog)
+                    self.input_layout.addWidget(self.compare_button)
                     self.chat_layout.addLayout(self.input_layout)
                 self.chat_area.setLayout(self.chat_layout)
 
@@ -214,11 +273,18 @@ class ChatWindow(QMainWindow):
         self.in_queue = queue.Queue()
         self.out_queue = queue.Queue()
 
-        self.worker_thread = QThread()
-        self.worker = Worker(self.in_queue, self.out_queue)
-        self.worker.moveToThread(self.worker_thread)
-        self.worker_thread.started.connect(self.worker.run)
-        self.worker_thread.start()
+        self.worker_thread = None
+        if self.config.get("worker_process", {}).get("value", False):
+            # agent in a child process; the client provides its own queues
+            self.worker = WorkerProcessClient()
+            self.in_queue = self.worker.in_queue
+            self.out_queue = self.worker.out_queue
+        else:
+            self.worker_thread = QThread()
+            self.worker = Worker(self.in_queue, self.out_queue)
+            self.worker.moveToThread(self.worker_thread)
+            self.worker_thread.started.connect(self.worker.run)
+            self.worker_thread.start()
 
         # check out_queue periodically
         self.timer = QTimer()
@@ -244,20 +310,75 @@ class ChatWindow(QMainWindow):
                 if event_type == "init_done":
                     self.onInitDone()
                     self.toggleInput(True)
+                elif event_type == "chat_reasoning":
+                    # shown collapsed and never saved to the chat history
+                    if self.is_reasoning_row_open:
+                        self.chat_display.appendToLast(event[EVENT_DATA])
+                    else:
+                        self.chat_display.append(
+                            f"{REASONING_MESSAGE_PREFIX}\n{event[EVENT_DATA]}"
+                        )
+                        self.is_reasoning_row_open = True
+                        self.is_streaming_row_open = False
+                elif event_type == "chat_token":
+                    self.is_reasoning_row_open = False
+                    if self.is_streaming_row_open:
+                        self.chat_display.appendToLast(event[EVENT_DATA])
+                    else:
+                        self.chat_display.append(event[EVENT_DATA])
+                        self.is_streaming_row_open = True
+                elif event_type == "chat_step_text":
+                    # text the model wrote before calling tools: shown like
+                    # reasoning, collapsed and not saved as part of the answer
+                    text = event[EVENT_DATA]
+                    last = self.chat_display.lastMessage()
+                    if self.is_streaming_row_open and last.endswith(text):
+                        step_row = f"{REASONING_MESSAGE_PREFIX}\n{text}"
+                        answer = last[: -len(text)]
+                        if answer:
+                            self.chat_display.replaceLast(answer)
+                            self.chat_display.append(step_row)
+                        else:
+                            self.chat_display.replaceLast(step_row)
+                    self.is_streaming_row_open = False
+                    self.is_reasoning_row_open = False
+                elif event_type == "tool_progress":
+                    self.showToolProgress(event[EVENT_DATA])
                 elif event_type == "chat_message":
-                    self.chat_display.append(event[EVENT_DATA])
+                    self.is_streaming_row_open = False
+                    self.is_reasoning_row_open = False
+                    if self.is_progress_row_open:
+                        # the tool result replaces its progress line
+                        self.chat_display.replaceLast(event[EVENT_DATA])
+                        self.closeProgressRow()
+                    else:
+                        self.chat_display.append(event[EVENT_DATA])
                     if self.current_chat_index > -1 and self.is_new_chat is False:
                         self.chat_history.addMessage(
-                            self.current_chat_index, event[EVENT_DATA]
+                            self.current_chat_index,
+                            recordFromText(event[EVENT_DATA], model=self.llm_model),
                         )
                 elif event_type == "chat_result":
                     try:
-                        output = event[EVENT_DATA]["output"]
-                        self.chat_display.append(output)
+                        result = event[EVENT_DATA]
+                        output = result["output"]
+                        if not result.get("streamed"):
+                            # tokens were not streamed, so show the final answer
+                            self.chat_display.append(output)
+                        self.is_streaming_row_open = False
+                        self.is_reasoning_row_open = False
+                        self.closeProgressRow()
                         self.input_line.setFocus()
                         if self.current_chat_index > -1 and self.is_new_chat is False:
                             self.chat_history.addMessage(
-                                self.current_chat_index, output
+                                self.current_chat_index,
+                                makeRecord(
+                                    ROLE_ASSISTANT,
+                                    output,
+                                    model=self.llm_model,
+                                    tokens=result.get("usage"),
+                                    duration=result.get("duration"),
+                                ),
                             )
                     except KeyError:
                         print(f"Error: {event[EVENT_DATA]}")
@@ -265,26 +386,125 @@ class ChatWindow(QMainWindow):
                         if self.current_chat_index > -1 and self.is_new_chat is False:
                             self.chat_history.addMessage(
                                 self.current_chat_index,
-                                "Error: output not found in response.",
+                                makeRecord(
+                                    ROLE_ERROR,
+                                    "output not found in response.",
+                                    model=self.llm_model,
+                                ),
                             )
                     finally:
                         self.toggleInput(True)
                 elif event_type == "chat_error":
+                    self.is_streaming_row_open = False
+                    self.is_reasoning_row_open = False
+                    self.closeProgressRow()
                     self.chat_display.append(f"Error: {event[EVENT_DATA]}")
+                    if self.compare_dialog:
+                        self.compare_dialog.setRunning(False)
                     if self.current_chat_index > -1 and self.is_new_chat is False:
                         self.chat_history.addMessage(
-                            self.current_chat_index, f"Error: {event[EVENT_DATA]}"
+                            self.current_chat_index,
+                            makeRecord(
+                                ROLE_ERROR, str(event[EVENT_DATA]), model=self.llm_model
+                            ),
                         )
                     self.toggleInput(True)
+                elif event_type == "ollama_status":
+                    self.updateOllamaStatus(event[EVENT_DATA])
+                elif event_type == "mcp_status":
+                    self.updateMCPStatus(event[EVENT_DATA])
+                elif event_type in ("compare_token", "compare_model_done"):
+                    if self.compare_dialog:
+                        self.compare_dialog.handleEvent(event)
+                elif event_type == "compare_result":
+                    if self.compare_dialog:
+                        self.compare_dialog.handleEvent(event)
+                    self.toggleInput(True)
                 elif event_type == "system_message":
                     self.chat_display.append(event[EVENT_DATA])
                     if self.current_chat_index > -1 and self.is_new_chat is False:
                         self.chat_history.addMessage(
-                            self.current_chat_index, event[EVENT_DATA]
+                            self.current_chat_index,
+                            makeRecord(ROLE_SYSTEM, event[EVENT_DATA]),
                         )
         except queue.Empty:
             pass
 
+    def showToolProgress(self, progress):
+        """Show a running tool's progress and latest partial output in one row."""
+        if progress.get("partial"):
+            self.tool_partials.extend(progress["partial"].splitlines())
+            del self.tool_partials[:-TOOL_PARTIAL_LINES]
+        line = f"[{progress['tool']}] running..."
+        if progress.get("progress") is not None:
+            line = f"[{progress['tool']}] {progress['progress']:g}"
+            if progress.get("total"):
+                percent = progress["progress"] / progress["total"] * 100
+                line += f"/{progress['total']:g} ({percent:.0f}%)"
+        text = "\n".join([line] + self.tool_partials)
+        if self.is_progress_row_open:
+            self.chat_display.replaceLast(text)
+        else:
+            self.chat_display.append(text)
+            self.is_progress_row_open = True
+            self.is_reasoning_row_open = False
+            self.is_streaming_row_open = False
+
+    def closeProgressRow(self):
+        self.is_progress_row_open = False
+        self.is_reasoning_row_open = False
+        self.tool_partials = []
+
+    def stopQuery(self):
+        self.stop_button.setEnabled(False)
+        self.worker.cancelQuery()
+
+    def updateMCPStatus(self, stats):
+        self.mcp_stats = stats
+        for row in range(self.tools_list.count()):
+            item = self.tools_list.item(row)
+            server_stats = stats.get(item.text())
+            if server_stats is None:
+                item.setToolTip("Not running (restart to apply config changes)")
+                item.setForeground(QColor("#6c757d"))
+                continue
+            ping = server_stats["ping_ms"]
+            call = server_stats["call_ms"]
+            lines = [
+                f"Status: {server_stats['status']}",
+                f"Uptime: {server_stats['uptime']:.0f} s",
+                f"Restarts: {server_stats['restarts']}",
+                f"Tools: {server_stats['tools']}",
+                f"Ping: {ping:.1f} ms" if ping is not None else "Ping: -",
+                f"Tool call (median): {call:.1f} ms" if call is not None else "Tool call: -",
+            ]
+            if server_stats.get("url"):
+                lines.insert(1, f"URL: {server_stats['url']}")
+            if server_stats["last_error"]:
+                lines.append(f"Last error: {server_stats['last_error']}")
+            item.setToolTip("\n".join(lines))
+            item.setForeground(
+                QColor(MCP_STATUS_COLORS.get(server_stats["status"], "#212529"))
+            )
+
+    def updateOllamaStatus(self, stats):
+        self.ollama_stats = stats
+        item = self.llm_info_list.item(1)  # "LLM model" row
+        if item is None or not stats:
+            return
+        lines = []
+        for url, endpoint_stats in stats.items():
+            first_token = endpoint_stats["first_token_ms"]
+            total = endpoint_stats["total_ms"]
+            lines.append(
+                f"{url} [{'up' if endpoint_stats['healthy'] else 'down'}] "
+                f"requests: {endpoint_stats['requests']}, "
+                f"in flight: {endpoint_stats['in_flight']}, "
+                f"first token: {f'{first_token:.0f} ms' if first_token is not None else '-'}, "
+                f"total: {f'{total:.0f} ms' if total is not None else '-'}"
+            )
+        item.setToolTip("\n".join(lines))
+
     def onInitDone(self):
         print("Initialization done. Enable input.")
         self.agent_initialized = True
@@ -294,10 +514,12 @@ class ChatWindow(QMainWindow):
 
     def toggleInput(self, is_enabled=True):
         self.input_line.setEnabled(is_enabled)
-        self.chat_display.setReadOnly(not is_enabled)
         self.input_line.setEnabled(is_enabled)
         self.send_button.setEnabled(is_enabled)
         self.clear_button.setEnabled(is_enabled)
+        self.compare_button.setEnabled(is_enabled)
+        # only a running query can be stopped
+        self.stop_button.setEnabled(not is_enabled and self.agent_initialized)
 
     def sendMessage(self):
         message = self.input_line.text()
@@ -306,6 +528,7 @@ class ChatWindow(QMainWindow):
                 f"\n-------------------------------\nYou: {message}"
             )
             self.in_queue.put({EVENT_TYPE: "chat", EVENT_DATA: message})
+            self.is_streaming_row_open = False
             self.input_line.clear()
             self.toggleInput(False)
             if self.is_new_chat:
@@ -313,14 +536,34 @@ class ChatWindow(QMainWindow):
                 title = message[:10] + ("..." if len(message) > 10 else "")
                 settings_info = f"[Settings] AI: {self.ai_service}, Model: {self.llm_model}, Temp: {self.temperature}"
                 self.current_chat_index = self.chat_history.createChat(
-                    title, [settings_info, f"You: {message}"]
+                    title,
+                    [
+                        makeRecord(ROLE_SETTINGS, settings_info, model=self.llm_model),
+                        makeRecord(ROLE_USER, message, model=self.llm_model),
+                    ],
                 )
                 self.is_new_chat = False
                 self.refreshChatHistoryList()
                 self.chat_history_list.setCurrentRow(self.current_chat_index)
                 self.new_chat_button.setEnabled(True)
             else:
-                self.chat_history.addMessage(self.current_chat_index, f"You: {message}")
+                self.chat_history.addMessage(
+                    self.current_chat_index,
+                    makeRecord(ROLE_USER, message, model=self.llm_model),
+                )
+
+    def openCompareDialog(self):
+        if self.compare_dialog is None:
+            models = self.config.get("compare_models", {}).get("value", []) or [
+                model for model in (self.llm_model, self.cascade_large_model) if model
+            ]
+            self.compare_dialog = CompareDialog(
+                self.in_queue, models, self.input_line.text(), parent=self
+            )
+        elif self.input_line.text():
+            self.compare_dialog.prompt_edit.setText(self.input_line.text())
+        self.compare_dialog.show()
+        self.compare_dialog.raise_()
 
     def clearChat(self):
         self.chat_display.clear()
@@ -335,6 +578,7 @@ class ChatWindow(QMainWindow):
             mcp_servers = mcp_config.get("mcpServers", {})
             for name in mcp_servers.keys():
                 self.tools_list.addItem(name)
+            self.updateMCPStatus(self.mcp_stats)
 
     def openNewMCPServerDialog(self):
         dialog = MCPServerDialog(None, self)
@@ -344,6 +588,7 @@ class ChatWindow(QMainWindow):
             mcp_servers = mcp_config.get("mcpServers", {})
             for name in mcp_servers.keys():
                 self.tools_list.addItem(name)
+            self.updateMCPStatus(self.mcp_stats)
 
     def openAISettingDialog(self, item):
         key_map = [
@@ -351,6 +596,7 @@ class ChatWindow(QMainWindow):
             "llm_model",
             "temperature",
             "timeout",
+            "cascade_large_model",
             "prompt",
         ]
         idx = self.llm_info_list.row(item)
@@ -366,7 +612,11 @@ class ChatWindow(QMainWindow):
             self.llm_info_list.addItem(f"LLM model: {self.llm_model}")
             self.llm_info_list.addItem(f"TEMP: {self.temperature}")
             self.llm_info_list.addItem(f"Timeout: {self.timeout} (s)")
+            self.llm_info_list.addItem(
+                f"Cascade model: {self.cascade_large_model or 'off'}"
+            )
             self.llm_info_list.addItem("System prompt: click to edit")
+            self.updateOllamaStatus(self.ollama_stats)
 
             # display changed settings in chat window
             changed_msg = f"[Settings changed] {key} value changed: {getattr(self, key) if hasattr(self, key) else self.system_prompt}"
@@ -374,7 +624,10 @@ class ChatWindow(QMainWindow):
 
             # record changed settings in current chat history
             if self.current_chat_index >= 0 and not self.is_new_chat:
-                self.chat_history.addMessage(self.current_chat_index, changed_msg)
+                self.chat_history.addMessage(
+                    self.current_chat_index,
+                    makeRecord(ROLE_SETTINGS, changed_msg, model=self.llm_model),
+                )
 
     def loadAppSettings(self):
         self.config = AppSettings().getAll()
@@ -383,12 +636,16 @@ class ChatWindow(QMainWindow):
         self.llm_model = self.config.get("llm_model", {}).get("value", "")
         self.ai_service = self.config.get("ai_service", {}).get("value", "")
         self.timeout = self.config.get("timeout", {}).get("value", 5 * 60)
+        self.cascade_large_model = self.config.get("cascade_large_model", {}).get(
+            "value", ""
+        )
         return self.config
 
     def closeEvent(self, event):
         self.worker.stop()
-        self.worker_thread.quit()
-        self.worker_thread.wait()
+        if self.worker_thread:
+            self.worker_thread.quit()
+            self.worker_thread.wait()
         super().closeEvent(event)
 
     def refreshChatHistoryList(self, add_new_chat=False):
@@ -409,11 +666,12 @@ class ChatWindow(QMainWindow):
         self.current_chat_index = idx
         max_idx = self.chat_history_list.count() - 1
         # reset chat display
-        self.chat_display.clear()
         if idx != max_idx or not self.is_new_chat:
-            messages = self.chat_history.getMessages(self.current_chat_index)
-            for msg in messages:
-                self.chat_display.append(msg)
+            self.chat_display.setMessages(
+                self.chat_history.getDisplayMessages(self.current_chat_index)
+            )
+        else:
+            self.chat_display.clear()
         # enable/disable new chat button
         if self.is_new_chat:
             self.new_chat_button.setEnabled(False)
@@ -425,6 +683,37 @@ class ChatWindow(QMainWindow):
         else:
             self.toggleInput(False)
 
+    def searchChatHistory(self, text):
+        self.search_result_list.clear()
+        if not text.strip():
+            self.search_result_list.setVisible(False)
+            return
+        results = self.chat_history.searchMessages(text)
+        for result in results:
+            snippet = ChatSearchIndex.snippetToHtml(" ".join(result["snippet"].split()))
+            label = QLabel(f"<i>{html.escape(result['title'])}</i>: {snippet}")
+            label.setTextFormat(Qt.TextFormat.RichText)
+            item = QListWidgetItem()
+            item.setData(
+                Qt.ItemDataRole.UserRole,
+                (result["chat_index"], result["message_index"]),
+            )
+            item.setSizeHint(label.sizeHint())
+            self.search_result_list.addItem(item)
+            self.search_result_list.setItemWidget(item, label)
+        if not results:
+            self.search_result_list.addItem("No results")
+        self.search_result_list.setVisible(True)
+
+    def selectSearchResult(self, item):
+        target = item.data(Qt.ItemDataRole.UserRole)
+        if not target:
+            return
+        chat_index, message_index = target
+        self.chat_history_list.setCurrentRow(chat_index)
+        self.selectChatHistory(self.chat_history_list.item(chat_index))
+        self.chat_display.scrollToMessage(message_index)
+
     def setNewChatState(self):
         self.is_new_chat = True
         self.refreshChatHistoryList(add_new_chat=True)
@@ -0,0 +1,138 @@
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QTextCursor
+from PySide6.QtWidgets import (
+    QDialog,
+    QHBoxLayout,
+    QLabel,
+    QLineEdit,
+    QPlainTextEdit,
+    QPushButton,
+    QSplitter,
+    QVBoxLayout,
+    QWidget,
+)
+
+from agent.model_compare import COMPARE_RESULTS_FILE
+from constants import EVENT_DATA, EVENT_TYPE
+
+
+def formatMetrics(metrics):
+    def value(key, unit="", digits=0):
+        number = metrics.get(key)
+        return f"{number:.{digits}f}{unit}" if number is not None else "-"
+
+    lines = [
+        f"First token: {value('ttft_ms', ' ms')}   Total: {value('total_ms', ' ms')}",
+        f"Speed: {value('tokens_per_s', ' tok/s', 1)}   Output: {value('output_tokens')} tokens",
+        f"Prompt: {value('prompt_tokens')} tokens   Tool calls: {metrics.get('tool_calls', 0)}",
+    ]
+    if metrics.get("error"):
+        lines.append(f"Error: {metrics['error']}")
+    return "\n".join(lines)
+
+
+class ComparePane(QWidget):
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(4, 4, 4, 4)
+        self.setLayout(layout)
+        self.title = QLabel(f"<b>{model}</b>")
+        layout.addWidget(self.title)
+        self.output = QPlainTextEdit()
+        self.output.setReadOnly(True)
+        layout.addWidget(self.output, stretch=1)
+        self.metrics = QLabel("Waiting...")
+        self.metrics.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.metrics)
+
+    def appendText(self, text):
+        self.output.moveCursor(QTextCursor.MoveOperation.End)
+        self.output.insertPlainText(text)
+        self.metrics.setText("Answering...")
+
+    def showMetrics(self, metrics):
+        self.metrics.setText(formatMetrics(metrics))
+
+
+class CompareDialog(QDialog):
+    """
+    Sends the same prompt to several models at once through the worker and
+    shows each answer in its own pane with latency and token metrics.
+    """
+
+    def __init__(self, in_queue, models, query="", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Compare models")
+        self.resize(1100, 650)
+        self.in_queue = in_queue
+        self.panes = []
+        self.running = False
+
+        self.layout = QVBoxLayout()
+        self.setLayout(self.layout)
+
+        self.models_layout = QHBoxLayout()
+        self.models_layout.addWidget(QLabel("Models:"))
+        self.models_edit = QLineEdit(", ".join(models))
+        self.models_edit.setPlaceholderText("qwen3:4b, qwen3:14b")
+        self.models_layout.addWidget(self.models_edit)
+        self.layout.addLayout(self.models_layout)
+
+        self.prompt_layout = QHBoxLayout()
+        self.prompt_edit = QLineEdit(query)
+        self.prompt_edit.setPlaceholderText("Prompt to send to every model")
+        self.prompt_edit.returnPressed.connect(self.runComparison)
+        self.prompt_layout.addWidget(self.prompt_edit)
+        self.run_button = QPushButton("&Run")
+        self.run_button.clicked.connect(self.runComparison)
+        self.prompt_layout.addWidget(self.run_button)
+        self.layout.addLayout(self.prompt_layout)
+
+        self.splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.layout.addWidget(self.splitter, stretch=1)
+        self.status_label = QLabel(f"Results are appended to {COMPARE_RESULTS_FILE}.")
+        self.layout.addWidget(self.status_label)
+
+    def getModels(self):
+        return [m.strip() for m in self.models_edit.text().split(",") if m.strip()]
+
+    def runComparison(self):
+        models = self.getModels()
+        query = self.prompt_edit.text().strip()
+        if self.running or not models or not query:
+            return
+        for pane in self.panes:
+            pane.setParent(None)
+            pane.deleteLater()
+        self.panes = [ComparePane(model) for model in models]
+        for pane in self.panes:
+            self.splitter.addWidget(pane)
+        self.setRunning(True)
+        self.status_label.setText(f"Running {len(models)} models...")
+        self.in_queue.put(
+            {EVENT_TYPE: "compare", EVENT_DATA: {"query": query, "models": models}}
+        )
+        if self.parent():
+            self.parent().toggleInput(False)
+
+    def setRunning(self, running):
+        self.running = running
+        self.run_button.setEnabled(not running)
+
+    def handleEvent(self, event):
+        event_type, data = event[EVENT_TYPE], event[EVENT_DATA]
+        if event_type == "compare_token":
+            if data["index"] < len(self.panes):
+                self.panes[data["index"]].appendText(data["text"])
+        elif event_type == "compare_model_done":
+            if data["index"] < len(self.panes):
+                self.panes[data["index"]].showMetrics(data)
+        elif event_type == "compare_result":
+            self.setRunning(False)
+            if "error" in data:
+                self.status_label.setText(data["error"])
+            else:
+                self.status_label.setText(
+                    f"Done. Results appended to {COMPARE_RESULTS_FILE}."
+                )
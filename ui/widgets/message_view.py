@@ -0,0 +1,311 @@
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QRect, QSize, Qt
+from PySide6.QtGui import QGuiApplication, QKeySequence
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QListView,
+    QStyle,
+    QStyledItemDelegate,
+)
+
+TOOL_MESSAGE_PREFIX = "Tool Used:"
+REASONING_MESSAGE_PREFIX = "Thinking:"
+COLLAPSED_LINES = 8
+COLLAPSED_CHARS = 1200
+ROW_PADDING = 6
+LAYOUT_BATCH_SIZE = 50
+
+
+class MessageListModel(QAbstractListModel):
+    """
+    Holds chat messages as plain strings. Long tool outputs and model
+    reasoning are shown collapsed until the user expands them.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.messages = []
+        self.expanded_rows = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.messages):
+            return None
+        text = self.messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if self.isCollapsed(index.row()):
+                return self.collapse(text)
+            return text
+        if role == Qt.ItemDataRole.ToolTipRole and self.isCollapsible(text):
+            return "Double-click to expand or collapse"
+        return None
+
+    @staticmethod
+    def isCollapsible(text):
+        if text.startswith(REASONING_MESSAGE_PREFIX):
+            return True
+        return text.startswith(TOOL_MESSAGE_PREFIX) and (
+            len(text) > COLLAPSED_CHARS or text.count("\n") >= COLLAPSED_LINES
+        )
+
+    def isCollapsed(self, row):
+        return row not in self.expanded_rows and self.isCollapsible(self.messages[row])
+
+    @staticmethod
+    def collapse(text):
+        if text.startswith(REASONING_MESSAGE_PREFIX):
+            return (
+                f"{REASONING_MESSAGE_PREFIX} ({len(text) - len(REASONING_MESSAGE_PREFIX):,}"
+                " chars - double-click to expand)"
+            )
+        lines = text.splitlines()
+        head = "\n".join(lines[:COLLAPSED_LINES])[:COLLAPSED_CHARS]
+        hidden = max(len(lines) - COLLAPSED_LINES, 0)
+        return f"{head}\n... ({hidden} more lines, {len(text):,} chars - double-click to expand)"
+
+    def toggleExpanded(self, row):
+        if not 0 <= row < len(self.messages):
+            return
+        if not self.isCollapsible(self.messages[row]):
+            return
+        if row in self.expanded_rows:
+            self.expanded_rows.remove(row)
+        else:
+            self.expanded_rows.add(row)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def appendMessage(self, text):
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(text)
+        self.endInsertRows()
+
+    def appendText(self, row, text):
+        if not 0 <= row < len(self.messages):
+            return
+        self.messages[row] += text
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def setText(self, row, text):
+        if not 0 <= row < len(self.messages):
+            return
+        self.messages[row] = text
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def setMessages(self, messages):
+        self.beginResetModel()
+        self.messages = [str(msg) for msg in messages]
+        self.expanded_rows = set()
+        self.endResetModel()
+
+    def clear(self):
+        self.setMessages([])
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """
+    Paints a message as wrapped plain text. Row heights are measured only when
+    the view asks for them and cached per row; the view drops a row's entry
+    when its text or collapsed state changes and the whole cache on resize.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.size_cache = {}
+
+    def clearCache(self):
+        self.size_cache = {}
+
+    def invalidateRows(self, first, last):
+        for row in range(first, last + 1):
+            self.size_cache.pop(row, None)
+
+    def textRect(self, option):
+        return option.rect.adjusted(ROW_PADDING, ROW_PADDING, -ROW_PADDING, -ROW_PADDING)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        painter.setFont(option.font)
+        painter.drawText(
+            self.textRect(option),
+            Qt.TextFlag.TextWordWrap,
+            index.data(Qt.ItemDataRole.DisplayRole) or "",
+        )
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        view = self.parent()
+        width = max(view.viewport().width() if view else option.rect.width(), 100)
+        cached = self.size_cache.get(index.row())
+        if cached is not None:
+            return cached
+        text = index.data(Qt.ItemDataRole.DisplayRole) or ""
+        bounds = option.fontMetrics.boundingRect(
+            QRect(0, 0, width - 2 * ROW_PADDING, 1_000_000),
+            Qt.TextFlag.TextWordWrap,
+            text,
+        )
+        size = QSize(width, bounds.height() + 2 * ROW_PADDING)
+        self.size_cache[index.row()] = size
+        return size
+
+
+class MessageView(QListView):
+    """
+    Virtualized replacement for the QTextEdit chat display. Only visible rows
+    are painted and rows are laid out in batches between events, so opening
+    a long chat blocks the UI only for the first batch; the view moves to the
+    bottom, or to the message asked for, once the rows it needs are laid out.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.message_model = MessageListModel(self)
+        self.message_delegate = MessageDelegate(self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(self.message_delegate)
+        self.setUniformItemSizes(False)
+        self.setWordWrap(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(LAYOUT_BATCH_SIZE)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.doubleClicked.connect(self.onDoubleClicked)
+        self.message_model.dataChanged.connect(self.onDataChanged)
+        self.last_width = 0
+        self.scroll_to_bottom_pending = False
+        self.scroll_to_row_pending = None
+        # the user scrolled while a long chat was loading; stay there
+        self.verticalScrollBar().actionTriggered.connect(self.cancelPendingScroll)
+
+    def append(self, text):
+        at_bottom = (
+            self.verticalScrollBar().value() >= self.verticalScrollBar().maximum()
+        )
+        self.message_model.appendMessage(str(text))
+        if at_bottom:
+            self.scrollToBottom()
+
+    def appendToLast(self, text):
+        """Extend the last message in place, e.g. with a streamed token delta."""
+        row = self.message_model.rowCount() - 1
+        if row < 0:
+            self.append(text)
+            return
+        at_bottom = (
+            self.verticalScrollBar().value() >= self.verticalScrollBar().maximum()
+        )
+        self.message_model.appendText(row, str(text))
+        if at_bottom:
+            self.scrollToBottom()
+
+    def replaceLast(self, text):
+        """Overwrite the last message in place, e.g. a tool progress line."""
+        row = self.message_model.rowCount() - 1
+        if row < 0:
+            self.append(text)
+            return
+        at_bottom = (
+            self.verticalScrollBar().value() >= self.verticalScrollBar().maximum()
+        )
+        self.message_model.setText(row, str(text))
+        if at_bottom:
+            self.scrollToBottom()
+
+    def lastMessage(self):
+        return self.message_model.messages[-1] if self.message_model.messages else ""
+
+    def setMessages(self, messages):
+        self.message_delegate.clearCache()
+        self.message_model.setMessages(messages)
+        # rows are laid out in batches from the top; scroll once the last
+        # batch is in, since scrolling now would only reach the first batch
+        self.scroll_to_bottom_pending = self.message_model.rowCount() > 0
+        self.scroll_to_row_pending = None
+
+    def cancelPendingScroll(self, *_args):
+        self.scroll_to_bottom_pending = False
+        self.scroll_to_row_pending = None
+
+    def isLaidOut(self, row):
+        return self.visualRect(self.message_model.index(row)).isValid()
+
+    def canScrollTo(self, row):
+        """The row is laid out and the scroll range already reaches its top."""
+        rect = self.visualRect(self.message_model.index(row))
+        if not rect.isValid():
+            return False
+        if self.isLaidOut(self.message_model.rowCount() - 1):
+            return True
+        scroll_bar = self.verticalScrollBar()
+        return scroll_bar.value() + rect.top() <= scroll_bar.maximum()
+
+    def timerEvent(self, event):
+        # delayed and batched layouts both run from timer events
+        super().timerEvent(event)
+        if self.scroll_to_bottom_pending and self.isLaidOut(
+            self.message_model.rowCount() - 1
+        ):
+            self.scroll_to_bottom_pending = False
+            self.scrollToBottom()
+        if self.scroll_to_row_pending is not None and self.canScrollTo(
+            self.scroll_to_row_pending
+        ):
+            row, self.scroll_to_row_pending = self.scroll_to_row_pending, None
+            self.scrollTo(
+                self.message_model.index(row),
+                QAbstractItemView.ScrollHint.PositionAtTop,
+            )
+
+    def clear(self):
+        self.message_delegate.clearCache()
+        self.message_model.clear()
+        self.cancelPendingScroll()
+
+    def scrollToMessage(self, row):
+        index = self.message_model.index(row)
+        if not index.isValid():
+            return
+        self.scroll_to_bottom_pending = False
+        self.setCurrentIndex(index)
+        if self.canScrollTo(row):
+            self.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtTop)
+        else:
+            # a chat that was just opened is still being laid out in batches
+            self.scroll_to_row_pending = row
+
+    def onDoubleClicked(self, index):
+        self.message_model.toggleExpanded(index.row())
+
+    def onDataChanged(self, top_left, bottom_right, roles=()):
+        # streamed text or expanding/collapsing changes the row height
+        self.message_delegate.invalidateRows(top_left.row(), bottom_right.row())
+        self.scheduleDelayedItemsLayout()
+
+    def resizeEvent(self, event):
+        if event.size().width() != self.last_width:
+            self.last_width = event.size().width()
+            self.message_delegate.clearCache()
+        super().resizeEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            QGuiApplication.clipboard().setText(
+                "\n".join(self.message_model.messages[row] for row in rows)
+            )
+            return
+        super().keyPressEvent(event)
@@ -1,13 +1,61 @@
 import asyncio
+import os
 import queue
 
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from PySide6.QtCore import QObject, Signal
 
+from agent.cassette import MODE_RECORD, MODE_REPLAY, Cassette
 from agent.llm_ollama import OllamaAgentManager
 from app_settings import AppSettings
-from constants import EVENT_DATA, EVENT_TYPE
+from constants import (
+    DEFAULT_AGENT_STEP_BUDGET,
+    DEFAULT_CASCADE_STEP_BUDGET,
+    DEFAULT_CASSETTE_FILE,
+    DEFAULT_FAN_OUT_MAX_PARALLEL,
+    DEFAULT_FAN_OUT_MAX_SUBTASKS,
+    DEFAULT_LOOP_REPEAT_LIMIT,
+    DEFAULT_MCP_IDLE_SHUTDOWN,
+    DEFAULT_MEMORY_EMBEDDING_MODEL,
+    DEFAULT_MEMORY_TOKEN_BUDGET,
+    DEFAULT_MEMORY_TOP_K,
+    DEFAULT_NUM_CTX_BUCKETS,
+    DEFAULT_NUM_CTX_MAX,
+    DEFAULT_NUM_PREDICT_FINAL_ANSWER,
+    DEFAULT_NUM_PREDICT_TOOL_STEP,
+    DEFAULT_PREFETCH_ALLOWED_DIRS,
+    DEFAULT_PREFETCH_MAX_KB,
+    DEFAULT_READ_ONLY_TOOLS,
+    DEFAULT_TOOL_ROUTER_TOP_K,
+    EVENT_DATA,
+    EVENT_TYPE,
+)
 from mcp_server.mcp_manager import MCPManager
+from mcp_server.mcp_supervisor import MCPSupervisor
+from mcp_server.tool_catalog import ToolCatalog
+from metrics import (
+    DEFAULT_METRICS_DUMP_INTERVAL,
+    DEFAULT_METRICS_FILE,
+    REGISTRY,
+    MetricsExporter,
+)
+
+CHAT_HISTORY_FILE = "chat_history.json"
+
+EVENTS = REGISTRY.counter(
+    "worker_events_total", "Events handled by the worker, by type.", labels=("type",)
+)
+EVENT_SECONDS = REGISTRY.histogram(
+    "worker_event_seconds", "Time the worker spent handling an event.", labels=("type",)
+)
+IN_QUEUE_DEPTH = REGISTRY.gauge(
+    "worker_in_queue_depth", "Events waiting for the worker."
+)
+OUT_QUEUE_DEPTH = REGISTRY.gauge(
+    "worker_out_queue_depth", "Events waiting for the UI."
+)
+CHAT_HISTORY_BYTES = REGISTRY.gauge(
+    "chat_history_bytes", "Size of chat_history.json on disk."
+)
 
 
 class Worker(QObject):
@@ -20,75 +68,353 @@ class Worker(QObject):
         self.running = True
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
-        self.mcp_client = None
+        self.mcp_supervisor = None
         self.mcp_tools = None
         self.agent_manager = None
+        self.current_task = None
+        # the tool set changed during a query; the agent is rebound after it
+        self.tools_rebind_pending = False
+        self.cassette = None
+        self.metrics_exporter = None
         self.mcp_manager = MCPManager()
+        REGISTRY.setCollector("worker", self.collectMetrics)
 
     def run(self):
         while self.running:
             try:
                 event = self.in_queue.get(timeout=0.1)
                 # event = {EVENT_TYPE: str, EVENT_DATA: Any}
-                if event[EVENT_TYPE] == "init":
-                    self.loop.run_until_complete(self.initializeMCP())
-                elif event[EVENT_TYPE] == "reset_chat":
-                    self.loadAppSettings()
-                    if self.agent_manager:
-                        self.agent_manager.reset(
-                            temperature=self.temperature, mcp_tools=self.mcp_tools
-                        )
-                elif event[EVENT_TYPE] == "chat":
-                    if self.agent_manager:
+                EVENTS.inc(type=event[EVENT_TYPE])
+                with EVENT_SECONDS.time(type=event[EVENT_TYPE]):
+                    if event[EVENT_TYPE] == "init":
+                        self.loop.run_until_complete(self.initializeMCP())
+                    elif event[EVENT_TYPE] == "reset_chat":
                         self.loadAppSettings()
-                        result = self.loop.run_until_complete(
-                            self.agent_manager.chat(
-                                event[EVENT_DATA],
-                                system_prompt=self.system_prompt,
-                                timeout=self.timeout,
-                                out_queue=self.out_queue,
+                        if self.agent_manager:
+                            self.agent_manager.reset(
+                                temperature=self.temperature, mcp_tools=self.mcp_tools
+                            )
+                    elif event[EVENT_TYPE] == "compare":
+                        # data = {"query": str, "models": [str]}
+                        if self.agent_manager:
+                            self.loadAppSettings()
+                            self.current_task = self.loop.create_task(
+                                self.agent_manager.compareModels(
+                                    event[EVENT_DATA]["query"],
+                                    event[EVENT_DATA]["models"],
+                                    system_prompt=self.system_prompt,
+                                    timeout=self.timeout,
+                                )
+                            )
+                            try:
+                                result = self.loop.run_until_complete(self.current_task)
+                            except asyncio.CancelledError:
+                                result = {"error": "Comparison cancelled."}
+                            finally:
+                                self.current_task = None
+                                self.applyPendingToolRebind()
+                            self.out_queue.put(
+                                {EVENT_TYPE: "compare_result", EVENT_DATA: result}
+                            )
+                    elif event[EVENT_TYPE] == "chat":
+                        if self.agent_manager:
+                            self.loadAppSettings()
+                            self.current_task = self.loop.create_task(
+                                self.agent_manager.chat(
+                                    event[EVENT_DATA],
+                                    system_prompt=self.system_prompt,
+                                    timeout=self.timeout,
+                                    out_queue=self.out_queue,
+                                )
+                            )
+                            try:
+                                result = self.loop.run_until_complete(self.current_task)
+                            except asyncio.CancelledError:
+                                self.loop.run_until_complete(
+                                    self.agent_manager.closeCancelledTurn()
+                                )
+                                self.out_queue.put(
+                                    {
+                                        EVENT_TYPE: "chat_error",
+                                        EVENT_DATA: "Query cancelled.",
+                                    }
+                                )
+                                continue
+                            finally:
+                                self.current_task = None
+                                self.applyPendingToolRebind()
+                            self.out_queue.put(
+                                {EVENT_TYPE: "chat_result", EVENT_DATA: result}
+                            )
+                            self.out_queue.put(
+                                {
+                                    EVENT_TYPE: "ollama_status",
+                                    EVENT_DATA: self.agent_manager.getEndpointStats(),
+                                }
                             )
-                        )
-                        self.out_queue.put(
-                            {EVENT_TYPE: "chat_result", EVENT_DATA: result}
-                        )
             except queue.Empty:
+                if self.mcp_supervisor and self.mcp_supervisor.isHealthCheckDue():
+                    self.loop.run_until_complete(self.mcp_supervisor.checkHealth())
+                    self.putMCPStatus()
                 continue
 
+    def cancelQuery(self):
+        """Cancel the running query. Safe to call from the UI thread."""
+        task = self.current_task
+        if task is not None and not task.done():
+            self.loop.call_soon_threadsafe(task.cancel)
+
     def stop(self):
         self.running = False
-        if self.mcp_client:
-            self.loop.run_until_complete(self.cleanupMCPClient(self.mcp_client))
+        if self.mcp_supervisor:
+            self.loop.run_until_complete(self.mcp_supervisor.stop())
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
         self.loop.close()
 
+    def collectMetrics(self):
+        """Registry collector: queue depths and chat history size."""
+        # a pipe-backed queue in process mode may not report its size
+        if hasattr(self.in_queue, "qsize"):
+            IN_QUEUE_DEPTH.set(self.in_queue.qsize())
+        if hasattr(self.out_queue, "qsize"):
+            OUT_QUEUE_DEPTH.set(self.out_queue.qsize())
+        if os.path.exists(CHAT_HISTORY_FILE):
+            CHAT_HISTORY_BYTES.set(os.path.getsize(CHAT_HISTORY_FILE))
+
+    def startMetricsExporter(self):
+        if self.metrics_exporter or not (self.metrics_port or self.metrics_file):
+            return
+        self.metrics_exporter = MetricsExporter(
+            REGISTRY,
+            port=self.metrics_port,
+            dump_file=self.metrics_file,
+            dump_interval=self.metrics_dump_interval,
+        )
+        self.metrics_exporter.start()
+
     def loadAppSettings(self):
         self.config = AppSettings().getAll()
         self.temperature = self.config.get("temperature", {}).get("value", 1)
         self.system_prompt = self.config.get("system_prompt", {}).get("value", "")
         self.timeout = self.config.get("timeout", {}).get("value", 5 * 60)
+        self.tool_router_top_k = self.config.get("tool_router_top_k", {}).get(
+            "value", DEFAULT_TOOL_ROUTER_TOP_K
+        )
+        self.pinned_tools = self.config.get("pinned_tools", {}).get("value", [])
+        self.response_cache_enabled = self.config.get(
+            "response_cache_enabled", {}
+        ).get("value", False)
+        self.response_cache_max_mb = self.config.get("response_cache_max_mb", {}).get(
+            "value", 100
+        )
+        self.read_only_tools = self.config.get("read_only_tools", {}).get(
+            "value", DEFAULT_READ_ONLY_TOOLS
+        )
+        self.ollama_endpoints = self.config.get("ollama_endpoints", {}).get(
+            "value", []
+        )
+        self.llm_model = self.config.get("llm_model", {}).get("value", "")
+        self.cascade_large_model = self.config.get("cascade_large_model", {}).get(
+            "value", ""
+        )
+        self.cascade_step_budget = self.config.get("cascade_step_budget", {}).get(
+            "value", DEFAULT_CASCADE_STEP_BUDGET
+        )
+        self.cascade_triggers = self.config.get("cascade_triggers", {}).get(
+            "value", None
+        )
+        self.strip_reasoning = self.config.get(
+            "strip_reasoning_from_context", {}
+        ).get("value", True)
+        self.agent_step_budget = self.config.get("agent_step_budget", {}).get(
+            "value", DEFAULT_AGENT_STEP_BUDGET
+        )
+        self.loop_repeat_limit = self.config.get("loop_repeat_limit", {}).get(
+            "value", DEFAULT_LOOP_REPEAT_LIMIT
+        )
+        self.cassette_mode = self.config.get("cassette_mode", {}).get("value", "")
+        self.cassette_file = self.config.get("cassette_file", {}).get(
+            "value", DEFAULT_CASSETTE_FILE
+        )
+        self.cassette_replay_speed = self.config.get(
+            "cassette_replay_speed", {}
+        ).get("value", 0.0)
+        self.mcp_lazy_start = self.config.get("mcp_lazy_start", {}).get("value", True)
+        self.mcp_idle_shutdown = self.config.get("mcp_idle_shutdown", {}).get(
+            "value", DEFAULT_MCP_IDLE_SHUTDOWN
+        )
+        self.prefetch_enabled = self.config.get("prefetch_enabled", {}).get(
+            "value", True
+        )
+        self.prefetch_allowed_dirs = self.config.get("prefetch_allowed_dirs", {}).get(
+            "value", DEFAULT_PREFETCH_ALLOWED_DIRS
+        )
+        self.prefetch_allowed_hosts = self.config.get(
+            "prefetch_allowed_hosts", {}
+        ).get("value", [])
+        self.prefetch_max_kb = self.config.get("prefetch_max_kb", {}).get(
+            "value", DEFAULT_PREFETCH_MAX_KB
+        )
+        self.memory_enabled = self.config.get("memory_enabled", {}).get(
+            "value", False
+        )
+        self.memory_embedding_model = self.config.get(
+            "memory_embedding_model", {}
+        ).get("value", DEFAULT_MEMORY_EMBEDDING_MODEL)
+        self.memory_top_k = self.config.get("memory_top_k", {}).get(
+            "value", DEFAULT_MEMORY_TOP_K
+        )
+        self.memory_token_budget = self.config.get("memory_token_budget", {}).get(
+            "value", DEFAULT_MEMORY_TOKEN_BUDGET
+        )
+        self.tool_result_diff = self.config.get("tool_result_diff", {}).get(
+            "value", True
+        )
+        self.adaptive_context = self.config.get("adaptive_context", {}).get(
+            "value", True
+        )
+        self.num_ctx_buckets = self.config.get("num_ctx_buckets", {}).get(
+            "value", DEFAULT_NUM_CTX_BUCKETS
+        )
+        self.num_ctx_max = self.config.get("num_ctx_max", {}).get(
+            "value", DEFAULT_NUM_CTX_MAX
+        )
+        self.num_predict_tool_step = self.config.get("num_predict_tool_step", {}).get(
+            "value", DEFAULT_NUM_PREDICT_TOOL_STEP
+        )
+        self.num_predict_final_answer = self.config.get(
+            "num_predict_final_answer", {}
+        ).get("value", DEFAULT_NUM_PREDICT_FINAL_ANSWER)
+        self.fan_out = self.config.get("fan_out", {}).get("value", False)
+        self.fan_out_max_parallel = self.config.get("fan_out_max_parallel", {}).get(
+            "value", DEFAULT_FAN_OUT_MAX_PARALLEL
+        )
+        self.fan_out_max_subtasks = self.config.get("fan_out_max_subtasks", {}).get(
+            "value", DEFAULT_FAN_OUT_MAX_SUBTASKS
+        )
+        self.metrics_port = self.config.get("metrics_port", {}).get("value", 0)
+        self.metrics_file = self.config.get("metrics_file", {}).get(
+            "value", DEFAULT_METRICS_FILE
+        )
+        self.metrics_dump_interval = self.config.get(
+            "metrics_dump_interval", {}
+        ).get("value", DEFAULT_METRICS_DUMP_INTERVAL)
+        if self.agent_manager:
+            self.configureAgentManager()
+
+    def configureAgentManager(self):
+        self.agent_manager.configureToolRouting(
+            self.tool_router_top_k, self.pinned_tools
+        )
+        self.agent_manager.configureReadOnlyTools(self.read_only_tools)
+        self.agent_manager.configureResponseCache(
+            self.response_cache_enabled, self.response_cache_max_mb * 1024 * 1024
+        )
+        self.agent_manager.configureEndpoints(self.ollama_endpoints)
+        self.agent_manager.configureContextSizing(
+            self.adaptive_context,
+            self.num_ctx_buckets,
+            self.num_ctx_max,
+            self.num_predict_tool_step,
+            self.num_predict_final_answer,
+        )
+        self.agent_manager.configureModel(self.llm_model)
+        self.agent_manager.configureCascade(
+            self.cascade_large_model,
+            step_budget=self.cascade_step_budget,
+            triggers=self.cascade_triggers,
+        )
+        self.agent_manager.configureReasoning(self.strip_reasoning)
+        self.agent_manager.configureLoopGuard(
+            self.agent_step_budget, self.loop_repeat_limit
+        )
+        self.agent_manager.configurePrefetch(
+            self.prefetch_enabled,
+            self.prefetch_allowed_dirs,
+            self.prefetch_allowed_hosts,
+            self.prefetch_max_kb * 1024,
+        )
+        self.agent_manager.configureMemory(
+            self.memory_enabled,
+            self.memory_embedding_model,
+            self.memory_top_k,
+            self.memory_token_budget,
+        )
+        self.agent_manager.configureToolResultDiff(self.tool_result_diff)
+        self.agent_manager.configureFanOut(
+            self.fan_out, self.fan_out_max_parallel, self.fan_out_max_subtasks
+        )
 
     async def initializeMCP(self):
         self.loadAppSettings()
+        self.startMetricsExporter()
 
-        print("\n=== Initializing MCP client... ===")
-        mcp_config = self.mcp_manager.getConfig()
-        self.mcp_client = MultiServerMCPClient(mcp_config["mcpServers"])
-        await asyncio.sleep(1)
-        await self.mcp_client.__aenter__()
-        await asyncio.sleep(1)
-
-        self.mcp_tools = self.mcp_client.get_tools()
+        self.cassette = self.createCassette()
+        if self.cassette and self.cassette.replaying:
+            # tools answer from the cassette; no MCP server is started
+            print(f"\n=== Replaying cassette {self.cassette_file} ===")
+            self.mcp_tools = self.cassette.makeReplayTools()
+        else:
+            print("\n=== Initializing MCP client... ===")
+            mcp_config = self.mcp_manager.getConfig()
+            self.mcp_supervisor = MCPSupervisor(
+                mcp_config["mcpServers"],
+                on_tools_changed=self.onMCPToolsChanged,
+                on_tool_progress=self.onToolProgress,
+                cassette=self.cassette,
+                catalog=ToolCatalog() if self.mcp_lazy_start else None,
+                idle_shutdown=self.mcp_idle_shutdown,
+            )
+            await self.mcp_supervisor.start()
+            REGISTRY.setCollector("mcp", self.mcp_supervisor.collectMetrics)
+            self.mcp_tools = self.mcp_supervisor.getTools()
         print(f"Loaded {len(self.mcp_tools)} MCP tools.")
         for tool in self.mcp_tools:
             print(f"[Tool] {tool.name}")
 
-        self.agent_manager = OllamaAgentManager(self.mcp_client, self.mcp_tools)
+        self.agent_manager = OllamaAgentManager(None, self.mcp_tools)
+        self.agent_manager.configureCassette(self.cassette)
+        self.configureAgentManager()
         self.agent_manager.createChatModel(
             temperature=self.temperature,
             mcp_tools=self.mcp_tools,
         )
         self.out_queue.put({"type": "init_done"})
+        self.putMCPStatus()
 
-    async def cleanupMCPClient(self, client=None):
-        if client is not None:
-            await client.__aexit__(None, None, None)
+    def createCassette(self):
+        if self.cassette_mode not in (MODE_RECORD, MODE_REPLAY):
+            return None
+        print(f"[Cassette] {self.cassette_mode}: {self.cassette_file}")
+        return Cassette(
+            self.cassette_file, self.cassette_mode, speed=self.cassette_replay_speed
+        )
+
+    def onMCPToolsChanged(self, tools):
+        # a server went down or recovered: rebind the agent with what is available
+        self.mcp_tools = tools
+        print(f"MCP tool set changed: {len(tools)} tools available.")
+        if self.current_task is not None:
+            # called from inside the running query (a failed or lazily started
+            # tool call); swapping the agent now would pull it from under the run
+            self.tools_rebind_pending = True
+        elif self.agent_manager:
+            self.agent_manager.rebindTools(tools)
+        self.putMCPStatus()
+
+    def applyPendingToolRebind(self):
+        if self.tools_rebind_pending and self.agent_manager:
+            self.tools_rebind_pending = False
+            self.agent_manager.rebindTools(self.mcp_tools)
+
+    def onToolProgress(self, progress):
+        # progress = {"tool": str, "progress": float, "total": float, "partial": str}
+        self.out_queue.put({EVENT_TYPE: "tool_progress", EVENT_DATA: progress})
+
+    def putMCPStatus(self):
+        if self.mcp_supervisor is None:
+            return
+        self.out_queue.put(
+            {EVENT_TYPE: "mcp_status", EVENT_DATA: self.mcp_supervisor.getStats()}
+        )
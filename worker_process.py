@@ -0,0 +1,203 @@
+import json
+import multiprocessing
+import queue
+import threading
+import time
+
+from constants import EVENT_DATA, EVENT_TYPE
+
+# frame = 1-byte kind + payload; token deltas skip JSON entirely
+FRAME_TOKEN = b"T"
+FRAME_EVENT = b"J"
+CONTROL_CANCEL = "cancel_query"
+CONTROL_STOP = "stop"
+RESPAWN_DELAY = 1.0
+STOP_TIMEOUT = 10
+
+
+def encodeEvent(event):
+    if event.get(EVENT_TYPE) == "chat_token":
+        return FRAME_TOKEN + str(event[EVENT_DATA]).encode("utf-8")
+    return FRAME_EVENT + json.dumps(event, ensure_ascii=False, default=str).encode(
+        "utf-8"
+    )
+
+
+def decodeEvent(frame):
+    if frame[:1] == FRAME_TOKEN:
+        return {EVENT_TYPE: "chat_token", EVENT_DATA: frame[1:].decode("utf-8")}
+    return json.loads(frame[1:].decode("utf-8"))
+
+
+class FrameSender:
+    """
+    Queue-like sender for one end of a Pipe. A background thread drains
+    everything queued since its last send and merges consecutive token
+    deltas, so a fast token stream becomes a few frames per UI tick without
+    holding any token back.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self.sendLoop, daemon=True)
+        self.thread.start()
+
+    def put(self, event, *args, **kwargs):
+        self.pending.put(event)
+
+    def qsize(self):
+        return self.pending.qsize()
+
+    def sendLoop(self):
+        while True:
+            events = [self.pending.get()]
+            while True:
+                try:
+                    events.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if None in events:
+                events = events[: events.index(None)]
+                self.sendEvents(events)
+                return
+            self.sendEvents(events)
+
+    def sendEvents(self, events):
+        tokens = []
+        try:
+            for event in events:
+                if event.get(EVENT_TYPE) == "chat_token":
+                    tokens.append(str(event[EVENT_DATA]))
+                    continue
+                if tokens:
+                    self.connection.send_bytes(
+                        encodeEvent({EVENT_TYPE: "chat_token", EVENT_DATA: "".join(tokens)})
+                    )
+                    tokens = []
+                self.connection.send_bytes(encodeEvent(event))
+            if tokens:
+                self.connection.send_bytes(
+                    encodeEvent({EVENT_TYPE: "chat_token", EVENT_DATA: "".join(tokens)})
+                )
+        except (BrokenPipeError, EOFError, OSError):
+            pass  # the other side is gone
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join(timeout=STOP_TIMEOUT)
+
+
+def runWorkerProcess(connection):
+    """Child process entry point: run Worker with the pipe as its queues."""
+    from worker import Worker
+
+    in_queue = queue.Queue()
+    out_queue = FrameSender(connection)
+    worker = Worker(in_queue, out_queue)
+
+    def readLoop():
+        while True:
+            try:
+                event = decodeEvent(connection.recv_bytes())
+            except (EOFError, OSError):
+                event = {EVENT_TYPE: CONTROL_STOP}
+            if event[EVENT_TYPE] == CONTROL_CANCEL:
+                worker.cancelQuery()
+            elif event[EVENT_TYPE] == CONTROL_STOP:
+                worker.running = False
+                return
+            else:
+                in_queue.put(event)
+
+    threading.Thread(target=readLoop, daemon=True).start()
+    worker.run()
+    worker.stop()
+    out_queue.close()
+
+
+class PipeInQueue:
+    """The UI's in_queue: put() sends the event to the worker process."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def put(self, event, *args, **kwargs):
+        self.client.send(event)
+
+
+class WorkerProcessClient:
+    """
+    Runs Worker and the agent in a child process so LangChain processing
+    does not compete with Qt rendering for the GIL. Exposes the same
+    in_queue / out_queue / cancelQuery / stop surface the UI uses with the
+    in-process Worker. If the child dies it is respawned and re-initialized;
+    the conversation memory of the dead child is lost.
+    """
+
+    def __init__(self):
+        self.context = multiprocessing.get_context("spawn")
+        self.in_queue = PipeInQueue(self)
+        self.out_queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopping = False
+        self.initialized = False
+        self.restarts = 0
+        self.process = None
+        self.connection = None
+        self.spawn()
+
+    def spawn(self):
+        parent_end, child_end = self.context.Pipe(duplex=True)
+        process = self.context.Process(
+            target=runWorkerProcess, args=(child_end,), daemon=True
+        )
+        process.start()
+        child_end.close()
+        with self.lock:
+            self.process = process
+            self.connection = parent_end
+        threading.Thread(
+            target=self.readLoop, args=(parent_end, process), daemon=True
+        ).start()
+
+    def readLoop(self, connection, process):
+        while True:
+            try:
+                self.out_queue.put(decodeEvent(connection.recv_bytes()))
+            except (EOFError, OSError):
+                break
+        process.join(timeout=STOP_TIMEOUT)
+        if not self.stopping:
+            self.respawn(process.exitcode)
+
+    def respawn(self, exit_code):
+        self.restarts += 1
+        message = f"Agent process exited (code {exit_code}). Restarting..."
+        print(f"[Worker process] {message}")
+        # unblock a UI waiting on a query, then re-run initialization
+        self.out_queue.put({EVENT_TYPE: "chat_error", EVENT_DATA: message})
+        time.sleep(RESPAWN_DELAY)
+        self.spawn()
+        if self.initialized:
+            self.send({EVENT_TYPE: "init"})
+
+    def send(self, event):
+        if event.get(EVENT_TYPE) == "init":
+            self.initialized = True
+        with self.lock:
+            connection = self.connection
+        try:
+            connection.send_bytes(encodeEvent(event))
+        except (BrokenPipeError, EOFError, OSError):
+            print(f"[Worker process] Dropped {event.get(EVENT_TYPE)}: process is down")
+
+    def cancelQuery(self):
+        self.send({EVENT_TYPE: CONTROL_CANCEL})
+
+    def stop(self):
+        self.stopping = True
+        self.send({EVENT_TYPE: CONTROL_STOP})
+        self.process.join(timeout=STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()